@@ -0,0 +1,857 @@
+# -*- coding: utf-8 -*-
+"""
+神秘游戏 批量模拟（无界面）
+
+从 UI._run_quick_sim 抽出的快速跑统计：冠军 / 前三 / 平均排名 / 平均存活回合。
+既可 import 调用 simulate()，也可在没有显示器的服务器上直接运行：
+
+    python batch_sim.py -n 5000 --seed 1 --json out.json
+"""
+import argparse
+import array
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from engine_core import Engine, HW_CID, LDL_CID, RuleParams
+
+NPC_IDS = (HW_CID, LDL_CID)
+# 与 UI 快速跑一致：超过该回合数仍未结束视为超时局（不计入统计）
+MAX_TURNS = 50000
+# 置信区间：默认 95%（正态近似）
+Z95 = 1.959963984540054
+# 统计指标：冠军率 / 前三率 / 平均排名 / 平均存活回合
+METRICS = ("win", "top3", "place", "survive")
+# 需要逐批汇报或按精度提前停止时，每批的局数（固定批大小=停止点与进程数无关）
+CHECK_CHUNK = 250
+
+
+# =========================
+# 单局
+# =========================
+@dataclass
+class GameOutcome:
+    """单局结果：只保留统计需要的字段，可跨进程传递。"""
+    seed: int
+    turns: int = 0
+    timed_out: bool = False
+    skill_exceptions: int = 0
+    alive: List[int] = field(default_factory=list)
+    elimination_order: List[int] = field(default_factory=list)
+    elimination_turn: Dict[int, int] = field(default_factory=dict)
+    error: Optional[str] = None  # 本局异常的 traceback 文本
+    # 真死亡记录 (victim, killer, reason)；killer=None 为世界规则/未知
+    deaths: List[Tuple[int, Optional[int], str]] = field(default_factory=list)
+    # 开着 error_log 时出现技能异常：与原快速跑一致，只计入“技能异常局数”，不进各项统计
+    excluded: bool = False
+
+    def alive_players(self) -> List[int]:
+        return [cid for cid in self.alive if cid not in NPC_IDS]
+
+    def elim_players(self) -> List[int]:
+        return [cid for cid in self.elimination_order if cid not in NPC_IDS]
+
+    def podium(self) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+        """冠军/第二/第三（角色 cid，不含 NPC）。"""
+        alive_players = self.alive_players()
+        elim_players = self.elim_players()
+        if len(self.alive) == 1 and alive_players:
+            # 最终存活者为角色
+            first = alive_players[0]
+            second = elim_players[-1] if len(elim_players) >= 1 else None
+            third = elim_players[-2] if len(elim_players) >= 2 else None
+        else:
+            # 最终存活者为NPC或无人存活：前三名取“最后死亡的三名角色”
+            first = elim_players[-1] if len(elim_players) >= 1 else None
+            second = elim_players[-2] if len(elim_players) >= 2 else None
+            third = elim_players[-3] if len(elim_players) >= 3 else None
+        return first, second, third
+
+    def places(self) -> Dict[int, int]:
+        """本局最终名次（1为冠军，其次为最后淘汰者…）。"""
+        alive_players = self.alive_players()
+        elim_players = self.elim_players()
+        place_map: Dict[int, int] = {}
+        if len(self.alive) == 1 and alive_players:
+            place_map[alive_players[0]] = 1
+            for i, cid in enumerate(reversed(elim_players), start=2):
+                place_map[cid] = i
+        else:
+            # 无角色存活或冠军为NPC：名次按最后淘汰顺序倒序
+            for i, cid in enumerate(reversed(elim_players), start=1):
+                place_map[cid] = i
+        return place_map
+
+    def survive_turns(self, role_ids: Sequence[int]) -> Dict[int, int]:
+        """每名角色的存活回合数：死亡回合=被淘汰回合；存活到最后=本局总回合数。"""
+        alive_players = set(self.alive_players())
+        out: Dict[int, int] = {}
+        for cid in role_ids:
+            if cid in NPC_IDS:
+                continue
+            if cid in alive_players:
+                out[cid] = int(self.turns)
+            else:
+                out[cid] = int(self.elimination_turn.get(cid, self.turns))
+        return out
+
+
+def _write_error_log(e: Engine, text: str):
+    try:
+        with open(e._error_log_path(), "a", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+    except Exception:
+        pass
+
+
+def _format_skill_exceptions(e: Engine) -> str:
+    lines = []
+    for ex in getattr(e, "skill_exception_examples", [])[:20]:
+        if len(ex) == 3:
+            cid_, msg_, tb_ = ex
+        else:
+            cid_, msg_ = ex[0], ex[1]
+            tb_ = ""
+        lines.append("- %s: %s\n" % (e.N(cid_), msg_))
+        if tb_:
+            lines.append(tb_ + "\n")
+    return "".join(lines)
+
+
+def new_engine(roster: Optional[Sequence[int]] = None,
+               params: Optional[RuleParams] = None) -> Engine:
+    """建一个可反复 reset() 的 fast_mode 引擎。"""
+    return Engine(seed=None, fast_mode=True, roster=list(roster) if roster is not None else None,
+                  params=params)
+
+
+def run_game(seed: int, roster: Optional[Sequence[int]] = None,
+             export_error_log: bool = False, max_turns: int = MAX_TURNS,
+             engine: Optional[Engine] = None, params: Optional[RuleParams] = None,
+             game_no: int = 0) -> GameOutcome:
+    """用 fast_mode 引擎跑完一局（或到 max_turns 为止）。异常不会抛出，记录在 outcome.error。
+
+    传入 engine 时原地 reset(seed) 复用（roster/params 以该引擎建立时为准），省掉每局建角色表的开销。
+    """
+    try:
+        if engine is None:
+            e = Engine(seed=seed, fast_mode=True, roster=roster, params=params)
+        else:
+            e = engine
+            e.reset(seed)
+    except Exception:
+        return GameOutcome(seed=seed, error=traceback.format_exc())
+    return play_outcome(e, seed, export_error_log, max_turns, game_no)
+
+
+def play_outcome(e: Any, seed: int, export_error_log: bool = False,
+                 max_turns: int = MAX_TURNS, game_no: int = 0) -> GameOutcome:
+    """把已经开好局的引擎跑到结束并收集结果（也适用于 a1.3.0.py 等其它版本的引擎）。
+    game_no 只用于 error_log 里的“=== Game N ===”标题。"""
+    out = GameOutcome(seed=seed)
+    try:
+        e.export_error_log = bool(export_error_log)
+        if e.export_error_log:
+            _write_error_log(e, "\n[v19] quick_sim start seed=%s\n" % (seed,))
+        for __ in range(max_turns):
+            if e.game_over:
+                break
+            e.tick_alive_turns()
+            e.next_turn()
+        out.turns = int(e.turn)
+        out.skill_exceptions = int(e.skill_exception_count)
+        out.alive = list(e.alive_ids())
+        out.elimination_order = list(e.elimination_order)
+        out.elimination_turn = dict(e.elimination_turn)
+        out.deaths = [(d.victim, d.killer, d.reason) for d in getattr(e, "death_records", [])]
+        if (not e.game_over) and len(out.alive) > 1:
+            out.timed_out = True
+        if e.export_error_log and not out.timed_out:
+            if out.skill_exceptions > 0:
+                # 技能异常视为本局规则没有正确执行：写出异常后不计入统计
+                _write_error_log(e, "\n=== Game %d skill_exceptions=%d seed=%s ===\n%s"
+                                 % (game_no, e.skill_exception_count, seed, _format_skill_exceptions(e)))
+                out.excluded = True
+            else:
+                _write_error_log(e, "\n=== Game %d seed=%s skill_exception_count=%d ===\n"
+                                 % (game_no, seed, e.skill_exception_count))
+    except Exception:
+        out.error = traceback.format_exc()
+    return out
+
+
+# =========================
+# 统计
+# =========================
+@dataclass
+class SimStats:
+    """快速跑计数器（原 UI._run_quick_sim 的局部变量）。可按局累加，也可合并。"""
+    role_ids: List[int]
+    names: Dict[int, str] = field(default_factory=dict)
+    games: int = 0
+    valid_games: int = 0
+    errors: int = 0
+    skill_errors: int = 0
+    timeouts: int = 0
+    first_error: Optional[str] = None
+    first_cnt: Dict[int, int] = field(default_factory=dict)
+    top3_cnt: Dict[int, int] = field(default_factory=dict)
+    top10_cnt: Dict[int, int] = field(default_factory=dict)
+    place_sum: Dict[int, int] = field(default_factory=dict)
+    place_cnt: Dict[int, int] = field(default_factory=dict)
+    survive_sum: Dict[int, int] = field(default_factory=dict)
+    survive_cnt: Dict[int, int] = field(default_factory=dict)
+    # 平方和：与上面的和一起给出在线均值/方差（全是整数，合并时精确无误差）
+    place_sq_sum: Dict[int, int] = field(default_factory=dict)
+    survive_sq_sum: Dict[int, int] = field(default_factory=dict)
+    stopped_early: bool = False  # 是否因置信区间已达标而提前结束
+    cancelled: bool = False      # 是否被 should_stop 中途取消（结果为部分统计）
+    # 击杀矩阵：kill_matrix[killer_idx * kill_dim + victim_idx]，下标见 death_index()
+    kill_matrix: Any = None
+    death_reasons: Dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        for d in (self.first_cnt, self.top3_cnt, self.top10_cnt, self.place_sum,
+                  self.place_cnt, self.survive_sum, self.survive_cnt,
+                  self.place_sq_sum, self.survive_sq_sum):
+            for cid in self.role_ids:
+                d.setdefault(cid, 0)
+        if self.kill_matrix is None:
+            self.kill_matrix = array.array("Q", bytes(8 * self.kill_dim * self.kill_dim))
+        elif not isinstance(self.kill_matrix, array.array):
+            self.kill_matrix = array.array("Q", self.kill_matrix)
+
+    # ---------- 击杀矩阵 ----------
+    @property
+    def kill_dim(self) -> int:
+        """矩阵边长：0=世界规则（无凶手），1..max_cid=角色 cid，最后两格为 NPC。"""
+        return max([0] + [c for c in self.role_ids if c not in NPC_IDS]) + 1 + len(NPC_IDS)
+
+    def death_index(self, cid: Optional[int]) -> int:
+        if cid is None:
+            return 0
+        if cid in NPC_IDS:
+            return self.kill_dim - len(NPC_IDS) + NPC_IDS.index(cid)
+        return cid
+
+    def death_cid(self, idx: int) -> Optional[int]:
+        if idx == 0:
+            return None
+        base = self.kill_dim - len(NPC_IDS)
+        return NPC_IDS[idx - base] if idx >= base else idx
+
+    def kill_count(self, killer: Optional[int], victim: int) -> int:
+        return self.kill_matrix[self.death_index(killer) * self.kill_dim + self.death_index(victim)]
+
+    def add(self, o: GameOutcome):
+        self.games += 1
+        if o.error is not None:
+            self.errors += 1
+            if self.first_error is None:
+                self.first_error = o.error
+            return
+        if o.timed_out:
+            self.timeouts += 1
+            return
+        # 技能异常局总是计数；开着 error_log 时视为规则没有正确执行，不计入统计（与原快速跑一致）
+        if o.skill_exceptions > 0:
+            self.skill_errors += 1
+            if o.excluded:
+                return
+        dim = self.kill_dim
+        km = self.kill_matrix
+        reasons = self.death_reasons
+        for victim, killer, reason in o.deaths:
+            km[self.death_index(killer) * dim + self.death_index(victim)] += 1
+            reasons[reason] = reasons.get(reason, 0) + 1
+        for cid, sturn in o.survive_turns(self.role_ids).items():
+            self.survive_sum[cid] += sturn
+            self.survive_sq_sum[cid] += sturn * sturn
+            self.survive_cnt[cid] += 1
+        for cid, pl in o.places().items():
+            self.place_sum[cid] += int(pl)
+            self.place_sq_sum[cid] += int(pl) * int(pl)
+            self.place_cnt[cid] += 1
+            if int(pl) <= 10:
+                self.top10_cnt[cid] += 1
+        first, second, third = o.podium()
+        if first is not None:
+            self.first_cnt[first] += 1
+            self.top3_cnt[first] += 1
+        if second is not None:
+            self.top3_cnt[second] += 1
+        if third is not None:
+            self.top3_cnt[third] += 1
+        self.valid_games += 1
+
+    def merge(self, other: "SimStats"):
+        """把另一份计数加到自己身上（用于多进程分片合并）。"""
+        self.games += other.games
+        self.valid_games += other.valid_games
+        self.errors += other.errors
+        self.skill_errors += other.skill_errors
+        self.timeouts += other.timeouts
+        if self.first_error is None:
+            self.first_error = other.first_error
+        for name in ("first_cnt", "top3_cnt", "top10_cnt", "place_sum",
+                     "place_cnt", "survive_sum", "survive_cnt",
+                     "place_sq_sum", "survive_sq_sum"):
+            mine = getattr(self, name)
+            for cid, v in getattr(other, name).items():
+                mine[cid] = mine.get(cid, 0) + v
+        km = self.kill_matrix
+        for i, v in enumerate(other.kill_matrix):
+            if v:
+                km[i] += v
+        for reason, v in other.death_reasons.items():
+            self.death_reasons[reason] = self.death_reasons.get(reason, 0) + v
+
+    def state(self) -> Dict[str, Any]:
+        """全部原始计数（可 JSON 序列化，cid 键转成字符串），用于断点续跑。"""
+        out = asdict(self)
+        for k, v in out.items():
+            if isinstance(v, dict):
+                out[k] = {str(cid): x for cid, x in v.items()}
+        out["kill_matrix"] = self.kill_matrix.tolist()
+        return out
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "SimStats":
+        kw = {}
+        for k, v in state.items():
+            if k == "death_reasons":
+                kw[k] = dict(v)
+            elif isinstance(v, dict):
+                kw[k] = {int(cid): x for cid, x in v.items()}
+            else:
+                kw[k] = v
+        return cls(**kw)
+
+    @property
+    def issues(self) -> bool:
+        return (self.errors > 0) or (self.skill_errors > 0) or (self.timeouts > 0)
+
+    def name(self, cid: int) -> str:
+        return f"{self.names.get(cid, str(cid)).strip()}({cid})"
+
+    # ---------- 在线均值 / 置信区间 ----------
+    def _sums(self, cid: int, metric: str) -> Tuple[int, int, int]:
+        """(样本数, 和, 平方和)。冠军/前三是 0/1 指标，平方和等于和。"""
+        if metric == "win":
+            return self.valid_games, self.first_cnt.get(cid, 0), self.first_cnt.get(cid, 0)
+        if metric == "top3":
+            return self.valid_games, self.top3_cnt.get(cid, 0), self.top3_cnt.get(cid, 0)
+        if metric == "place":
+            return self.place_cnt.get(cid, 0), self.place_sum.get(cid, 0), self.place_sq_sum.get(cid, 0)
+        if metric == "survive":
+            return self.survive_cnt.get(cid, 0), self.survive_sum.get(cid, 0), self.survive_sq_sum.get(cid, 0)
+        raise ValueError(f"unknown metric: {metric}")
+
+    def mean_ci(self, cid: int, metric: str, z: float = Z95) -> Tuple[float, float, int]:
+        """(均值, 置信区间半宽, 样本数)。冠军/前三为比例（0~1）；样本不足2个时半宽为 inf。"""
+        n, s1, s2 = self._sums(cid, metric)
+        if n <= 0:
+            return 0.0, math.inf, 0
+        mean = s1 / n
+        if n < 2:
+            return mean, math.inf, n
+        # 样本方差 = (n*Σx² - (Σx)²) / (n(n-1))，分子用整数算，避免大样本下的相消误差
+        var = (n * s2 - s1 * s1) / (n * (n - 1))
+        return mean, z * math.sqrt(max(0.0, var) / n), n
+
+    def max_half_width(self, metrics: Sequence[str] = ("win", "top3"), z: float = Z95) -> float:
+        """所有角色、所给指标中最宽的置信区间半宽。"""
+        worst = 0.0
+        for cid in self.role_ids:
+            if cid in NPC_IDS:
+                continue
+            for m in metrics:
+                worst = max(worst, self.mean_ci(cid, m, z)[1])
+        return worst
+
+    def precise_enough(self, target: float, metrics: Sequence[str] = ("win", "top3"),
+                       z: float = Z95, min_games: int = 0) -> bool:
+        """每个角色每个指标的半宽都不超过 target（且有效局数≥min_games）。"""
+        if self.valid_games < max(2, int(min_games)):
+            return False
+        return self.max_half_width(metrics, z) <= target
+
+    # ---------- 表格 ----------
+    def champion_table(self) -> List[Dict[str, Any]]:
+        """冠军胜率（按胜率从高到低）。"""
+        return self._rate_table(self.first_cnt)
+
+    def top3_table(self) -> List[Dict[str, Any]]:
+        """前三名胜率（按胜率从高到低）。"""
+        return self._rate_table(self.top3_cnt)
+
+    def _rate_table(self, cnt: Dict[int, int]) -> List[Dict[str, Any]]:
+        rows = []
+        for cid in self.role_ids:
+            if cid in NPC_IDS:
+                continue
+            rate = (cnt[cid] / self.valid_games * 100.0) if self.valid_games > 0 else 0.0
+            ci = self._rate_ci(cnt[cid]) * 100.0
+            rows.append({"cid": cid, "name": self.name(cid), "rate": rate, "ci": ci, "count": cnt[cid]})
+        rows.sort(key=lambda x: (-x["rate"], x["cid"]))
+        return rows
+
+    def _rate_ci(self, k: int, z: float = Z95) -> float:
+        n = self.valid_games
+        if n < 2:
+            return math.inf
+        return z * math.sqrt(max(0.0, (n * k - k * k) / (n * (n - 1))) / n)
+
+    def avg_place_table(self) -> List[Dict[str, Any]]:
+        """平均排名（按平均排名从低到高）。"""
+        rows = []
+        for cid in self.role_ids:
+            if self.place_cnt.get(cid, 0) > 0:
+                rows.append({"cid": cid, "name": self.name(cid),
+                             "avg": self.place_sum[cid] / self.place_cnt[cid],
+                             "ci": self.mean_ci(cid, "place")[1]})
+        rows.sort(key=lambda x: (x["avg"], x["cid"]))
+        return rows
+
+    def survive_table(self) -> List[Dict[str, Any]]:
+        """平均存活回合数（存活越久越靠前）。"""
+        rows = []
+        for cid in self.role_ids:
+            if self.survive_cnt.get(cid, 0) > 0:
+                rows.append({"cid": cid, "name": self.name(cid),
+                             "avg": self.survive_sum[cid] / self.survive_cnt[cid],
+                             "ci": self.mean_ci(cid, "survive")[1]})
+        rows.sort(key=lambda x: (-x["avg"], x["cid"]))
+        return rows
+
+    def kill_table(self) -> List[Dict[str, Any]]:
+        """非零的 凶手→死者 次数（按次数从高到低）；killer=None 表示世界规则。"""
+        dim = self.kill_dim
+        rows = []
+        for i, v in enumerate(self.kill_matrix):
+            if v:
+                killer, victim = self.death_cid(i // dim), self.death_cid(i % dim)
+                rows.append({"killer": killer, "victim": victim, "count": v,
+                             "killer_name": self.name(killer) if killer is not None else "世界规则",
+                             "victim_name": self.name(victim)})
+        rows.sort(key=lambda x: (-x["count"], self.death_index(x["killer"]), self.death_index(x["victim"])))
+        return rows
+
+    def reason_table(self) -> List[Dict[str, Any]]:
+        """死因次数（按次数从高到低）。"""
+        total = sum(self.death_reasons.values())
+        rows = [{"reason": r, "count": c, "rate": (c / total * 100.0) if total else 0.0}
+                for r, c in self.death_reasons.items()]
+        rows.sort(key=lambda x: (-x["count"], x["reason"]))
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "games": self.games,
+            "valid_games": self.valid_games,
+            "errors": self.errors,
+            "skill_errors": self.skill_errors,
+            "timeouts": self.timeouts,
+            "issues": self.issues,
+            "stopped_early": self.stopped_early,
+            "cancelled": self.cancelled,
+            "first_error": self.first_error,
+            "champion": self.champion_table(),
+            "top3": self.top3_table(),
+            "avg_place": self.avg_place_table(),
+            "avg_survive": self.survive_table(),
+            "death_reasons": self.reason_table(),
+            "kills": self.kill_table(),
+        }
+
+    def format_text(self) -> str:
+        """与 UI 统计窗口相同版式的纯文本。"""
+        NAME_W = 22
+        VAL_W = 12
+        SEP_W = 40
+        out: List[str] = []
+        out.append(f"总局数：{self.games}\n")
+        out.append(f"正常局数：{self.valid_games}\n")
+        out.append(f"错误局数：{self.errors}\n")
+        out.append(f"技能异常局数：{self.skill_errors}\n")
+        out.append(f"超时未结束局数：{self.timeouts}\n")
+        out.append(f"是否出现问题：{'是' if self.issues else '否'}\n")
+        if self.stopped_early:
+            out.append("（置信区间已达标，提前结束）\n")
+        if self.cancelled:
+            out.append("（已取消，以下为部分结果）\n")
+        out.append("\n")
+        for title, rows in (("冠军统计胜率（按胜率从高到低）", self.champion_table()),
+                            ("前三名统计胜率（按胜率从高到低）", self.top3_table())):
+            out.append(f"{title}\n")
+            out.append(f"{'角色':<{NAME_W}} {'胜率':>8} {'胜场':>6} {'±95%':>7}\n")
+            out.append("-" * SEP_W + "\n")
+            for row in rows:
+                out.append(f"{row['name']:<{NAME_W}} {row['rate']:7.3f}% {row['count']:6d} {row['ci']:6.2f}%\n")
+            out.append("\n")
+        for title, head, rows in (("平均排名统计（按平均排名从低到高）", "平均排名", self.avg_place_table()),
+                                  ("平均存活回合数统计（按平均存活回合从高到低）", "平均存活回合", self.survive_table())):
+            out.append(f"{title}\n")
+            out.append(f"{'角色':<{NAME_W}} {head:>{VAL_W}}\n")
+            out.append("-" * SEP_W + "\n")
+            for row in rows:
+                out.append(f"{row['name']:<{NAME_W}} {row['avg']:{VAL_W}.3f}\n")
+            out.append("-" * SEP_W + "\n\n")
+        out.append("死因统计（按次数从高到低）\n")
+        out.append("-" * SEP_W + "\n")
+        for row in self.reason_table():
+            out.append(f"{row['reason']:<{NAME_W}} {row['count']:8d} {row['rate']:6.2f}%\n")
+        out.append("\n击杀关系（前20）\n")
+        out.append("-" * SEP_W + "\n")
+        for row in self.kill_table()[:20]:
+            out.append(f"{row['killer_name']} → {row['victim_name']}  {row['count']}\n")
+        return "".join(out)
+
+
+# =========================
+# 批量入口
+# =========================
+def make_seeds(games: int, base_seed: Optional[int] = None) -> List[int]:
+    """生成 games 个种子（与 UI 快速跑相同的取值范围）。base_seed 固定时结果可复现。"""
+    seed_rng = random.Random(base_seed)
+    return [seed_rng.randint(1, 10**9) for _ in range(games)]
+
+
+def roster_info(roster: Optional[Sequence[int]] = None) -> Tuple[List[int], Dict[int, str]]:
+    """参赛角色 cid（按引擎顺序）与名字。"""
+    e = Engine(seed=0, fast_mode=True, roster=roster)
+    ids = [cid for cid in e.roles.keys() if cid not in NPC_IDS]
+    return ids, {cid: e.roles[cid].name for cid in ids}
+
+
+def shard_seeds(seeds: Sequence[int], shards: int) -> List[List[int]]:
+    """把种子按原顺序切成 shards 段连续分片（各段长度相差不超过1）。"""
+    seeds = list(seeds)
+    shards = max(1, min(int(shards), len(seeds)))
+    q, r = divmod(len(seeds), shards)
+    out: List[List[int]] = []
+    start = 0
+    for i in range(shards):
+        end = start + q + (1 if i < r else 0)
+        out.append(seeds[start:end])
+        start = end
+    return out
+
+
+def run_chunk(seeds: Sequence[int], roster: Optional[Sequence[int]] = None,
+              export_error_log: bool = False, engine: Optional[Engine] = None,
+              keep_outcomes: bool = False,
+              params: Optional[RuleParams] = None,
+              first_game: int = 1) -> Tuple[SimStats, Optional[List[GameOutcome]]]:
+    """在当前进程里跑完一批种子：返回 (汇总计数, 逐局结果或 None)。first_game 是这批第一局的局号。"""
+    role_ids, names = roster_info(roster)
+    stats = SimStats(role_ids=role_ids, names=names)
+    outcomes: Optional[List[GameOutcome]] = [] if keep_outcomes else None
+    if engine is None:
+        engine = new_engine(roster, params)
+    for k, seed in enumerate(seeds):
+        o = run_game(seed, roster, export_error_log, engine=engine, game_no=first_game + k)
+        stats.add(o)
+        if outcomes is not None:
+            outcomes.append(o)
+    return stats, outcomes
+
+
+def run_shard(seeds: Sequence[int], roster: Optional[Sequence[int]] = None,
+              export_error_log: bool = False, engine: Optional[Engine] = None,
+              params: Optional[RuleParams] = None) -> SimStats:
+    """在当前进程里跑完一个分片，只返回合并后的计数（跨进程只传一份 SimStats）。"""
+    return run_chunk(seeds, roster, export_error_log, engine, params=params)[0]
+
+
+# =========================
+# 断点续跑
+# =========================
+CHECKPOINT_VERSION = 1
+
+
+def seeds_fingerprint(seeds: Sequence[int]) -> str:
+    h = hashlib.sha1()
+    for seed in seeds:
+        h.update(b"%d," % int(seed))
+    return h.hexdigest()
+
+
+def _atomic_write(path: str, text: str):
+    """先写临时文件再 os.replace：中途断电/被杀也不会留下半个文件。"""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _seeds_path(checkpoint: str) -> str:
+    return checkpoint + ".seeds"
+
+
+def save_checkpoint(path: str, config: Dict[str, Any], next_index: int,
+                    stats: SimStats, done: bool = False):
+    _atomic_write(path, json.dumps({
+        "version": CHECKPOINT_VERSION,
+        "config": config,
+        "next_index": int(next_index),
+        "done": bool(done),
+        "stats": stats.state(),
+    }, ensure_ascii=False))
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    """读断点；文件不存在返回 None。"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        ck = json.load(f)
+    if ck.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path}: unsupported checkpoint version {ck.get('version')}")
+    return ck
+
+
+def load_checkpoint_seeds(path: str) -> Optional[List[int]]:
+    sp = _seeds_path(path)
+    if not os.path.exists(sp):
+        return None
+    with open(sp, "r", encoding="utf-8") as f:
+        return [int(line) for line in f if line.strip()]
+
+
+def default_workers() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def simulate(games: Optional[int] = None, seeds: Optional[Sequence[int]] = None,
+             roster: Optional[Sequence[int]] = None, workers: int = 1,
+             base_seed: Optional[int] = None, export_error_log: bool = False,
+             shards_per_worker: int = 4,
+             on_progress: Optional[Callable[[SimStats], None]] = None,
+             ci_target: Optional[float] = None, ci_metrics: Sequence[str] = ("win", "top3"),
+             min_games: int = 1000, chunk_size: Optional[int] = None,
+             z: float = Z95, store: Optional[str] = None,
+             checkpoint: Optional[str] = None, resume: bool = False,
+             should_stop: Optional[Callable[[], bool]] = None,
+             params: Optional[RuleParams] = None) -> SimStats:
+    """无界面批量模拟。
+
+    - seeds 给定时逐个种子各跑一局；否则用 make_seeds(games, base_seed) 生成。
+    - roster 为参赛角色 cid 列表（None=全部）；params 为规则常量（None=现行规则）。
+    - workers>1 时把种子切成连续分片交给进程池，每个分片在子进程内汇总，再按分片顺序合并。
+      计数都是整数求和，所以同一份种子列表无论几个进程，结果都与串行完全一致。
+    - on_progress(stats)：每合并一批就回调一次，stats 为当前的部分结果（只读）。
+    - should_stop()：每批合并后调用，返回 True 即取消（stats.cancelled=True，断点仍可续跑）。
+    - ci_target：所有角色 ci_metrics 指标的置信区间半宽都 ≤ ci_target（且有效局数 ≥ min_games）
+      时提前结束，stats.stopped_early=True。冠军/前三以比例计（0.01 = ±1 个百分点）。
+      只在批边界（chunk_size，默认 CHECK_CHUNK 局）按顺序判断，停止点与进程数无关。
+    - store：把逐局结果按种子顺序写进该目录（见 outcome_store.py，已有内容会被覆盖）。
+    - checkpoint：每合并一批就把计数和下一个种子下标原子地写进该 JSON 文件
+      （种子列表另存为 <checkpoint>.seeds）。resume=True 且断点存在时从断点接着跑，
+      结果与一次跑完完全相同；此时不给 seeds 则沿用断点里的种子。
+    返回 SimStats（冠军/前三/平均排名/平均存活回合表，见 to_dict()）。
+    """
+    ck = load_checkpoint(checkpoint) if (checkpoint is not None and resume) else None
+    if seeds is None and ck is not None:
+        seeds = load_checkpoint_seeds(checkpoint)
+    if seeds is None:
+        if games is None:
+            raise ValueError("simulate() needs games or seeds")
+        seeds = make_seeds(games, base_seed)
+    seeds = list(seeds)
+    roster = list(roster) if roster is not None else None
+    for m in ci_metrics:
+        if m not in METRICS:
+            raise ValueError(f"unknown metric: {m}")
+    if workers <= 0:
+        workers = default_workers()
+    if ck is not None:
+        chunk_size = ck["config"]["chunk_size"]  # 沿用原来的批边界，提前停止的判断点才一致
+    elif chunk_size is None:
+        if ci_target is not None or on_progress is not None or checkpoint is not None:
+            chunk_size = CHECK_CHUNK
+        else:
+            chunk_size = math.ceil(len(seeds) / (workers * max(1, shards_per_worker)))
+    chunk_size = max(1, int(chunk_size))
+    config = {
+        "seeds": seeds_fingerprint(seeds),
+        "games": len(seeds),
+        "roster": roster,
+        "params": params.to_dict() if params is not None else None,
+        "chunk_size": chunk_size,
+        "ci_target": ci_target,
+        "ci_metrics": list(ci_metrics),
+        "min_games": int(min_games),
+        "z": z,
+    }
+
+    start = 0
+    if ck is not None:
+        if ck["config"] != config:
+            diff = sorted(k for k in set(config) | set(ck["config"]) if ck["config"].get(k) != config.get(k))
+            raise ValueError(f"{checkpoint}: checkpoint does not match this run ({', '.join(diff)})")
+        stats = SimStats.from_state(ck["stats"])
+        start = int(ck["next_index"])
+        if ck.get("done"):
+            return stats
+    else:
+        role_ids, names = roster_info(roster)
+        stats = SimStats(role_ids=role_ids, names=names)
+        if checkpoint is not None:
+            _atomic_write(_seeds_path(checkpoint), "".join(f"{x}\n" for x in seeds))
+            save_checkpoint(checkpoint, config, 0, stats)
+    starts = list(range(start, len(seeds), chunk_size))
+    chunks = [seeds[i:i + chunk_size] for i in starts]
+    next_index = start
+
+    writer = None
+    if store is not None:
+        from outcome_store import OutcomeWriter
+        writer = OutcomeWriter(store, roster=roster, overwrite=(start == 0))
+        # 结果先于断点落盘，中断后可能多写了几局：截回断点处
+        writer.truncate(start)
+    keep = writer is not None
+
+    def take(result: Tuple[SimStats, Optional[List[GameOutcome]]], last: bool) -> bool:
+        """合并一批；返回 True 表示精度已达标、应停止。"""
+        nonlocal next_index
+        part, outcomes = result
+        stats.merge(part)
+        next_index += part.games
+        if writer is not None:
+            writer.append(outcomes or [])
+        stop = (not last) and ci_target is not None \
+            and stats.precise_enough(ci_target, ci_metrics, z, min_games)
+        if stop:
+            stats.stopped_early = True
+        if checkpoint is not None:
+            save_checkpoint(checkpoint, config, next_index, stats, done=(stop or last))
+        if on_progress is not None:
+            on_progress(stats)
+        if (not stop) and (not last) and should_stop is not None and should_stop():
+            stats.cancelled = True
+            return True
+        return stop
+
+    if workers == 1 or len(chunks) <= 1:
+        engine = new_engine(roster, params)
+        for i, chunk in enumerate(chunks):
+            if take(run_chunk(chunk, roster, export_error_log, engine, keep, params, starts[i] + 1),
+                    i == len(chunks) - 1):
+                break
+        return stats
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    ex = ProcessPoolExecutor(max_workers=min(workers, len(chunks)))
+    try:
+        # 只预先提交有限几批，按提交顺序取结果合并：合并顺序固定，first_error 也总是最早那批的；
+        # 提前停止时不必白跑剩下的全部种子
+        pending = deque()
+        nxt = 0
+        while nxt < len(chunks) and len(pending) < workers * 2:
+            pending.append(ex.submit(run_chunk, chunks[nxt], roster, export_error_log, None, keep, params,
+                                     starts[nxt] + 1))
+            nxt += 1
+        done = 0
+        while pending:
+            part = pending.popleft().result()
+            done += 1
+            if take(part, done == len(chunks)):
+                break
+            if nxt < len(chunks):
+                pending.append(ex.submit(run_chunk, chunks[nxt], roster, export_error_log, None, keep, params,
+                                         starts[nxt] + 1))
+                nxt += 1
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+    return stats
+
+
+# =========================
+# 命令行
+# =========================
+def _parse_roster(text: Optional[str]) -> Optional[List[int]]:
+    if not text:
+        return None
+    return [int(x) for x in text.replace("，", ",").split(",") if x.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="神秘游戏 批量模拟（无界面）")
+    ap.add_argument("-n", "--games", type=int, default=5000, help="局数（默认5000）")
+    ap.add_argument("--seed", type=int, default=None, help="生成各局种子的基础种子（固定后可复现）")
+    ap.add_argument("--seeds-file", default=None, help="每行一个种子的文件（优先于 -n/--seed）")
+    ap.add_argument("--roster", default=None, help="参赛角色 cid，逗号分隔（默认全部）")
+    ap.add_argument("-j", "--workers", type=int, default=1, help="并行进程数（0=CPU核数）")
+    ap.add_argument("--json", default=None, help="把统计结果写入 JSON 文件（- 表示标准输出）")
+    ap.add_argument("--error-log", action="store_true", help="技能异常写入 error_log.txt")
+    ap.add_argument("--ci", type=float, default=None,
+                    help="置信区间半宽目标（如 0.01=±1%%），所有角色都达标即提前结束")
+    ap.add_argument("--ci-metrics", default="win,top3",
+                    help="参与 --ci 判断的指标，逗号分隔：%s" % ",".join(METRICS))
+    ap.add_argument("--min-games", type=int, default=1000, help="提前结束前至少要跑的有效局数")
+    ap.add_argument("--progress", action="store_true", help="每批结束在 stderr 打印进度")
+    ap.add_argument("--store", default=None, help="逐局结果写入该目录（列式存储，见 outcome_store.py）")
+    ap.add_argument("--params", default=None,
+                    help="规则常量：JSON 文本或 JSON 文件路径（字段见 engine_core.RuleParams）")
+    ap.add_argument("--checkpoint", default=None, help="断点文件：每批结束保存一次计数与进度")
+    ap.add_argument("--resume", action="store_true", help="从 --checkpoint 断点接着跑（种子沿用断点里的）")
+    args = ap.parse_args(argv)
+
+    seeds = None
+    if args.seeds_file:
+        with open(args.seeds_file, "r", encoding="utf-8") as f:
+            seeds = [int(line) for line in f if line.strip()]
+    ci_metrics = [m.strip() for m in args.ci_metrics.split(",") if m.strip()]
+    params = None
+    if args.params:
+        text = args.params
+        if os.path.exists(text):
+            with open(text, "r", encoding="utf-8") as f:
+                text = f.read()
+        params = RuleParams.from_dict(json.loads(text))
+    t0 = time.perf_counter()
+
+    def progress(st: SimStats):
+        dt = max(1e-9, time.perf_counter() - t0)
+        sys.stderr.write(f"\r已完成 {st.games} 局，{st.games / dt:.1f} 局/秒，"
+                         f"最大半宽 {st.max_half_width(ci_metrics):.4f}   ")
+        sys.stderr.flush()
+
+    stats = simulate(games=args.games, seeds=seeds, roster=_parse_roster(args.roster),
+                     workers=args.workers, base_seed=args.seed,
+                     export_error_log=args.error_log,
+                     on_progress=progress if args.progress else None,
+                     ci_target=args.ci, ci_metrics=ci_metrics, min_games=args.min_games,
+                     store=args.store, checkpoint=args.checkpoint, resume=args.resume,
+                     params=params)
+    if args.progress:
+        sys.stderr.write("\n")
+    dt = max(1e-9, time.perf_counter() - t0)
+    sys.stderr.write(f"用时 {dt:.2f}s，{stats.games / dt:.1f} 局/秒\n")
+    if args.json == "-":
+        json.dump(stats.to_dict(), sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    else:
+        sys.stdout.write(stats.format_text())
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(stats.to_dict(), f, ensure_ascii=False, indent=2)
+    if stats.first_error:
+        sys.stderr.write("【快速跑异常示例】\n" + stats.first_error + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
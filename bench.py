@@ -0,0 +1,539 @@
+# -*- coding: utf-8 -*-
+"""
+神秘游戏 性能基准（无界面）
+
+    python bench.py             # 跑全部基准
+    python bench.py reuse -n 500
+
+每项都用固定种子，同一台机器上前后两次结果可以直接对比。
+"""
+import argparse
+import string
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import batch_sim
+import engine_core
+from engine_core import Engine, Role, RoleMem, Status
+
+
+def _timeit(fns: List[Callable[[], None]], repeat: int = 3) -> List[float]:
+    """几个函数交替各跑 repeat 次，分别取最快的一次（秒）。交替跑可以抵消机器忙闲的波动。"""
+    best: List[float] = [float("inf")] * len(fns)
+    for _ in range(max(1, repeat)):
+        for i, fn in enumerate(fns):
+            t0 = time.perf_counter()
+            fn()
+            best[i] = min(best[i], time.perf_counter() - t0)
+    return best
+
+
+# =========================
+# 引擎复用 vs 每局新建
+# =========================
+def bench_reuse(games: int = 300, repeat: int = 3) -> Dict[str, float]:
+    seeds = batch_sim.make_seeds(games, 1)
+
+    def construct_per_game():
+        for s in seeds:
+            batch_sim.run_game(s)
+
+    def reuse_engine():
+        e = batch_sim.new_engine()
+        for s in seeds:
+            batch_sim.run_game(s, engine=e)
+
+    def construct_only():
+        for s in seeds:
+            Engine(seed=s, fast_mode=True)
+
+    def reset_only():
+        e = batch_sim.new_engine()
+        for s in seeds:
+            e.reset(s)
+
+    t_new, t_reuse = _timeit([construct_per_game, reuse_engine], repeat)
+    t_ctor, t_reset = _timeit([construct_only, reset_only], repeat)
+    print(f"[reuse] {games} 局 fast_mode")
+    print(f"  每局新建 Engine : {games / t_new:8.1f} 局/秒")
+    print(f"  复用 + reset()  : {games / t_reuse:8.1f} 局/秒  ({t_new / t_reuse:.2f}x)")
+    print(f"  仅开局: 构造 {t_ctor / games * 1e6:.1f} us/局，reset {t_reset / games * 1e6:.1f} us/局")
+    return {"construct_gps": games / t_new, "reuse_gps": games / t_reuse}
+
+
+# =========================
+# 每回合耗时：43人 / 500人合成阵容
+# =========================
+def synthetic_engine(n_roles: int, seed: int = 1) -> Engine:
+    """在现有角色之外补上无技能的“路人”角色，凑够 n_roles 人（cid 从100起）。"""
+    e = Engine(seed=seed, fast_mode=True)
+    i = 0
+    while len(e.roles) < n_roles:
+        cid = 100 + i
+        e.roles[cid] = Role(cid, f"路人{i}")
+        i += 1
+    e.reset(seed)
+    return e
+
+
+def _legacy_pos(self, cid: int) -> Optional[int]:
+    # 旧实现：每次在排名列表里线性查找
+    try:
+        return list.index(self.rank, cid)
+    except ValueError:
+        return None
+
+
+def _turn_cost(n_roles: int, seeds: List[int], max_turns: int) -> float:
+    """平均每回合耗时（秒）。"""
+    e = synthetic_engine(n_roles)
+    turns = 0
+    t0 = time.perf_counter()
+    for s in seeds:
+        e.reset(s)
+        for _ in range(max_turns):
+            if e.game_over:
+                break
+            e.tick_alive_turns()
+            e.next_turn()
+            turns += 1
+    return (time.perf_counter() - t0) / max(1, turns)
+
+
+def bench_rank(games: int = 300, repeat: int = 3) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    print("[rank] 每回合耗时（pos() 反查表 vs 旧的 list.index）")
+    for n_roles, n_games, max_turns in ((43, max(1, games // 10), 200), (500, max(1, games // 100), 30)):
+        seeds = batch_sim.make_seeds(n_games, 1)
+        results = {}
+        for label in ("index", "legacy"):
+            orig = Engine.pos
+            if label == "legacy":
+                Engine.pos = _legacy_pos
+            try:
+                results[label] = min(_turn_cost(n_roles, seeds, max_turns) for _ in range(max(1, repeat)))
+            finally:
+                Engine.pos = orig
+        print(f"  {n_roles:4d} 人：反查表 {results['index'] * 1e3:7.3f} ms/回合，"
+              f"list.index {results['legacy'] * 1e3:7.3f} ms/回合（{results['legacy'] / results['index']:.2f}x）")
+        out[f"turn_ms_{n_roles}"] = results["index"] * 1e3
+        out[f"turn_ms_{n_roles}_legacy"] = results["legacy"] * 1e3
+    return out
+
+
+# =========================
+# Status 内存：每个实例 / 每次开局
+# =========================
+def _traced_bytes(fn: Callable[[], object]) -> int:
+    """fn 执行后仍被引用着的新分配字节数。"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        keep = fn()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del keep
+    return after - before
+
+
+def bench_status(games: int = 300, repeat: int = 3) -> Dict[str, float]:
+    n = 1000
+    per_status = _traced_bytes(lambda: [Status() for _ in range(n)]) / n
+    e = batch_sim.new_engine()
+    per_reset = _traced_bytes(lambda: e.reset(1) or [r.status for r in e.roles.values()])
+    t_new, = _timeit([lambda: [Status() for _ in range(games * 45)]], repeat)
+    print("[status] Status 内存与构造耗时")
+    print(f"  每个 Status      : {per_status:8.0f} 字节")
+    print(f"  每次 reset() 新增 : {per_reset / 1024:8.1f} KiB（{len(e.roles)} 个角色）")
+    print(f"  构造              : {t_new / (games * 45) * 1e6:8.2f} us/个")
+    return {"status_bytes": per_status, "reset_kib": per_reset / 1024}
+
+
+# =========================
+# brief() 缓存：快速模拟 / 完整日志回放
+# =========================
+def _play(seeds: List[int], fast_mode: bool, max_turns: int = 500):
+    e = Engine(seed=seeds[0], fast_mode=fast_mode)
+    for s in seeds:
+        e.reset(s)
+        for _ in range(max_turns):
+            if e.game_over:
+                break
+            e.tick_alive_turns()
+            e.next_turn()
+
+
+def bench_brief(games: int = 300, repeat: int = 3) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    print("[brief] Status.brief() 缓存 vs 每次重建")
+    for label, fast_mode, n_games in (("fast", True, games), ("replay", False, max(1, games // 10))):
+        seeds = batch_sim.make_seeds(n_games, 1)
+        orig = Status.brief
+
+        def cached():
+            _play(seeds, fast_mode)
+
+        def rebuilt():
+            Status.brief = Status._build_brief
+            try:
+                _play(seeds, fast_mode)
+            finally:
+                Status.brief = orig
+
+        t_cached, t_rebuilt = _timeit([cached, rebuilt], repeat)
+        print(f"  {label:6s} {n_games:4d} 局：缓存 {t_cached / n_games * 1e3:7.2f} ms/局，"
+              f"重建 {t_rebuilt / n_games * 1e3:7.2f} ms/局（{t_rebuilt / t_cached:.2f}x）")
+        out[f"{label}_ms"] = t_cached / n_games * 1e3
+        out[f"{label}_ms_rebuilt"] = t_rebuilt / n_games * 1e3
+    return out
+
+
+# =========================
+# Role.mem：真实回合循环里的访问量与耗时占比（附：声明式 RoleMem vs 旧的字符串键 dict）
+# =========================
+_MEM_NAMES = frozenset(RoleMem.__slots__)
+
+
+class _CountingMem(RoleMem):
+    """数 mem 字段读写次数的 RoleMem（只用来计数，不计时）。"""
+    __slots__ = ()
+    reads = 0
+    writes = 0
+
+    def __getattribute__(self, name):
+        if name in _MEM_NAMES:
+            _CountingMem.reads += 1
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        _CountingMem.writes += 1
+        object.__setattr__(self, name, value)
+
+
+def bench_mem(games: int = 300, repeat: int = 3) -> Dict[str, float]:
+    """mem 在真实回合循环里占多少时间。
+
+    1) 复用引擎跑 fast_mode 整局（同 bench_reuse），得到每局耗时；
+    2) 把各角色的 mem 换成计数版再跑同一批种子，得到每局 mem 读/写次数（含开局 reset）；
+    3) 单次读/写的耗时（RoleMem 属性 vs 旧写法 dict.get + int()）乘以次数，估出 mem 占每局耗时的比例。
+    换 RoleMem 前后的整局对比：在两个版本上各跑 python bench.py reuse。
+    """
+    seeds = batch_sim.make_seeds(games, 1)
+    e = batch_sim.new_engine()
+
+    def play():
+        for s in seeds:
+            batch_sim.run_game(s, engine=e)
+
+    t_game, = _timeit([play], repeat)
+
+    counted = batch_sim.new_engine()
+    for r in counted.roles.values():
+        m = _CountingMem.__new__(_CountingMem)
+        for name in RoleMem.__slots__:
+            object.__setattr__(m, name, getattr(r.mem, name))
+        r.mem = m
+    _CountingMem.reads = _CountingMem.writes = 0
+    for s in seeds:
+        batch_sim.run_game(s, engine=counted)
+    reads, writes = _CountingMem.reads / games, _CountingMem.writes / games
+
+    # 单次访问太快，每圈展开10次，再减掉空循环
+    n = 50_000
+    m, d = RoleMem(), {"cd": 1}
+    loop = range(n)
+
+    def slot_read():
+        for _ in loop:
+            m.cd; m.cd; m.cd; m.cd; m.cd; m.cd; m.cd; m.cd; m.cd; m.cd
+
+    def slot_write():
+        for _ in loop:
+            m.cd = 1; m.cd = 1; m.cd = 1; m.cd = 1; m.cd = 1; m.cd = 1; m.cd = 1; m.cd = 1; m.cd = 1; m.cd = 1
+
+    def dict_read():
+        for _ in loop:
+            int(d.get("cd", 0)); int(d.get("cd", 0)); int(d.get("cd", 0)); int(d.get("cd", 0)); int(d.get("cd", 0))
+            int(d.get("cd", 0)); int(d.get("cd", 0)); int(d.get("cd", 0)); int(d.get("cd", 0)); int(d.get("cd", 0))
+
+    def dict_write():
+        for _ in loop:
+            d["cd"] = 1; d["cd"] = 1; d["cd"] = 1; d["cd"] = 1; d["cd"] = 1
+            d["cd"] = 1; d["cd"] = 1; d["cd"] = 1; d["cd"] = 1; d["cd"] = 1
+
+    def empty():
+        for _ in loop:
+            pass
+
+    t_sr, t_sw, t_dr, t_dw, t_0 = _timeit([slot_read, slot_write, dict_read, dict_write, empty], max(3, repeat))
+    ns = [max(0.0, t - t_0) / (n * 10) * 1e9 for t in (t_sr, t_sw, t_dr, t_dw)]
+    ms_game = t_game / games * 1e3
+    ms_slots = (reads * ns[0] + writes * ns[1]) / 1e6
+    ms_dict = (reads * ns[2] + writes * ns[3]) / 1e6
+    print(f"[mem] {games} 局 fast_mode（复用引擎）")
+    print(f"  整局耗时     : {ms_game:6.2f} ms/局（{games / t_game:.1f} 局/秒）")
+    print(f"  mem 访问     : 每局读 {reads:.0f} 次、写 {writes:.0f} 次")
+    print(f"  单次读/写    : RoleMem {ns[0]:.1f}/{ns[1]:.1f} ns，dict + int() {ns[2]:.1f}/{ns[3]:.1f} ns")
+    print(f"  mem 耗时估计 : RoleMem {ms_slots * 1e3:.0f} us/局（{ms_slots / ms_game * 100:.1f}%），"
+          f"dict {ms_dict * 1e3:.0f} us/局（{ms_dict / ms_game * 100:.1f}%）")
+    return {"ms_per_game": ms_game, "reads": reads, "writes": writes,
+            "slots_share": ms_slots / ms_game, "dict_share": ms_dict / ms_game}
+
+
+# =========================
+# 快速模式下的日志格式化开销
+# =========================
+_EAGER_TEMPLATES: Dict[str, Tuple[str, Tuple[int, ...]]] = {}
+
+
+def _eager_template(s: str) -> Tuple[str, Tuple[int, ...]]:
+    """模板 -> (去掉 :N 的 str.format 模板, 需要先换成名字的参数下标)，按模板缓存。"""
+    hit = _EAGER_TEMPLATES.get(s)
+    if hit is None:
+        names = tuple(int(f) for _lit, f, spec, _conv in string.Formatter().parse(s) if f is not None and spec == "N")
+        hit = _EAGER_TEMPLATES[s] = (s.replace(":N}", "}"), names)
+    return hit
+
+
+def _eager_log(self, s, *args, **kw):
+    # 旧行为：不管是否 fast_mode，调用方都已经用 f-string 把整行拼好了（名字、拼接、推导式都已求值）
+    if args:
+        fmt, names = _eager_template(s)
+        args = list(args)
+        for i in names:
+            args[i] = self.N(args[i])
+        s = fmt.format(*args)
+    elif callable(s):
+        s = s()
+    if self.fast_mode:
+        return
+    Engine._log_lazy(self, s, **kw)
+
+
+def bench_log(games: int = 300, repeat: int = 3) -> Dict[str, float]:
+    seeds = batch_sim.make_seeds(games, 1)
+    calls = [0]
+    orig = Engine._log
+
+    def counting(self, s, *args, **kw):
+        calls[0] += 1
+
+    def lazy():
+        _play(seeds, True)
+
+    def eager():
+        Engine._log_lazy, Engine._log = orig, _eager_log
+        try:
+            _play(seeds, True)
+        finally:
+            Engine._log = orig
+            del Engine._log_lazy
+
+    Engine._log = counting
+    try:
+        _play(seeds, True)
+    finally:
+        Engine._log = orig
+    t_lazy, t_eager = _timeit([lazy, eager], repeat)
+    share = (t_eager - t_lazy) / t_eager
+    print(f"[log] fast_mode {games} 局，平均每局 {calls[0] / games:.0f} 行日志")
+    print(f"  惰性日志 : {t_lazy / games * 1e3:7.2f} ms/局")
+    print(f"  先拼好串 : {t_eager / games * 1e3:7.2f} ms/局（格式化占 {share * 100:.1f}%）")
+    return {"lazy_ms": t_lazy / games * 1e3, "eager_ms": t_eager / games * 1e3, "format_share": share}
+
+
+# =========================
+# 回放帧：关键帧 + 增量 vs 每行完整快照
+# =========================
+class _FullSnapshotFrames(list):
+    """旧格式：每条日志一份完整快照（所有角色，含已出局的）。"""
+
+    def __init__(self, keyframe_every: int = 0):
+        super().__init__()
+
+    def append(self, text, highlights, event, turn, rank, roles):
+        status = {cid: {"alive": r.alive, "brief": r.status.brief(), "name": r.name} for cid, r in roles.items()}
+        super().append({"text": text, "snap": {"turn": turn, "rank": list(rank), "status": status},
+                        "highlights": highlights, "event": event})
+
+
+def _deep_size(obj, seen: Optional[set] = None) -> int:
+    """obj 引用到的容器/字符串总字节数，同一个对象只算一次（共享的对象不重复计）。"""
+    if seen is None:
+        seen = set()
+    stack, total = [obj], 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (int, float, bool, type(None))):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set)):
+            stack.extend(o)
+        elif isinstance(o, engine_core.ReplayFrames):
+            stack.append(o._frames)
+    return total
+
+
+def bench_replay(games: int = 300, repeat: int = 3) -> Dict[str, float]:
+    n_games = max(1, games // 30)
+    seeds = batch_sim.make_seeds(n_games, 1)
+    orig = engine_core.ReplayFrames
+    sizes: Dict[str, List[int]] = {"delta": [], "full": []}
+
+    def play(label: str):
+        e = Engine(seed=seeds[0])
+        for s in seeds:
+            e.reset(s)
+            for _ in range(500):
+                if e.game_over:
+                    break
+                e.tick_alive_turns()
+                e.next_turn()
+                if sizes is not None:
+                    sizes[label].append(_deep_size(e.replay_frames) / max(1, len(e.replay_frames)))
+        return len(e.log)
+
+    def run(label: str):
+        engine_core.ReplayFrames = orig if label == "delta" else _FullSnapshotFrames
+        try:
+            return play(label)
+        finally:
+            engine_core.ReplayFrames = orig
+
+    run("delta")
+    run("full")
+    per_line = {k: sum(v) / len(v) for k, v in sizes.items()}
+    sizes = None
+    lines = 0
+    for s in seeds:
+        e = Engine(seed=s)
+        while not e.game_over and e.turn < 500:
+            e.tick_alive_turns()
+            e.next_turn()
+        lines += len(e.log)
+    t_delta, t_full = _timeit([lambda: run("delta"), lambda: run("full")], repeat)
+    print(f"[replay] {n_games} 局完整日志，共 {lines} 行")
+    print(f"  关键帧+增量 : {per_line['delta']:8.0f} 字节/行，{t_delta / lines * 1e6:6.2f} us/行")
+    print(f"  每行全快照  : {per_line['full']:8.0f} 字节/行，{t_full / lines * 1e6:6.2f} us/行"
+          f"（内存 {per_line['full'] / per_line['delta']:.1f}x，耗时 {t_full / t_delta:.2f}x）")
+    return {"delta_bytes": per_line["delta"], "full_bytes": per_line["full"],
+            "delta_us": t_delta / lines * 1e6, "full_us": t_full / lines * 1e6}
+
+
+# =========================
+# 悔棋：检查点还原 vs 从开局重演
+# =========================
+def bench_undo(games: int = 300, repeat: int = 3) -> Dict[str, float]:
+    """整局打完后逐回合退回开局。重演的代价按“平均要重跑一半回合”折算，不实际跑（平方级太慢）。"""
+    n_games = max(1, games // 30)
+    seeds = batch_sim.make_seeds(n_games, 1)
+    engines: List[Engine] = []
+    for s in seeds:
+        e = Engine(seed=s)
+        e.undo_depth = 10 ** 6  # 基准里不丢检查点，才能从终局一路退回开局
+        e.new_game()
+        while not e.game_over and e.turn < 500:
+            e.tick_alive_turns()
+            e.next_turn()
+        engines.append(e)
+    steps = sum(len(e._undo) for e in engines)
+    turns = sum(e.turn for e in engines)
+
+    def undo_all():
+        for e in engines:
+            for cp in reversed(e._undo):
+                e.restore(cp)
+
+    def replay_all():
+        for s in seeds:
+            e = Engine(seed=s)
+            e.undo_depth = 0
+            e.new_game()
+            while not e.game_over and e.turn < 500:
+                e.tick_alive_turns()
+                e.next_turn()
+
+    t_undo, t_play = _timeit([undo_all, replay_all], repeat)
+    per_turn = t_play / max(1, turns)
+    resim = per_turn * (turns / n_games - 1) / 2
+    cp_bytes = sum(_deep_size((cp.rng_state, cp.rank, cp.role_state, cp.fields))
+                   for e in engines for cp in e._undo) / steps
+    print(f"[undo] {n_games} 局，共 {turns} 回合")
+    print(f"  检查点还原 : {t_undo / steps * 1e3:8.3f} ms/步，{cp_bytes:8.0f} 字节/回合"
+          f"（最多留 {engine_core.UNDO_DEPTH} 回合，约 {cp_bytes * engine_core.UNDO_DEPTH / 1024:.0f} KB）")
+    print(f"  从开局重演 : {resim * 1e3:8.3f} ms/步（按 {per_turn * 1e3:.3f} ms/回合折算，随局长线性增长）")
+    return {"undo_ms": t_undo / steps * 1e3, "replay_ms": resim * 1e3, "checkpoint_bytes": cp_bytes}
+
+
+# =========================
+# 分支：fork() vs copy.deepcopy
+# =========================
+def bench_fork(games: int = 300, repeat: int = 3) -> Dict[str, float]:
+    """每局推演到一半，对比几种复制局面的方式；存档大小按带/不带历史分别统计。"""
+    import copy
+    n_games = max(1, games // 30)
+    engines: List[Engine] = []
+    for s in batch_sim.make_seeds(n_games, 1):
+        e = Engine(seed=s)
+        while not e.game_over and e.turn < 10:
+            e.tick_alive_turns()
+            e.next_turn()
+        engines.append(e)
+
+    def each(fn: Callable[[Engine], object]) -> Callable[[], None]:
+        return lambda: [fn(e) for e in engines]
+
+    fns = {
+        "deepcopy": each(copy.deepcopy),
+        "fork": each(lambda e: e.fork()),
+        "fork(history=False)": each(lambda e: e.fork(history=False)),
+        "dumps+loads": each(lambda e: Engine.loads(e.dumps())),
+    }
+    times = dict(zip(fns, _timeit(list(fns.values()), repeat)))
+    full = sum(len(e.dumps()) for e in engines) / n_games
+    bare = sum(len(e.dumps(history=False)) for e in engines) / n_games
+    print(f"[fork] {n_games} 局，各推演到第 {engines[0].turn} 回合")
+    for name, t in times.items():
+        print(f"  {name:<20}: {t / n_games * 1e3:8.3f} ms/次（{times['deepcopy'] / t:6.1f}x）")
+    print(f"  存档大小            : 带历史 {full / 1024:.1f} KB，不带历史 {bare / 1024:.1f} KB")
+    out = {name + "_ms": t / n_games * 1e3 for name, t in times.items()}
+    out.update(save_bytes=full, save_bytes_bare=bare)
+    return out
+
+
+BENCHES: Dict[str, Callable[..., Dict[str, float]]] = {
+    "reuse": bench_reuse,
+    "rank": bench_rank,
+    "status": bench_status,
+    "brief": bench_brief,
+    "mem": bench_mem,
+    "log": bench_log,
+    "replay": bench_replay,
+    "undo": bench_undo,
+    "fork": bench_fork,
+}
+
+
+def main(argv: List[str] = None) -> int:
+    ap = argparse.ArgumentParser(description="神秘游戏 性能基准")
+    ap.add_argument("which", nargs="*", help="要跑的基准：%s（默认全部）" % ", ".join(BENCHES))
+    ap.add_argument("-n", "--games", type=int, default=300, help="每项基准的局数")
+    ap.add_argument("-r", "--repeat", type=int, default=3, help="重复次数（取最快）")
+    args = ap.parse_args(argv)
+    names = args.which or list(BENCHES)
+    for name in names:
+        if name not in BENCHES:
+            ap.error(f"未知基准: {name}")
+        BENCHES[name](games=args.games, repeat=args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+神秘游戏 两个规则版本的配对比较（共同随机数）
+
+两个版本用同一批种子各跑一局，逐种子做差再统计：同一种子下开局排名、
+技能顺序等随机数一致，两边的差异主要来自规则本身，标准误比各跑各的小得多。
+
+    python compare.py a1.3.0.py -n 5000 --seed 1 -j 0          # engine_core vs a1.3.0.py
+    python compare.py engine_core engine_core --params-b '{"event_chance": 0.3}'
+
+版本写 engine_core 表示当前引擎（可配 --roster/--params-*），
+也可以写成任一 .py 文件路径（文件里需有同接口的 Engine，如 a1.3.0.py）。
+"""
+import argparse
+import hashlib
+import importlib.util
+import inspect
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import batch_sim
+from batch_sim import GameOutcome, NPC_IDS, Z95
+from engine_core import RuleParams
+
+CORE = "engine_core"
+# 比较的指标：冠军率 / 前三率 / 平均排名 / 平均存活回合
+PAIR_METRICS = ("win", "top3", "place", "survive")
+
+
+# =========================
+# 版本
+# =========================
+def _load_module(path: str):
+    path = os.path.abspath(path)
+    stem = "".join(ch if ch.isalnum() else "_" for ch in os.path.splitext(os.path.basename(path))[0])
+    name = f"_variant_{stem}_{hashlib.sha1(path.encode('utf-8')).hexdigest()[:8]}"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, path)
+    if spec is None or spec.loader is None:
+        raise ValueError(f"cannot load variant: {path}")
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+class Variant:
+    """一个可按种子跑单局的引擎版本。"""
+
+    def __init__(self, spec: str, roster: Optional[Sequence[int]] = None,
+                 params: Optional[Dict[str, Any]] = None):
+        self.spec = spec
+        self.roster = list(roster) if roster is not None else None
+        self.params = dict(params) if params else None
+        self.name = CORE if spec == CORE else os.path.basename(spec)
+        if spec == CORE:
+            self.module = None
+            self.engine = batch_sim.new_engine(
+                self.roster, RuleParams.from_dict(self.params) if self.params else None)
+            return
+        self.module = _load_module(spec)
+        self.engine = None
+        accepted = inspect.signature(self.module.Engine).parameters
+        self._kw: Dict[str, Any] = {}
+        if self.roster is not None:
+            if "roster" not in accepted:
+                raise ValueError(f"{spec}: Engine does not support roster")
+            self._kw["roster"] = self.roster
+        if self.params:
+            if "params" not in accepted or not hasattr(self.module, "RuleParams"):
+                raise ValueError(f"{spec}: Engine does not support params")
+            self._kw["params"] = self.module.RuleParams.from_dict(self.params)
+
+    def role_info(self) -> Tuple[List[int], Dict[int, str]]:
+        e = self.engine if self.engine is not None else self.module.Engine(seed=0, fast_mode=True, **self._kw)
+        ids = [cid for cid in e.roles.keys() if cid not in NPC_IDS]
+        return ids, {cid: e.roles[cid].name for cid in ids}
+
+    def run(self, seed: int) -> GameOutcome:
+        if self.engine is not None:
+            return batch_sim.run_game(seed, engine=self.engine)
+        try:
+            e = self.module.Engine(seed=seed, fast_mode=True, **self._kw)
+            if hasattr(e, "seed_enabled"):
+                # a1.3.0：未启用种子时每局都用系统随机数，必须打开才能按种子复现
+                e.seed_enabled = True
+                e.new_game()
+        except Exception:
+            import traceback
+            return GameOutcome(seed=seed, error=traceback.format_exc())
+        return batch_sim.play_outcome(e, seed)
+
+
+_VARIANTS: Dict[str, Variant] = {}
+
+
+def get_variant(spec: str, roster: Optional[Sequence[int]] = None,
+                params: Optional[Dict[str, Any]] = None) -> Variant:
+    """每个进程里按 (版本, 阵容, 参数) 缓存一份，引擎可反复使用。"""
+    key = json.dumps([spec, roster, params], sort_keys=True, ensure_ascii=False)
+    v = _VARIANTS.get(key)
+    if v is None:
+        v = _VARIANTS[key] = Variant(spec, roster, params)
+    return v
+
+
+# =========================
+# 配对统计
+# =========================
+def _valid(o: GameOutcome) -> bool:
+    return o.error is None and not o.timed_out
+
+
+def _metrics(o: GameOutcome, role_ids: Sequence[int]) -> Dict[str, Dict[int, int]]:
+    first, second, third = o.podium()
+    top3 = {first, second, third}
+    places = o.places()
+    return {
+        "win": {cid: int(cid == first) for cid in role_ids},
+        "top3": {cid: int(cid in top3) for cid in role_ids},
+        "place": {cid: places[cid] for cid in role_ids if cid in places},
+        "survive": o.survive_turns(role_ids),
+    }
+
+
+@dataclass
+class PairedStats:
+    """逐种子配对的整数累加量：sums[指标][cid] = [n, Σa, Σb, Σa², Σb², Σ(a-b)²]。可合并。"""
+    role_ids: List[int]
+    names: Dict[int, str] = field(default_factory=dict)
+    name_a: str = "A"
+    name_b: str = "B"
+    seeds: int = 0
+    paired: int = 0          # 两边都正常结束的种子数
+    diverged: int = 0        # 结果（淘汰顺序/存活者/回合数/是否出错）有任何不同的种子数
+    invalid_a: int = 0
+    invalid_b: int = 0
+    sums: Dict[str, Dict[int, List[int]]] = field(default_factory=dict)
+
+    def __post_init__(self):
+        for m in PAIR_METRICS:
+            d = self.sums.setdefault(m, {})
+            for cid in self.role_ids:
+                d.setdefault(cid, [0] * 6)
+
+    def add(self, a: GameOutcome, b: GameOutcome):
+        self.seeds += 1
+        va, vb = _valid(a), _valid(b)
+        self.invalid_a += not va
+        self.invalid_b += not vb
+        if (va != vb or a.elimination_order != b.elimination_order or a.alive != b.alive
+                or a.turns != b.turns):
+            self.diverged += 1
+        if not (va and vb):
+            return
+        self.paired += 1
+        ma, mb = _metrics(a, self.role_ids), _metrics(b, self.role_ids)
+        for m in PAIR_METRICS:
+            da, db, acc = ma[m], mb[m], self.sums[m]
+            for cid in self.role_ids:
+                if cid not in da or cid not in db:
+                    continue
+                x, y = da[cid], db[cid]
+                s = acc[cid]
+                s[0] += 1
+                s[1] += x
+                s[2] += y
+                s[3] += x * x
+                s[4] += y * y
+                s[5] += (x - y) * (x - y)
+
+    def merge(self, other: "PairedStats"):
+        self.seeds += other.seeds
+        self.paired += other.paired
+        self.diverged += other.diverged
+        self.invalid_a += other.invalid_a
+        self.invalid_b += other.invalid_b
+        for m, d in other.sums.items():
+            mine = self.sums.setdefault(m, {})
+            for cid, s in d.items():
+                t = mine.setdefault(cid, [0] * 6)
+                for i, v in enumerate(s):
+                    t[i] += v
+
+    def name(self, cid: int) -> str:
+        return f"{self.names.get(cid, str(cid)).strip()}({cid})"
+
+    def diff(self, cid: int, metric: str, z: float = Z95) -> Dict[str, Any]:
+        """A-B 的均值差、配对标准误，以及按独立样本估计的标准误（用来看方差缩减了多少）。"""
+        n, sa, sb, saa, sbb, sdd = self.sums[metric][cid]
+        row = {"cid": cid, "name": self.name(cid), "metric": metric, "n": n,
+               "a": 0.0, "b": 0.0, "diff": 0.0, "se": math.inf, "se_unpaired": math.inf,
+               "ci": math.inf, "z": 0.0, "var_reduction": 1.0}
+        if n <= 0:
+            return row
+        sd = sa - sb
+        row.update(a=sa / n, b=sb / n, diff=sd / n)
+        if n < 2:
+            return row
+        var_d = (n * sdd - sd * sd) / (n * (n - 1))
+        var_a = (n * saa - sa * sa) / (n * (n - 1))
+        var_b = (n * sbb - sb * sb) / (n * (n - 1))
+        se = math.sqrt(max(0.0, var_d) / n)
+        se_u = math.sqrt(max(0.0, var_a + var_b) / n)
+        row.update(se=se, se_unpaired=se_u, ci=z * se)
+        if se > 0:
+            row["z"] = (sd / n) / se
+            row["var_reduction"] = (se_u / se) ** 2
+        return row
+
+    def table(self, metric: str = "win") -> List[Dict[str, Any]]:
+        """按 |z| 从大到小（最显著的差异在前）。"""
+        rows = [self.diff(cid, metric) for cid in self.role_ids]
+        rows.sort(key=lambda r: (-abs(r["z"]), r["cid"]))
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "a": self.name_a,
+            "b": self.name_b,
+            "seeds": self.seeds,
+            "paired": self.paired,
+            "diverged": self.diverged,
+            "invalid_a": self.invalid_a,
+            "invalid_b": self.invalid_b,
+            "metrics": {m: self.table(m) for m in PAIR_METRICS},
+        }
+
+    def format_text(self, metrics: Sequence[str] = ("win", "top3"), top: Optional[int] = None) -> str:
+        NAME_W = 22
+        titles = {"win": "冠军率", "top3": "前三率", "place": "平均排名", "survive": "平均存活回合"}
+        out: List[str] = []
+        out.append(f"A = {self.name_a}    B = {self.name_b}\n")
+        out.append(f"种子数：{self.seeds}　两边都正常：{self.paired}\n")
+        pct = (self.diverged / self.seeds * 100.0) if self.seeds else 0.0
+        out.append(f"结果不同的种子：{self.diverged}（{pct:.1f}%）\n")
+        out.append(f"A 异常/超时：{self.invalid_a}　B 异常/超时：{self.invalid_b}\n\n")
+        for m in metrics:
+            scale = 100.0 if m in ("win", "top3") else 1.0
+            unit = "%" if scale == 100.0 else ""
+            rows = self.table(m)
+            if top is not None:
+                rows = rows[:top]
+            out.append(f"{titles[m]}差异 A-B（按显著性排序，±为95%配对区间）\n")
+            out.append(f"{'角色':<{NAME_W}} {'A':>8} {'B':>8} {'A-B':>8} {'±':>7} {'z':>6} {'方差缩减':>8}\n")
+            out.append("-" * 74 + "\n")
+            for r in rows:
+                out.append(f"{r['name']:<{NAME_W}} {r['a'] * scale:7.2f}{unit} {r['b'] * scale:7.2f}{unit} "
+                           f"{r['diff'] * scale:+7.2f}{unit} {r['ci'] * scale:6.2f}{unit} {r['z']:6.2f} "
+                           f"{r['var_reduction']:7.1f}x\n")
+            out.append("\n")
+        return "".join(out)
+
+
+# =========================
+# 执行
+# =========================
+def run_pair_chunk(seeds: Sequence[int], spec_a: str, spec_b: str,
+                   roster: Optional[Sequence[int]] = None,
+                   params_a: Optional[Dict[str, Any]] = None,
+                   params_b: Optional[Dict[str, Any]] = None) -> PairedStats:
+    va = get_variant(spec_a, roster, params_a)
+    vb = get_variant(spec_b, roster, params_b)
+    stats = _new_stats(va, vb)
+    for seed in seeds:
+        stats.add(va.run(seed), vb.run(seed))
+    return stats
+
+
+def _new_stats(va: Variant, vb: Variant) -> PairedStats:
+    ids_a, names = va.role_info()
+    ids_b, _names_b = vb.role_info()
+    common = [cid for cid in ids_a if cid in set(ids_b)]
+    return PairedStats(role_ids=common, names=names, name_a=va.name, name_b=vb.name)
+
+
+def compare(spec_a: str = CORE, spec_b: str = "a1.3.0.py", games: Optional[int] = None,
+            seeds: Optional[Sequence[int]] = None, base_seed: Optional[int] = None,
+            roster: Optional[Sequence[int]] = None, workers: int = 1,
+            params_a: Optional[Dict[str, Any]] = None, params_b: Optional[Dict[str, Any]] = None,
+            chunk_size: int = batch_sim.CHECK_CHUNK) -> PairedStats:
+    """两个版本在同一批种子上各跑一局，返回配对统计。分片按顺序合并，结果与进程数无关。"""
+    if seeds is None:
+        if games is None:
+            raise ValueError("compare() needs games or seeds")
+        seeds = batch_sim.make_seeds(games, base_seed)
+    seeds = list(seeds)
+    roster = list(roster) if roster is not None else None
+    stats = _new_stats(get_variant(spec_a, roster, params_a), get_variant(spec_b, roster, params_b))
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+    if workers <= 0:
+        workers = batch_sim.default_workers()
+    if workers == 1 or len(chunks) <= 1:
+        for c in chunks:
+            stats.merge(run_pair_chunk(c, spec_a, spec_b, roster, params_a, params_b))
+        return stats
+    from concurrent.futures import ProcessPoolExecutor
+    n = len(chunks)
+    with ProcessPoolExecutor(max_workers=min(workers, n)) as ex:
+        for part in ex.map(run_pair_chunk, chunks, [spec_a] * n, [spec_b] * n, [roster] * n,
+                           [params_a] * n, [params_b] * n):
+            stats.merge(part)
+    return stats
+
+
+# =========================
+# 命令行
+# =========================
+def _load_params(text: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not text:
+        return None
+    if os.path.exists(text):
+        with open(text, "r", encoding="utf-8") as f:
+            text = f.read()
+    return json.loads(text)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="神秘游戏 两个规则版本的配对比较（共同随机数）")
+    ap.add_argument("variants", nargs="+",
+                    help="B 或 A B；engine_core 或 .py 文件路径（只给一个时 A=engine_core）")
+    ap.add_argument("-n", "--games", type=int, default=5000, help="种子数（每个版本各跑这么多局）")
+    ap.add_argument("--seed", type=int, default=None, help="生成种子的基础种子（固定后可复现）")
+    ap.add_argument("--roster", default=None, help="参赛角色 cid，逗号分隔（仅 engine_core 等支持阵容的版本）")
+    ap.add_argument("--params-a", default=None, help="A 的规则常量（JSON 文本或文件）")
+    ap.add_argument("--params-b", default=None, help="B 的规则常量（JSON 文本或文件）")
+    ap.add_argument("-j", "--workers", type=int, default=1, help="并行进程数（0=CPU核数）")
+    ap.add_argument("--metrics", default="win,top3", help="输出的指标：%s" % ",".join(PAIR_METRICS))
+    ap.add_argument("--top", type=int, default=None, help="每个指标只列出最显著的前N名")
+    ap.add_argument("--json", default=None, help="把结果写入 JSON 文件（- 表示标准输出）")
+    args = ap.parse_args(argv)
+    if len(args.variants) > 2:
+        ap.error("at most two variants")
+    spec_a, spec_b = (CORE, args.variants[0]) if len(args.variants) == 1 else args.variants
+    metrics = [m.strip() for m in args.metrics.split(",") if m.strip()]
+    for m in metrics:
+        if m not in PAIR_METRICS:
+            ap.error(f"unknown metric: {m}")
+
+    t0 = time.perf_counter()
+    stats = compare(spec_a, spec_b, games=args.games, base_seed=args.seed,
+                    roster=batch_sim._parse_roster(args.roster), workers=args.workers,
+                    params_a=_load_params(args.params_a), params_b=_load_params(args.params_b))
+    dt = max(1e-9, time.perf_counter() - t0)
+    sys.stderr.write(f"用时 {dt:.2f}s，{stats.seeds / dt:.1f} 对/秒\n")
+    if args.json == "-":
+        json.dump(stats.to_dict(), sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    else:
+        sys.stdout.write(stats.format_text(metrics, args.top))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(stats.to_dict(), f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
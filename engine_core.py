@@ -2,9 +2,17 @@
 """
 神秘游戏 推演模拟器（Tkinter）
 """
+import array
+import itertools
+import os
+import pickle
 import random
 import re
 import math
+import operator
+import string
+import struct
+import zlib
 
 HW_CID = 1001  # NPC: 洪伟
 LDL_CID = 1002  # NPC: 李东雷
@@ -21,8 +29,9 @@ except Exception:
     ttk = None
     messagebox = None
 
-from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, ClassVar, Dict, Iterable, List, Optional, Tuple, Union
 # =========================
 # Windows DPI Awareness (avoid blur on 4K/HiDPI)
 # =========================
@@ -40,162 +49,880 @@ def set_dpi_awareness():
 # =========================
 # 数据结构
 # =========================
-@dataclass
-class Status:
+# 布尔状态：全部打包进 Status._flags，一个名字占一位（顺序即位序号，只能往后追加）
+STATUS_FLAGS: Tuple[str, ...] = (
+    "perma_disabled",               # 遗策/永久失效（主动+被动都无效）
+    "focused",                      # 集火（重做版，见 pick_random）
+    "invisible",                    # 隐身：不会被技能选中（不包括世界规则）
+    "bomb",                         # 炸弹：姚舒馨(40)烈焰炸弹标记
+    "vyzy",                         # 越挫越勇：季任杰(34)棕色状态
+    "shenwei",                      # 神威：施禹谦(36)金色状态效果
+    "fish",                         # 鱼：游鱼归渊牵引
+    "attached_life",                # 附生：携带李知雨残灯复明
+    "lone_wolf",                    # 孤军奋战：永久效果
+    "spec_immune_gained_this_turn", # 本回合是否新获得特异性免疫（用于沈澄婕触发判定）
+    "next_target_random",           # 留痕：下次技能目标随机
+    "doubled_move_next",            # 厄运预兆：下回合“排名变动效果”翻倍一次
+    "mls_immune_used_this_turn",    # mls
+    "corrupted",                    # Sunny 腐化
+    "sunny_revive_used",
+    "father_world_immune_used",     # 豆父
+    "witness",                      # 目击：谢承哲破绽洞察
+    "defense_line_block",           # 防线抵消次数
+    "fake_99999",                   # 整活模式：显示“护盾99999”（仅显示）
+)
+# 计数/剩余回合：各占一个 slot（名字, 默认值）
+STATUS_COUNTERS: Tuple[Tuple[str, int], ...] = (
     # 通用
-    shields: int = 0          # 临时护盾层数（最多2，与 shield_perm 合计）
-    shield_ttl: int = 0       # 临时护盾持续回合（>0每回合-1，到0清空 shields）
-    shield_perm: int = 0      # 可持续护盾层数（不衰减，直到被消耗）
-    thunder: int = 0          # 雷霆层数（第5/6/7名每回合+1，叠满3死亡）
-    sealed: int = 0           # 封印剩余回合（主动无效）
-    forgotten: int = 0        # 遗忘剩余回合（主动无效）
-    perma_disabled: bool = False  # 遗策/永久失效（主动+被动都无效）
-    # 集火（重做版）
-    focused: bool = False
-    invisible: bool = False      # 隐身：不会被技能选中（不包括世界规则）
-
-    bomb: bool = False           # 炸弹：姚舒馨(40)烈焰炸弹标记
-    vyzy: bool = False           # 越挫越勇：季任杰(34)棕色状态
-    shenwei: bool = False        # 神威：施禹谦(36)金色状态效果
-
-    fish: bool = False           # 鱼：游鱼归渊牵引
-    dying_ttl: int = 0          # 濒亡：剩余回合数（>0不能行动）
-    attached_life: bool = False  # 附生：携带李知雨残灯复明
-    lone_wolf: bool = False      # 孤军奋战：永久效果
-    spec_immune_ttl: int = 0     # 特异性免疫：剩余回合数（>0本回合无敌，仍受世界规则）
-    spec_immune_gained_this_turn: bool = False  # 本回合是否新获得特异性免疫（用于沈澄婕触发判定）
-    # 说明（新）：focused 不再是“随机技能必中该目标”
-    # 而是“自我反噬集火”：
-    # 若某角色带 focused，则其下一次发动的技能中，只要存在“有概率选中自己”的随机目标判定，
-    # 则该判定必然选中自己；触发后 focused 立即消失。
-    # ——为工程化实现：我们只在“随机选择目标”的 helper 中检查此规则。
-    dusk_mark: int = 0            # Sunny 死亡触发：黄昏标记（每次发动主动后-1名）
-    next_target_random: bool = False  # 留痕：下次技能目标随机
-    doubled_move_next: bool = False   # 厄运预兆：下回合“排名变动效果”翻倍一次
-    # mls
-    mls_immune_used: int = 0
-    mls_immune_used_this_turn: bool = False
-    # 左右脑
-    revives_left: int = 2
-    # hewenx 怨念
-    hewenx_curse: Optional[Dict[str, Any]] = None  # {"killer":cid, "threshold_rank":rank_at_death}
-    # Sunny
-    photosyn_energy: int = 0
-    corrupted: bool = False
-    sunny_revive_used: bool = False
-    # 沈澄婕(33) 记录存活者集合（用于“每回合记录存活者获得特异免疫”逻辑）
-    scj_recorded_alive: set = field(default_factory=set)
-    scj_layers: int = 0  # 沈澄婕(33) 记录层数（用于特异免疫获取上限3）
-    # 豆父
-    father_world_boost_count: int = 0
-    father_world_immune_used: bool = False
-    # 钟无艳（仅保留巾帼护盾计数）
-    zhong_triggers: int = 0
-    # 朱昊泽：绝息效果（剩余回合数，>0 表示对朱昊泽(4)发动技能会被免疫一次）
-    juexi_ttl: int = 0
+    ("shields", 0),                 # 临时护盾层数（最多2，与 shield_perm 合计）
+    ("shield_ttl", 0),              # 临时护盾持续回合（>0每回合-1，到0清空 shields）
+    ("shield_perm", 0),             # 可持续护盾层数（不衰减，直到被消耗）
+    ("thunder", 0),                 # 雷霆层数（第5/6/7名每回合+1，叠满3死亡）
+    ("sealed", 0),                  # 封印剩余回合（主动无效）
+    ("forgotten", 0),               # 遗忘剩余回合（主动无效）
+    ("dying_ttl", 0),               # 濒亡：剩余回合数（>0不能行动）
+    ("spec_immune_ttl", 0),         # 特异性免疫：剩余回合数（>0本回合无敌，仍受世界规则）
+    ("dusk_mark", 0),               # Sunny 死亡触发：黄昏标记（每次发动主动后-1名）
+    ("mls_immune_used", 0),         # mls
+    ("revives_left", 2),            # 左右脑
+    ("photosyn_energy", 0),         # Sunny
+    ("scj_layers", 0),              # 沈澄婕(33) 记录层数（用于特异免疫获取上限3）
+    ("father_world_boost_count", 0),  # 豆父
+    ("zhong_triggers", 0),          # 钟无艳（仅保留巾帼护盾计数）
+    ("juexi_ttl", 0),               # 朱昊泽：绝息效果（剩余回合数，>0 表示对朱昊泽(4)发动技能会被免疫一次）
     # 随机事件新增状态
-    hongwei_gift_shield: int = 0     # 洪伟之赐：可抵挡一次伤害（相当于盾），>0 表示存在
-    thunder_wrist_shield: int = 0    # 雷霆手腕：可抵挡一次伤害（相当于盾），>0 表示存在
-    oxid_ttl: int = 0                # 氧化：剩余回合（深绿色），每回合上升1名
-    reduce_ttl: int = 0              # 还原：剩余回合（深绿色），每回合下降1名
+    ("hongwei_gift_shield", 0),     # 洪伟之赐：可抵挡一次伤害（相当于盾），>0 表示存在
+    ("thunder_wrist_shield", 0),    # 雷霆手腕：可抵挡一次伤害（相当于盾），>0 表示存在
+    ("oxid_ttl", 0),                # 氧化：剩余回合（深绿色），每回合上升1名
+    ("reduce_ttl", 0),              # 还原：剩余回合（深绿色），每回合下降1名
+    ("defense_ttl", 0),             # 辩护：剩余回合数（金色），每回合上升1名
+    ("silent_ttl", 0),              # 静默：严雅
+    ("detour_ttl", 0),              # 迂回：陈心如
+    ("frontline_cd", 0),            # 迫近战线冷却：张志成
+    ("defense_line_ttl", 0),        # 防线：蒋骐键
+    ("purify_ttl", 0),              # 净化：严雅
+    ("shenghui_ttl", 0),            # 圣辉
+    ("dian", 0),                    # 感电层数（叠满3）
+    ("chase", 0),                   # 乘胜追击层数（叠满3）
+    ("mem_bless", 0),               # 找自称(25) 祝福层数（叠满8兑换护盾）
+)
+_STATUS_FLAG_BITS: Dict[str, int] = {name: 1 << i for i, name in enumerate(STATUS_FLAGS)}
+# 真正存储的字段（序列化/复制用）；_brief/_brief_key 只是 brief() 的缓存
+_STATUS_STATE: Tuple[str, ...] = ("_flags", "hewenx_curse", "scj_recorded_alive") + tuple(n for n, _d in STATUS_COUNTERS)
+# brief() 只由标记位和计数决定：把它们一次取成 tuple，和上次建串时的比较即可判断是否脏了。
+# 比起在每次写字段时挂钩子置脏，这样写入路径没有任何额外开销。
+_status_fingerprint = operator.attrgetter("_flags", *(n for n, _d in STATUS_COUNTERS))
 
-    witness: bool = False           # 目击：谢承哲破绽洞察
-    defense_ttl: int = 0            # 辩护：剩余回合数（金色），每回合上升1名
 
-    silent_ttl: int = 0           # 静默：严雅
-    detour_ttl: int = 0           # 迂回：陈心如
-    frontline_cd: int = 0         # 迫近战线冷却：张志成
-    defense_line_ttl: int = 0     # 防线：蒋骐键
-    defense_line_block: bool = False  # 防线抵消次数
+class Status:
+    """角色状态。布尔标记按位存在 _flags 里（通过同名属性读写），计数/剩余回合各占一个 slot。
+
+    所有字段都在 STATUS_FLAGS / STATUS_COUNTERS 里声明；没有 __dict__，不能临时挂新属性。
+    说明（新）：focused 不再是“随机技能必中该目标”，而是“自我反噬集火”：
+    若某角色带 focused，则其下一次发动的技能中，只要存在“有概率选中自己”的随机目标判定，
+    则该判定必然选中自己；触发后 focused 立即消失。
+    ——为工程化实现：我们只在“随机选择目标”的 helper 中检查此规则。
+    """
+    __slots__ = _STATUS_STATE + ("_brief", "_brief_key", "_seq")
+
+    def __init__(self, **kw):
+        self._brief = self._brief_key = None
+        self._seq = 0  # 回放跟踪用的写入序号，见 _TrackedStatus
+        self._flags = 0
+        for name, default in STATUS_COUNTERS:
+            setattr(self, name, default)
+        # hewenx 怨念：{"killer":cid, "threshold_rank":rank_at_death}
+        self.hewenx_curse: Optional[Dict[str, Any]] = None
+        # 沈澄婕(33) 记录的存活者集合（首次用到时才建）
+        self.scj_recorded_alive: Optional[set] = None
+        for name, value in kw.items():
+            if name not in _STATUS_FLAG_BITS and name not in _STATUS_STATE[1:]:
+                raise TypeError(f"Status() got an unexpected keyword argument '{name}'")
+            setattr(self, name, value)
+
+    def __repr__(self) -> str:
+        parts = [n for n in STATUS_FLAGS if getattr(self, n)]
+        parts += [f"{n}={getattr(self, n)}" for n, d in STATUS_COUNTERS if getattr(self, n) != d]
+        return f"Status({', '.join(parts)})"
+
+    def __getstate__(self):
+        return tuple(getattr(self, n) for n in _STATUS_STATE)
+
+    def __setstate__(self, state):
+        for n, v in zip(_STATUS_STATE, state):
+            setattr(self, n, v)
+        self._brief = self._brief_key = None
+        self._seq = next(_STATUS_SEQ)  # 还原/读档算一次写入：比之前记下的所有序号都新
+
+    def copy(self) -> "Status":
+        """独立副本（容器字段各拷一份；总是普通 Status，不带回放跟踪）。"""
+        new = Status.__new__(Status)
+        new.__setstate__(self.__getstate__())
+        if new.hewenx_curse is not None:
+            new.hewenx_curse = dict(new.hewenx_curse)
+        if new.scj_recorded_alive is not None:
+            new.scj_recorded_alive = set(new.scj_recorded_alive)
+        new._brief, new._brief_key = self._brief, self._brief_key
+        return new
 
     def total_shields(self) -> int:
         return min(2, max(0, self.shield_perm) + max(0, self.shields))
+
     def brief(self) -> str:
-        parts: List[str] = []
-        if self.total_shields() > 0:
-            parts.append(f"护盾{self.total_shields()}")
-        # Joke mode display only
-        if self.__dict__.get("fake_99999", False):
-            parts.append("护盾99999")
-        if self.thunder:
-            parts.append(f"雷霆{self.thunder}")
-        if self.sealed:
-            parts.append("封印")
-        if self.forgotten:
-            parts.append(f"遗忘{self.forgotten}")
-        if self.focused:
-            parts.append("集火")
-        if self.invisible:
-            parts.append("隐身")
-        if self.bomb:
-            parts.append("炸弹")
-        if self.vyzy:
-            parts.append("越挫越勇")
-        if getattr(self, "shenwei", False):
-            parts.append("神威")
-        if self.fish:
-            parts.append("鱼")
-        if self.dying_ttl:
-            parts.append(f"濒亡{self.dying_ttl}")
-        if self.attached_life:
-            parts.append("附生")
-        if self.lone_wolf:
-            parts.append("孤军奋战")
-        if self.spec_immune_ttl:
-            parts.append("特异性免疫")
-        if getattr(self, "purify_ttl", 0) > 0:
-            parts.append(f"净化{self.purify_ttl}")
-        if getattr(self, "shenghui_ttl", 0) > 0:
-            parts.append(f"圣辉{self.shenghui_ttl}")
-        if getattr(self, "dian", 0) > 0:
-            parts.append(f"感电{self.dian}")
-        if getattr(self, "chase", 0) > 0:
-            parts.append(f"乘胜追击{self.chase}")
-        if getattr(self, "witness", False):
-            parts.append("目击")
-        if getattr(self, "defense_ttl", 0) > 0:
-            parts.append(f"辩护{self.defense_ttl}")
-        if getattr(self, "silent_ttl", 0) > 0:
-            parts.append(f"静默{self.silent_ttl}")
-        if getattr(self, "detour_ttl", 0) > 0:
-            parts.append(f"迂回{self.detour_ttl}")
-        if getattr(self, "defense_line_ttl", 0) > 0:
-            parts.append(f"防线{self.defense_line_ttl}")
-        if self.perma_disabled:
-            parts.append("遗策")
-        if self.dusk_mark:
-            parts.append(f"黄昏{self.dusk_mark}")
-        if self.next_target_random:
-            parts.append("留痕")
-        if self.doubled_move_next:
-            parts.append("厄运")
-        if self.corrupted:
-            parts.append("腐化")
-        if self.juexi_ttl:
-            parts.append(f"绝息{self.juexi_ttl}")
-
-        if getattr(self, "hongwei_gift_shield", 0) > 0:
-            parts.append("洪伟之赐")
-        if getattr(self, "thunder_wrist_shield", 0) > 0:
-            parts.append("雷霆手腕")
-        if getattr(self, "oxid_ttl", 0) > 0:
-            parts.append("氧化")
-        if getattr(self, "reduce_ttl", 0) > 0:
-            parts.append("还原")
-
-        return "；".join(parts)
+        """状态摘要（显示用）。所有标记/计数都没变时直接返回上次的结果。"""
+        key = _status_fingerprint(self)
+        if key != self._brief_key:
+            self._brief, self._brief_key = self._build_brief(), key
+        return self._brief
+    def _build_brief(self) -> str:
+        fp = _status_fingerprint(self)
+        parts = [_status_tag(field, _tag_value(fp, field)) for field in STATUS_TAG_FIELDS]
+        return "；".join(p for p in parts if p)
+    def fingerprint(self) -> tuple:
+        """全部标记位与计数的快照（可比较、可哈希），用于判断状态是否变化。"""
+        return _status_fingerprint(self)
+
+
+def _flag_property(name: str, bit: int) -> property:
+    def get(self) -> bool:
+        return (self._flags & bit) != 0
+
+    def set(self, value):
+        if value:
+            self._flags |= bit
+        else:
+            self._flags &= ~bit
+    return property(get, set, doc=name)
+
+
+for _name, _bit in _STATUS_FLAG_BITS.items():
+    setattr(Status, _name, _flag_property(_name, _bit))
+del _name, _bit
+
+
+_STATUS_SEQ = itertools.count(1)
+_STATUS_UNTRACKED = frozenset(("_brief", "_brief_key", "_seq"))
+
+
+class _TrackedStatus(Status):
+    """非 fast_mode 记回放帧时把 Status 换成这个类：每次字段写入都换一个新的 _seq。
+
+    回放帧只要比较 _seq 就知道某个角色的状态有没有变，不用每行都重算所有人的 fingerprint。
+    fast_mode 从不换类，写入没有额外开销。
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: Any):
+        object.__setattr__(self, name, value)
+        if name not in _STATUS_UNTRACKED:
+            object.__setattr__(self, "_seq", next(_STATUS_SEQ))
+
+
+# =========================
+# 状态栏显示 / 状态变化事件
+# =========================
+# brief() 里显示的状态，按显示顺序：(字段, 文字, 是否带数值, 是否要求 >0)
+# 不要求 >0 的，值非零（含负数）就显示。shields 指合计护盾 total_shields()。
+STATUS_TAGS: Tuple[Tuple[str, str, bool, bool], ...] = (
+    ("shields", "护盾", True, True),
+    ("fake_99999", "护盾99999", False, False),  # Joke mode display only
+    ("thunder", "雷霆", True, False),
+    ("sealed", "封印", False, False),
+    ("forgotten", "遗忘", True, False),
+    ("focused", "集火", False, False),
+    ("invisible", "隐身", False, False),
+    ("bomb", "炸弹", False, False),
+    ("vyzy", "越挫越勇", False, False),
+    ("shenwei", "神威", False, False),
+    ("fish", "鱼", False, False),
+    ("dying_ttl", "濒亡", True, False),
+    ("attached_life", "附生", False, False),
+    ("lone_wolf", "孤军奋战", False, False),
+    ("spec_immune_ttl", "特异性免疫", False, False),
+    ("purify_ttl", "净化", True, True),
+    ("shenghui_ttl", "圣辉", True, True),
+    ("dian", "感电", True, True),
+    ("chase", "乘胜追击", True, True),
+    ("witness", "目击", False, False),
+    ("defense_ttl", "辩护", True, True),
+    ("silent_ttl", "静默", True, True),
+    ("detour_ttl", "迂回", True, True),
+    ("defense_line_ttl", "防线", True, True),
+    ("perma_disabled", "遗策", False, False),
+    ("dusk_mark", "黄昏", True, False),
+    ("next_target_random", "留痕", False, False),
+    ("doubled_move_next", "厄运", False, False),
+    ("corrupted", "腐化", False, False),
+    ("juexi_ttl", "绝息", True, False),
+    ("hongwei_gift_shield", "洪伟之赐", False, True),
+    ("thunder_wrist_shield", "雷霆手腕", False, True),
+    ("oxid_ttl", "氧化", False, True),
+    ("reduce_ttl", "还原", False, True),
+)
+STATUS_TAG_FIELDS: Tuple[str, ...] = tuple(t[0] for t in STATUS_TAGS)
+_TAG_SPEC: Dict[str, Tuple[str, bool, bool]] = {f: (label, num, pos) for f, label, num, pos in STATUS_TAGS}
+_TAG_ORDER: Dict[str, int] = {f: i for i, f in enumerate(STATUS_TAG_FIELDS)}
+# fingerprint 元组里各计数的下标（下标 0 是 _flags）
+_FP_INDEX: Dict[str, int] = {name: i + 1 for i, (name, _d) in enumerate(STATUS_COUNTERS)}
+_FP_SHIELDS = _FP_INDEX["shields"]
+_FP_SHIELD_PERM = _FP_INDEX["shield_perm"]
+# 计数字段 -> 它影响的显示字段（护盾两个字段合并显示）
+_FP_TAG_FIELD: Dict[int, str] = {i: name for name, i in _FP_INDEX.items() if name in _TAG_SPEC}
+_FP_TAG_FIELD[_FP_SHIELD_PERM] = "shields"
+
+
+def _tag_value(fp: tuple, field: str) -> Any:
+    """从 fingerprint 里取出显示字段的值（flag 为 bool，shields 为合计护盾）。"""
+    if field == "shields":
+        return min(2, max(0, fp[_FP_SHIELD_PERM]) + max(0, fp[_FP_SHIELDS]))
+    bit = _STATUS_FLAG_BITS.get(field)
+    if bit is not None:
+        return (fp[0] & bit) != 0
+    return fp[_FP_INDEX[field]]
+
+
+def _status_tag(field: str, value: Any) -> str:
+    """单个状态在状态栏里的文字；不显示时为空串。"""
+    label, num, pos = _TAG_SPEC[field]
+    if not ((value > 0) if pos else value):
+        return ""
+    return f"{label}{value}" if num else label
+
+
+@dataclass
+class StatusChange:
+    """一次状态栏可见的状态变化。old/new 是显示口径的值（flag 为 bool，shields 为合计护盾）。"""
+    cid: int
+    field: str
+    old: Any
+    new: Any
+    source: Optional[int] = None   # 造成变化的角色；世界规则/随机事件为 None
+
+    @property
+    def tag(self) -> str:
+        """变化后的显示文字（状态消失时为空串）。"""
+        return _status_tag(self.field, self.new)
+
+
+def status_changes(cid: int, before: tuple, after: tuple, source: Optional[int] = None) -> List[StatusChange]:
+    """比较同一角色前后两次 Status.fingerprint()，列出显示文字有变化的状态（按状态栏顺序）。"""
+    if before == after:
+        return []
+    fields = set()
+    bits = before[0] ^ after[0]
+    if bits:
+        fields.update(name for name, bit in _STATUS_FLAG_BITS.items() if bits & bit and name in _TAG_SPEC)
+    for i in range(1, len(after)):
+        if before[i] != after[i] and i in _FP_TAG_FIELD:
+            fields.add(_FP_TAG_FIELD[i])
+    out = []
+    for name in sorted(fields, key=_TAG_ORDER.__getitem__):
+        old, new = _tag_value(before, name), _tag_value(after, name)
+        if _status_tag(name, old) != _status_tag(name, new):
+            out.append(StatusChange(cid, name, old, new, source))
+    return out
+
+
+# 角色技能记忆（Role.mem）：全部字段在此声明（名字, 默认值）。None 表示“尚未记录”。
+ROLE_MEM_FIELDS: Tuple[Tuple[str, Any], ...] = (
+    # 通用
+    ("alive_turns", 0),             # 已存活回合数
+    ("dead_turn", None),            # 首次被记为死亡的回合
+    ("start_rank", None),           # 本回合开始时的名次
+    ("cd", 0),                      # 主动冷却：17 时空跃迁 / 18 秩序颠覆 / 23 / 24
+    ("counter", 0),                 # 每3回合必发的计数：1 逆袭之光 / 21
+    ("revive_used", False),         # 14 血债血偿复活 / 腐化复活
+    ("npc_casts", 0),               # NPC 已施法次数
+    ("attached_life_of", None),     # 附生来源（31 李知雨）
+    # 个别角色
+    ("execute_cd", 0),              # 3 凌空决斩杀冷却
+    ("qian_immune_next", False),    # 6 牵寒 逆流而上：免疫下次技能影响
+    ("zjs_last_kill_turn", None),   # 8 上次斩杀的回合
+    ("seal_used", False),           # 9 笔定乾坤已用
+    ("kill_cd", 0),                 # 9 笔戮千秋冷却
+    ("shufa_revive_used", False),   # 9 死而复生已用
+    ("wx_first_p", 0.01),           # 12 当前升至第一的概率
+    ("shield_cd", 0),               # 17 护佑之盾冷却
+    ("shield_uses", 0),             # 17 护佑之盾已用次数
+    ("death_times", 0),             # 26 Sunny 被淘汰次数
+    ("did_kill", False),            # 29 严雅：本回合是否斩杀
+    ("did_displace", False),        # 29 严雅：本回合是否造成位移
+    ("purify_cd", 0),               # 29 净化冷却
+    ("start_status_no_silent", ""),  # 29 回合开始时 28 的状态（不含静默）
+    ("silent_grant_turn", None),    # 29 上次授予静默的回合
+    ("detour_turn", -1),            # 30 上次触发迂回的回合
+    ("candle_used", False),         # 31 残灯复明已触发
+    ("attached_uses", 0),           # 31 附生已给出次数
+    ("scj_marked", ()),             # 33 已记录过的状态文字
+    ("yjf_hits", None),             # 35 绝地反击：{str(source): 被选中次数}（首次用到时才建）
+    ("tfms_pending", False),        # 36 天罚灭世待触发
+    ("last_rank", None),            # 36 上回合结束时的名次
+    ("down_streak", 0),             # 36 连续下降回合数
+    ("witness_block_turn", -1),     # 37 上次目击抵挡的回合
+    ("pyjh_p", 0.05),               # 38 当前触发概率
+    ("fish_soul_used", False),      # 42 鱼珠回魂已用
+    ("mates_picked", False),        # 46 已选定队友
+    ("mates", ()),                  # 46 两名队友 cid
+)
+
+
+class RoleMem:
+    """角色技能记忆。字段固定（见 ROLE_MEM_FIELDS），写错名字会直接报 AttributeError。"""
+    __slots__ = tuple(n for n, _d in ROLE_MEM_FIELDS)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """恢复全部默认值（开新局时复用同一个对象）。"""
+        for name, default in ROLE_MEM_FIELDS:
+            setattr(self, name, default)
+
+    def copy(self) -> "RoleMem":
+        """独立副本（list/dict 字段各拷一份）。"""
+        new = RoleMem.__new__(RoleMem)
+        for name in RoleMem.__slots__:
+            v = getattr(self, name)
+            setattr(new, name, v.copy() if isinstance(v, (list, dict, set)) else v)
+        return new
+
+    def __repr__(self) -> str:
+        parts = [f"{n}={getattr(self, n)!r}" for n, d in ROLE_MEM_FIELDS if getattr(self, n) != d]
+        return f"RoleMem({', '.join(parts)})"
+
+
 @dataclass
 class Role:
     cid: int
     name: str
     alive: bool = True
     status: Status = field(default_factory=Status)
-    mem: Dict[str, Any] = field(default_factory=dict)
+    mem: RoleMem = field(default_factory=RoleMem)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name == "alive":
+            # 所在 RoleTable 的 alive 计数加一（Engine.alive_ids() 的缓存据此失效）；不在表里的角色不计
+            clock = self.__dict__.get("_alive_clock")
+            if clock is not None:
+                clock[0] += 1
+
+    def copy(self) -> "Role":
+        return Role(self.cid, self.name, self.alive, self.status.copy(), self.mem.copy())
 @dataclass
 class DeathRecord:
     victim: int
     killer: Optional[int]  # None = 世界规则/未知
     reason: str
+class RoleTable(dict):
+    """cid -> Role。放进表里的角色共用本表的 alive 计数：每个引擎只因自己角色的生死变化而让缓存失效。"""
+    __slots__ = ("_clock",)
+
+    def __init__(self, items=()):
+        super().__init__()
+        self._clock = [0]
+        self.update(items)
+
+    def __reduce__(self):
+        return (RoleTable, (dict(self),))
+
+    @property
+    def alive_version(self) -> int:
+        return self._clock[0]
+
+    def __setitem__(self, cid: int, role: "Role"):
+        object.__setattr__(role, "_alive_clock", self._clock)
+        super().__setitem__(cid, role)
+        self._clock[0] += 1
+
+    def __delitem__(self, cid: int):
+        super().__delitem__(cid)
+        self._clock[0] += 1
+
+    def update(self, items=(), **kw):
+        for cid, role in dict(items, **kw).items():
+            self[cid] = role
+
+
+class RankList(list):
+    """排名列表：普通 list 外加 cid→下标 的反查表，pos()/in 都是 O(1)。
+
+    所有修改方法都会同步反查表，所以原有的 insert/pop/remove/切片赋值/shuffle 写法照常可用；
+    move() 只重排 [p, newp] 之间的一段，比 pop+insert 少一次整表重编号。
+    """
+    __slots__ = ("_idx", "version")
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.version = 0  # 每次修改加一（alive_ids() 缓存据此失效）
+        self._reindex()
+
+    def __reduce__(self):
+        return (RankList, (list(self),))
+
+    def _reindex(self, start: int = 0, stop: Optional[int] = None):
+        self.version += 1
+        if start == 0 and stop is None:
+            self._idx = {cid: i for i, cid in enumerate(self)}
+            return
+        idx = self._idx
+        for i in range(start, len(self) if stop is None else stop):
+            idx[list.__getitem__(self, i)] = i
+
+    def position(self, cid: int) -> Optional[int]:
+        return self._idx.get(cid)
+
+    def __contains__(self, cid) -> bool:
+        return cid in self._idx
+
+    def index(self, cid, *args) -> int:
+        if args:
+            return list.index(self, cid, *args)
+        try:
+            return self._idx[cid]
+        except KeyError:
+            raise ValueError(f"{cid!r} is not in list") from None
+
+    def move(self, p: int, newp: int):
+        """把第 p 位的元素移到第 newp 位（其余元素相对顺序不变）。"""
+        if p == newp:
+            return
+        cid = list.pop(self, p)
+        list.insert(self, newp, cid)
+        self._reindex(min(p, newp), max(p, newp) + 1)
+
+    def __setitem__(self, i, v):
+        if isinstance(i, slice):
+            list.__setitem__(self, i, v)
+            self._reindex()
+            return
+        old = list.__getitem__(self, i)
+        list.__setitem__(self, i, v)
+        if i < 0:
+            i += len(self)
+        if self._idx.get(old) == i:
+            del self._idx[old]
+        self._idx[v] = i
+        self.version += 1
+
+    def __delitem__(self, i):
+        list.__delitem__(self, i)
+        self._reindex()
+
+    def insert(self, i, cid):
+        n = len(self)
+        i = max(0, min(n, i + n if i < 0 else i))
+        list.insert(self, i, cid)
+        self._reindex(i)
+
+    def append(self, cid):
+        list.append(self, cid)
+        self._idx[cid] = len(self) - 1
+        self.version += 1
+
+    def extend(self, items):
+        start = len(self)
+        list.extend(self, items)
+        self._reindex(start)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self._reindex()
+        return self
+
+    def pop(self, i: int = -1):
+        n = len(self)
+        if i < 0:
+            i += n
+        cid = list.pop(self, i)
+        if self._idx.get(cid) == i:
+            del self._idx[cid]
+        self._reindex(i)
+        return cid
+
+    def remove(self, cid):
+        self.pop(self.index(cid))
+
+    def clear(self):
+        list.clear(self)
+        self._idx = {}
+        self.version += 1
+
+    def reverse(self):
+        list.reverse(self)
+        self._reindex()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._reindex()
+def _rule_int(name: str, value: Any) -> int:
+    """RuleParams 的整数字段：只收真正的整数（4.5、2.0、True 都拒绝），不悄悄截断。"""
+    if isinstance(value, bool):
+        raise TypeError(f"{name} must be an integer, got {value!r}")
+    try:
+        return operator.index(value)
+    except TypeError:
+        raise TypeError(f"{name} must be an integer, got {value!r}") from None
+# 随机事件名（顺序即等概率抽取时的顺序）
+RANDOM_EVENTS = ("洪伟降临", "李东雷降临", "冰封下的阳光", "倒反天罡", "氧化还原反应", "骰子")
+@dataclass
+class RuleParams:
+    """可调的规则常量（平衡调参用）。默认值就是现行规则，不传时引擎行为不变。"""
+    world_rule_min_alive: int = 4          # 存活少于该人数时世界规则不触发
+    world_rule_execute_rank: int = 4       # 世界规则处决第N名
+    thunder_ranks: Tuple[int, ...] = (5, 6, 7)  # 世界规则“雷霆降临”的名次
+    thunder_lethal: int = 3                # 雷霆叠满N层立刻死亡
+    event_chance: float = 0.25             # 每回合随机事件触发概率（第1回合不触发）
+    # 各随机事件的相对权重；全部相等时等概率抽取（与原规则的随机序列完全一致）
+    event_weights: Dict[str, float] = field(default_factory=lambda: {name: 1.0 for name in RANDOM_EVENTS})
+    endgame_alive: int = 3                 # 存活≤N人时开始累计“连续无人死亡”
+    endgame_no_death_turns: int = 3        # 连续N回合无人死亡 → 下回合斩杀末位
+
+    # 整数字段 -> 下限（sweep 的随机抽样也按这张表决定取整数）
+    INT_FIELDS: ClassVar[Dict[str, int]] = {
+        "world_rule_min_alive": 1,
+        "world_rule_execute_rank": 1,
+        "thunder_lethal": 1,
+        "endgame_alive": 0,
+        "endgame_no_death_turns": 1,
+    }
+
+    def __post_init__(self):
+        for name, lo in self.INT_FIELDS.items():
+            value = _rule_int(name, getattr(self, name))
+            if value < lo:
+                raise ValueError(f"{name} must be >= {lo}, got {value!r}")
+            setattr(self, name, value)
+        if not 0.0 <= float(self.event_chance) <= 1.0:
+            raise ValueError(f"event_chance must be in [0, 1], got {self.event_chance!r}")
+        self.thunder_ranks = tuple(_rule_int("thunder_ranks", x) for x in self.thunder_ranks)
+        if any(no < 1 for no in self.thunder_ranks):
+            raise ValueError(f"thunder_ranks must be >= 1, got {self.thunder_ranks!r}")
+        weights = {name: 1.0 for name in RANDOM_EVENTS}
+        for name, w in dict(self.event_weights).items():
+            if name not in weights:
+                raise ValueError(f"unknown random event: {name}")
+            weights[name] = float(w)
+            if weights[name] < 0:
+                raise ValueError(f"event weight must be >= 0: {name}={w!r}")
+        self.event_weights = weights
+
+    @property
+    def thunder_reason(self) -> str:
+        """雷霆叠满致死的淘汰原因（随 thunder_lethal 变化）。"""
+        return f"雷霆叠满{self.thunder_lethal}层处决"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "world_rule_min_alive": self.world_rule_min_alive,
+            "world_rule_execute_rank": self.world_rule_execute_rank,
+            "thunder_ranks": list(self.thunder_ranks),
+            "thunder_lethal": self.thunder_lethal,
+            "event_chance": self.event_chance,
+            "event_weights": dict(self.event_weights),
+            "endgame_alive": self.endgame_alive,
+            "endgame_no_death_turns": self.endgame_no_death_turns,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "RuleParams":
+        return cls(**d)
+# =========================
+# 技能注册表
+# =========================
+class SkillRegistry:
+    """cid -> 技能函数（未绑定，第一个参数是 Engine）。模块导入时登记一次，引擎构造时绑定成方法表。
+
+    角色模块可以这样扩展：
+
+        @SKILLS.active(50)
+        def act_50(engine): ...
+
+        @SKILLS.death(50)
+        def on_death_50(engine, killer): ...
+
+        @SKILLS.passive("status_change", 50, "某被动", scope="own")
+        def p50(engine, cid, changes): ...
+
+        @SKILLS.passive("kill", 50, "某被动")
+        def p50_kill(engine, victim, killer, reason, bypass_revive): ...
+
+    事件与参数（主体 subject 决定 scope="own" 的被动是否触发）：
+        status_change  主体=状态变化者        fn(cid, changes)
+        death          主体=被淘汰者          fn(victim, killer, reason, bypass_revive)  记入淘汰顺序之前
+        kill           主体=被淘汰者          同上，记入淘汰顺序之后
+        role_turn_end  主体=每名存活者        fn(cid)  回合末逐人结算
+        turn_end       无主体                 fn()     回合末逐人结算之后
+        rank_change    无主体                 fn()     交换/位移/插入之后
+    scope：
+        "own"    只在主体就是 cid 时触发
+        "watch"  cid 在场且存活时对任意主体触发（默认）
+        "any"    不属于任何角色，总是触发（cid 传 None）
+    """
+
+    def __init__(self):
+        self.actives: Dict[int, Callable] = {}           # 主动技能 fn(engine)
+        self.death_triggers: Dict[int, Callable] = {}    # 死亡触发 fn(engine, killer)
+        # 被动：事件名 -> [(cid, 被动名, fn, 关心的字段 或 None, scope)]，按登记顺序触发
+        self.passives: Dict[str, List[Tuple[Optional[int], str, Callable, Optional[frozenset], str]]] = {}
+        self.version = 0  # 每次登记加一；复用中的引擎在 reset() 时据此重新绑定
+
+    def active(self, cid: int) -> Callable[[Callable], Callable]:
+        def deco(fn: Callable) -> Callable:
+            self.actives[cid] = fn
+            self.version += 1
+            return fn
+        return deco
+
+    def death(self, cid: int) -> Callable[[Callable], Callable]:
+        def deco(fn: Callable) -> Callable:
+            self.death_triggers[cid] = fn
+            self.version += 1
+            return fn
+        return deco
+
+    def passive(self, event: str, cid: Optional[int], name: str,
+                fields: Optional[Iterable[str]] = None, scope: str = "watch") -> Callable[[Callable], Callable]:
+        if scope not in ("own", "watch", "any"):
+            raise ValueError(f"unknown passive scope: {scope}")
+        def deco(fn: Callable) -> Callable:
+            self.passives.setdefault(event, []).append(
+                (cid, name, fn, None if fields is None else frozenset(fields), scope))
+            self.version += 1
+            return fn
+        return deco
+
+
+SKILLS = SkillRegistry()
+_NO_HOOKS: Tuple[list, Dict[int, list]] = ([], {})
+
+
+# =========================
+# 日志模板
+# =========================
+# Engine._log 接受：现成的字符串；模板 + 参数；或返回字符串的无参函数（拼接/推导式等较贵的文本）。
+# fast_mode 下后两者都不会被格式化或调用。
+LogText = Union[str, Callable[[], str]]
+
+
+class _LogFormatter(string.Formatter):
+    """日志模板：{i:N} 把参数（角色 cid）渲染成 Engine.N(cid)，其余与 str.format 相同。"""
+
+    def __init__(self, engine: "Engine"):
+        super().__init__()
+        self.engine = engine
+
+    def format_field(self, value: Any, format_spec: str) -> str:
+        if format_spec == "N":
+            return self.engine.N(value)
+        return format(value, format_spec)
+
+
+_CID_PAT = re.compile(r"\((\d{1,3})\)")
+_TEMPLATE_CIDS: Dict[str, Tuple[Tuple[bool, int], ...]] = {}
+
+
+def _template_cids(template: str) -> Tuple[Tuple[bool, int], ...]:
+    """模板渲染后会出现在日志里的角色，按出现顺序：(True, 参数下标) 或 (False, 字面 cid)。
+
+    全角括号里的内容会被 _log 删掉，不算在内。按模板缓存，每个模板只解析一次。
+    """
+    hit = _TEMPLATE_CIDS.get(template)
+    if hit is not None:
+        return hit
+    out: List[Tuple[bool, int]] = []
+    inside = False
+    for literal, field_name, spec, _conv in string.Formatter().parse(template):
+        kept = []
+        for ch in literal:
+            if inside:
+                inside = ch != "）"
+            elif ch == "（":
+                inside = True
+            else:
+                kept.append(ch)
+        out.extend((False, int(m.group(1))) for m in _CID_PAT.finditer("".join(kept)))
+        if field_name is not None and spec == "N" and not inside:
+            out.append((True, int(field_name)))
+    hit = _TEMPLATE_CIDS[template] = tuple(out)
+    return hit
+
+
+# 结构化日志记录的种类
+LOG_KINDS = ("note", "kill", "shield_block", "move", "swap", "status_gain", "event_trigger", "turn_boundary")
+
+
+@dataclass
+class LogEvent:
+    """一行日志对应的结构化记录（仅非 fast_mode）。text 是它的文字渲染，UI 直接读字段而不再解析文字。
+
+    - kill：victims 为这一行之后真正被淘汰的角色（kill() 成功时补记到当时的最后一行）
+    - move / swap：ranks 为 (cid, 原名次, 新名次)
+    - status_gain：reason 为状态名；shield_block：targets 为被护盾保住的角色
+    """
+    kind: str = "note"
+    actor: Optional[int] = None
+    targets: Tuple[int, ...] = ()
+    reason: str = ""
+    ranks: Tuple[Tuple[int, int, int], ...] = ()
+    turn: int = 0
+    text: str = ""
+    cids: Tuple[int, ...] = ()       # 行内出现的角色，按出现顺序（回放高亮）
+    victims: Tuple[int, ...] = ()
+
+
+# =========================
+# 回放帧
+# =========================
+REPLAY_KEYFRAME_EVERY = 32
+
+
+class ReplayFrames:
+    """一回合的回放帧（每条日志一帧）。
+
+    每 keyframe_every 帧存一份完整的 {cid: {alive, brief, name}}，其余帧只存相对上一帧变了的角色；
+    排名直接引用 Engine.alive_ids() 的 tuple，没变就是同一个对象。frames[i] 按需重建成旧格式：
+    {"text", "snap": {"turn", "rank", "status"}, "highlights", "event"}。
+    """
+
+    def __init__(self, keyframe_every: int = REPLAY_KEYFRAME_EVERY):
+        self.keyframe_every = max(1, int(keyframe_every))
+        # 每帧：(text, highlights, event, turn, rank, status)；status 在关键帧是完整表，其余是变化表（None=角色已移除）
+        self._frames: List[Tuple[str, List[int], Optional[LogEvent], int, Tuple[int, ...], Dict[int, Any]]] = []
+        # cid -> (Status 对象, 写入序号, alive, name, 条目)：上一帧记录下的状态
+        self._last: Dict[int, Tuple[Status, int, bool, str, Dict[str, Any]]] = {}
+        self._cursor: Tuple[int, Optional[Dict[int, Any]]] = (-1, None)  # 顺序访问时沿用上一次重建的结果
+
+    def append(self, text: str, highlights: List[int], event: Optional[LogEvent], turn: int,
+               rank: Tuple[int, ...], roles: Dict[int, "Role"]):
+        last = self._last
+        changed: Dict[int, Any] = {}
+        for cid, r in roles.items():
+            st = r.status
+            if type(st) is not _TrackedStatus:
+                st.__class__ = _TrackedStatus  # 新的 Status 对象：从现在起跟踪写入
+                st._seq = next(_STATUS_SEQ)
+            prev = last.get(cid)
+            if prev is None or prev[0] is not st or prev[1] != st._seq or prev[2] != r.alive or prev[3] != r.name:
+                entry = {"alive": r.alive, "brief": st.brief(), "name": r.name}
+                last[cid] = (st, st._seq, r.alive, r.name, entry)
+                changed[cid] = entry
+        if len(last) != len(roles):
+            for cid in [c for c in last if c not in roles]:
+                del last[cid]
+                changed[cid] = None
+        if len(self._frames) % self.keyframe_every == 0:
+            changed = {cid: v[4] for cid, v in last.items()}
+        self._frames.append((text, highlights, event, turn, rank, changed))
+
+    def _status_at(self, i: int) -> Dict[int, Any]:
+        ci, cur = self._cursor
+        if cur is not None and ci <= i and i - ci < self.keyframe_every:
+            start = ci + 1
+        else:
+            start = i - i % self.keyframe_every
+            cur = dict(self._frames[start][5])
+            start += 1
+        if start <= i:
+            cur = dict(cur)
+            for j in range(start, i + 1):
+                for cid, entry in self._frames[j][5].items():
+                    if entry is None:
+                        cur.pop(cid, None)
+                    else:
+                        cur[cid] = entry
+        self._cursor = (i, cur)
+        return cur
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        n = len(self._frames)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        text, highlights, event, turn, rank, _ = self._frames[i]
+        status = dict(self._status_at(i))
+        return {"text": text, "snap": {"turn": turn, "rank": list(rank), "status": status},
+                "highlights": highlights, "event": event}
+
+    def __iter__(self):
+        for i in range(len(self._frames)):
+            yield self[i]
+
+    def copy(self) -> "ReplayFrames":
+        """独立副本：已有的帧共用（只读），之后各自追加。"""
+        new = ReplayFrames(self.keyframe_every)
+        new._frames = list(self._frames)
+        # 记下的 Status 对象属于原引擎：去掉对象引用，下一帧会把每个角色重新比对一遍
+        new._last = {cid: (None,) + v[1:] for cid, v in self._last.items()}
+        return new
+
+
+# =========================
+# 悔棋：回合检查点
+# =========================
+# 每回合结束存一份检查点，最多保留最近 UNDO_DEPTH 个回合（更早的自动丢弃，长局内存有上限）
+UNDO_DEPTH = 64
+# 检查点要还原的引擎字段（容器会浅拷贝一份）；log/log_events/death_records 只增不改，记长度即可
+_UNDO_FIELDS: Tuple[str, ...] = (
+    "turn", "game_over", "no_death_streak", "pending_endgame_execute", "world_event_triggered_this_turn",
+    "elimination_order", "elimination_turn", "deaths_this_turn", "twin_pair", "start_rank_snapshot",
+    "skill_order", "skill_exception_count", "skill_exception_examples", "_active_logged",
+)
+_engine_undo_state = operator.attrgetter(*_UNDO_FIELDS)
+_status_state = operator.attrgetter(*_STATUS_STATE)
+_mem_state = operator.attrgetter(*RoleMem.__slots__)
+# 可能装着 list/dict/set 的字段下标；其余字段都是不可变值，tuple 直接共用
+_STATUS_CONTAINERS = tuple(_STATUS_STATE.index(n) for n in ("hewenx_curse", "scj_recorded_alive"))
+_MEM_CONTAINERS = tuple(RoleMem.__slots__.index(n) for n in ("scj_marked", "yjf_hits", "mates"))
+_UNDO_CONTAINERS = tuple(range(len(_UNDO_FIELDS)))
+
+
+def _undo_copy(v):
+    return v.copy() if isinstance(v, (list, dict, set)) else v
+
+
+def _undo_values(values: tuple, containers: Tuple[int, ...]) -> tuple:
+    """字段值 tuple，containers 位置上的容器各浅拷贝一份（检查点与现场互不影响）。"""
+    if any(isinstance(values[i], (list, dict, set)) for i in containers):
+        values = list(values)
+        for i in containers:
+            values[i] = _undo_copy(values[i])
+        values = tuple(values)
+    return values
+
+
+@dataclass
+class TurnCheckpoint:
+    """某回合结束时的完整局面。角色/状态/记忆对象本身沿用，还原时把字段值写回去。"""
+    turn: int
+    rng_state: Tuple[int, "array.array", Optional[float]]   # 梅森旋转的 624 个字压成 array，省下 int 对象
+    rank: Tuple[int, ...]
+    roles: Dict[int, "Role"]                  # NPC 会中途加入：角色表本身也要还原
+    role_state: Dict[int, Tuple[bool, str, Status, tuple, tuple]]  # cid -> (alive, name, status, 状态字段, 记忆字段)
+    fields: tuple                             # 按 _UNDO_FIELDS 的顺序
+    log_len: int
+    death_len: int
+    frames: "ReplayFrames"                    # 该回合的回放帧（还原后界面照常逐行查看）
+
+
+# =========================
+# 存档 / 分支
+# =========================
+SAVE_MAGIC = b"SMGS"
+SAVE_VERSION = 1
+# 不进存档、也不复制到分支的字段：绑定到本对象的技能表（重新绑定即可）与 alive_ids() 缓存
+_ENGINE_TRANSIENT = frozenset((
+    "_actives", "_death_triggers", "_status_watchers", "_hooks", "_skills_version",
+    "_alive_rank", "_alive_key", "_alive_cache", "_alive_at",
+))
 # =========================
 # 引擎
 # =========================
@@ -214,10 +941,15 @@ class Engine:
         parts = [p for p in b.split("，") if not p.startswith("静默")]
         return "，".join(parts)
 
-    def __init__(self, seed: Optional[int] = None, fast_mode: bool = False):
+    def __init__(self, seed: Optional[int] = None, fast_mode: bool = False,
+                 roster: Optional[List[int]] = None, params: Optional[RuleParams] = None):
         self.rng = random.Random(seed)
         self.base_seed = seed  # None => fully random each new_game
         self.fast_mode = fast_mode
+        # 参赛角色（cid 列表）；None = 全部角色
+        self.roster: Optional[List[int]] = list(roster) if roster is not None else None
+        # 规则常量（世界规则/雷霆/随机事件/终局斩杀）
+        self.params: RuleParams = params if params is not None else RuleParams()
         # Joke mode (UI toggle)
         self.joke_mode = False
         # Simulation safety: track skill exceptions (even in fast_mode)
@@ -227,18 +959,25 @@ class Engine:
         self._active_logged = set()
         self.turn = 0
         self.world_event_triggered_this_turn = False  # 本回合是否触发世界事件
-        self.roles: Dict[int, Role] = {}
+        self.roles: RoleTable = RoleTable()
+        self._alive_rank: Optional[RankList] = None  # alive_ids() 缓存：对应的排名列表/版本/结果
+        self._alive_key: Tuple[int, int] = (-1, -1)
+        self._alive_cache: Tuple[int, ...] = ()
+        self._alive_at: Optional[Dict[int, int]] = None  # cid -> 在 _alive_cache 中的下标（按需建立）
+        self._bind_skills()
         self.rank: List[int] = []
         self.log: List[str] = []
         # 回放帧：每条log一帧（仅非fast_mode）
-        self.replay_frames: List[Dict[str, Any]] = []
-        self._cid_pat = re.compile(r"\((\d{1,3})\)")
+        self.replay_frames = ReplayFrames()
+        self.log_events: List[LogEvent] = []  # 与 self.log 一一对应（仅非fast_mode）
         self.game_over = False
         self.no_death_streak = 0
         self.pending_endgame_execute = False
         self.elimination_order: List[int] = []
         self.elimination_turn: Dict[int, int] = {}
         self.deaths_this_turn: List[DeathRecord] = []
+        # 本局全部真死亡记录（deaths_this_turn 每回合清空，这里整局保留，供批量统计）
+        self.death_records: List[DeathRecord] = []
         self.twin_pair: Tuple[int, int] = (13, -1)  # 13与随机一人绑定；-1表示未绑定
         # 随机事件NPC
         self.HW_CID = 1001  # 洪伟
@@ -246,6 +985,9 @@ class Engine:
         self.start_rank_snapshot: Dict[int, int] = {}
         # 每局固定的主动技能发动顺序（新规则：开局随机生成，之后每回合按此顺序）
         self.skill_order: List[int] = []
+        # 悔棋：最近若干回合结束时的检查点（fast_mode 不记）
+        self.undo_depth = 0 if fast_mode else UNDO_DEPTH
+        self._undo: deque = deque(maxlen=self.undo_depth)
         self._init_roles()
         self.new_game()
     def _init_roles(self):
@@ -295,18 +1037,83 @@ class Engine:
             (45, "蒋骐键"),
             (46, "戚银潞"),
         ]
-        self.roles = {cid: Role(cid, name) for cid, name in data}
+        if self.roster is not None:
+            known = {cid for cid, _ in data}
+            unknown = [cid for cid in self.roster if cid not in known]
+            if unknown:
+                raise ValueError(f"unknown role cid(s) in roster: {unknown}")
+            keep = set(self.roster)
+            data = [(cid, name) for cid, name in data if cid in keep]
+        self.roles = RoleTable({cid: Role(cid, name) for cid, name in data})
     # ---------- 通用 ----------
     def N(self, cid: int) -> str:
         name = self.roles[cid].name.strip()
         return f"{name}({cid})"
-    def alive_ids(self) -> List[int]:
-        return [cid for cid in self.rank if self.roles[cid].alive]
-    def pos(self, cid: int) -> Optional[int]:
-        try:
-            return self.rank.index(cid)
-        except ValueError:
+    @property
+    def rank(self) -> RankList:
+        return self._rank
+    @rank.setter
+    def rank(self, value):
+        # 任何整表赋值都包成 RankList，保证反查表与列表同步
+        self._rank = value if isinstance(value, RankList) else RankList(value)
+    def alive_ids(self) -> Tuple[int, ...]:
+        """按排名顺序的存活者（只读 tuple）。排名或任何 alive 变化前重复调用都直接返回缓存。"""
+        rank = self._rank
+        key = (rank.version, self.roles._clock[0])
+        if self._alive_rank is rank and self._alive_key == key:
+            return self._alive_cache
+        roles = self.roles
+        view = tuple([cid for cid in rank if roles[cid].alive])
+        self._alive_rank, self._alive_key, self._alive_cache = rank, key, view
+        self._alive_at = None
+        return view
+    def _alive_split(self, cid: int) -> Optional[Tuple[Tuple[int, ...], int, bool]]:
+        """(存活序列, 切分点, cid 本人是否存活)。切分点之前的都排在 cid 前面；cid 不在排名里返回 None。"""
+        view = self.alive_ids()
+        if self._alive_at is None:
+            self._alive_at = {x: i for i, x in enumerate(view)}
+        i = self._alive_at.get(cid)
+        if i is not None:
+            return view, i, True
+        p = self.pos(cid)
+        if p is None:
             return None
+        # 已死但还没被 _compact 移出排名：数一下排在它前面的存活者
+        roles = self.roles
+        return view, sum(1 for x in self.rank[:p] if roles[x].alive), False
+    def above(self, cid: int) -> Tuple[int, ...]:
+        """排名高于 cid 的存活者（按排名顺序）。"""
+        sp = self._alive_split(cid)
+        return () if sp is None else sp[0][:sp[1]]
+    def below(self, cid: int) -> Tuple[int, ...]:
+        """排名低于 cid 的存活者（按排名顺序）。"""
+        sp = self._alive_split(cid)
+        if sp is None:
+            return ()
+        view, i, here = sp
+        return view[i + 1:] if here else view[i:]
+    def window(self, cid: int, k: int) -> Tuple[int, ...]:
+        """cid 上下各 k 名以内的存活者（不含 cid 本人，按排名顺序）。"""
+        sp = self._alive_split(cid)
+        if sp is None or k <= 0:
+            return ()
+        view, i, here = sp
+        j = i + 1 if here else i
+        return view[max(0, i - k):i] + view[j:j + k]
+    def top_fraction(self, frac: float) -> Tuple[int, ...]:
+        """存活者中排名前 frac 的部分（人数向下取整）。"""
+        view = self.alive_ids()
+        return view[:int(len(view) * frac)]
+    def bottom_fraction(self, frac: float) -> Tuple[int, ...]:
+        """存活者中排名后 frac 的部分，即 top_fraction(1 - frac) 之外的人。"""
+        view = self.alive_ids()
+        return view[int(len(view) * (1 - frac)):]
+    def in_top_fraction(self, cid: int, frac: float) -> bool:
+        """cid 的名次是否落在存活人数的前 frac 内（名次按完整排名计）。"""
+        r = self.rank_no(cid)
+        return r is not None and r <= int(len(self.alive_ids()) * frac)
+    def pos(self, cid: int) -> Optional[int]:
+        return self._rank._idx.get(cid)
     def rank_no(self, cid: int) -> Optional[int]:
         p = self.pos(cid)
         return None if p is None else p + 1
@@ -322,37 +1129,55 @@ class Engine:
         if (not r.alive) or r.status.perma_disabled:
             return
         if r.status.shenwei and self.rank_no(36) != 1:
-            before = r.status.brief()
+            before = r.status.fingerprint()
             r.status.shenwei = False
             self._log("  · 神威消失：施禹谦(36) 不在第一名 → 神威立刻消失")
-            self._on_status_change(36, before)
-
-    def _snapshot(self) -> Dict[str, Any]:
-        if self.fast_mode:
-            return {"turn": self.turn, "rank": [], "status": {}}
-        alive_rank = [cid for cid in self.rank if self.roles[cid].alive]
-        status_map: Dict[int, Any] = {}
-        for cid, r in self.roles.items():
-            status_map[cid] = {"alive": r.alive, "brief": r.status.brief(), "name": r.name}
-        return {"turn": self.turn, "rank": alive_rank[:], "status": status_map}
-    def _log(self, s: str):
+            self._on_status_change(36, before, 36)
+
+    def frame(self, i: int) -> Dict[str, Any]:
+        """本回合第 i 条日志的回放帧（按需从关键帧 + 增量重建）。"""
+        return self.replay_frames[i]
+    def _log(self, s: LogText, *args, kind: str = "note", actor: Optional[int] = None,
+             targets: Tuple[int, ...] = (), reason: str = "", ranks: Tuple[Tuple[int, int, int], ...] = ()):
+        """记一行日志（同时生成一条 LogEvent 和一帧回放）。
+
+        self._log("  · 护盾抵死：{0:N}（{1}）", victim, reason,
+                      kind="shield_block", actor=killer, targets=(victim,), reason=reason)   # 模板，{0:N} -> 名字(cid)
+        self._log(lambda: "、".join(self.N(x) for x in path))    # 较贵的文本用无参函数
+        kind/actor/targets/reason/ranks 原样记进 LogEvent。
+        fast_mode 下直接返回，模板不会被格式化，函数也不会被调用。
+        """
         if self.fast_mode:
             return
+        if args:
+            found = [args[v] if is_arg else v for is_arg, v in _template_cids(s)]
+            s = _LogFormatter(self).vformat(s, args, {})
+        elif callable(s):
+            s = s()
+            found = None
+        else:
+            found = None
         # 日志净化：删除所有全角括号内容（例如（现为2层）、（死亡触发：…）等）
         # 不影响角色编号形式的半角括号 (cid)
         s = re.sub(r"（[^）]*）", "", s)
-        self.log.append(s)
-        highlights: List[int] = []
-        try:
-            for m in self._cid_pat.finditer(s):
-                cid = int(m.group(1))
-                if cid in self.roles:
-                    highlights.append(cid)
-        except Exception:
-            highlights = []
+        if found is None:
+            # 现成文本：只能从文字里找 (cid)
+            found = [int(m.group(1)) for m in _CID_PAT.finditer(s)]
+        roles = self.roles
         seen = set()
-        highlights = [x for x in highlights if not (x in seen or seen.add(x))]
-        self.replay_frames.append({"text": s, "snap": self._snapshot(), "highlights": highlights})
+        highlights = [x for x in found if x in roles and not (x in seen or seen.add(x))]
+        ev = LogEvent(kind, actor, tuple(targets), reason, ranks, self.turn, s, tuple(highlights))
+        self.log.append(s)
+        self.log_events.append(ev)
+        self.replay_frames.append(s, highlights, ev, self.turn, self.alive_ids(), roles)
+    def _log_kill(self, victim: int, killer: Optional[int], reason: str):
+        """kill() 成功：补记到当前最后一行（通常就是宣布这次淘汰的那一行）。"""
+        if self.fast_mode or not self.log_events:
+            return
+        ev = self.log_events[-1]
+        if ev.kind == "note":
+            ev.kind, ev.actor, ev.reason = "kill", killer, reason
+        ev.victims += (victim,)
     # ---------- 随机目标 helper（实现重做后的“集火”） ----------
     def pick_random(self, actor: int, pool: List[int], desc: str) -> Optional[int]:
         """从pool里随机选一个。若actor带 focused，则只要 pool 里包含 actor，必选 actor，并消耗 focused。"""
@@ -365,10 +1190,10 @@ class Engine:
         st = self.roles[actor].status
         if st.focused and actor in pool:
             st.focused = False
-            self._log(f"  · 集火触发：{self.N(actor)} 的随机判定必选自己（{desc}），集火消失")
+            self._log("  · 集火触发：{0:N} 的随机判定必选自己（{1}），集火消失", actor, desc)
             return actor
         return self.rng.choice(pool)
-    def set_unique_focus(self, target: int, note: str = ""):
+    def set_unique_focus(self, target: int, note: LogText = ""):
         """Ensure there is at most one focused on the field: new focus overrides the old one."""
         for cid, r in self.roles.items():
             if r.status.focused and cid != target:
@@ -388,40 +1213,42 @@ class Engine:
         else:
             st.shields += add2
             st.shield_ttl = max(st.shield_ttl, ttl)
-    def give_shield(self, cid: int, n: int = 1, ttl: int = 1, perm: bool = False, note: str = ""):
+    def give_shield(self, cid: int, n: int = 1, ttl: int = 1, perm: bool = False, note: str = "",
+                    source: Optional[int] = None):
         r = self.roles[cid]
-        before_brief = r.status.brief()
+        before_brief = r.status.fingerprint()
         if not r.alive:
             return
         before = r.status.total_shields()
         self._max2_shield_add(r.status, n, ttl=ttl, perm=perm)
         after = r.status.total_shields()
         if after > before:
-            self._log(f"  · {self.N(cid)} 获得护盾+{after-before}" + (f"（{note}）" if note else ""))
-            self._oulu_bump_on_status_change(cid, before_brief)
-    def consume_shield_once(self, cid: int) -> bool:
-        before_brief = self.roles[cid].status.brief()
+            self._log(lambda: f"  · {self.N(cid)} 获得护盾+{after-before}" + (f"（{note}）" if note else ""),
+                      kind="status_gain", targets=(cid,), reason="护盾")
+            self._oulu_bump_on_status_change(cid, before_brief, source)
+    def consume_shield_once(self, cid: int, source: Optional[int] = None) -> bool:
+        before_brief = self.roles[cid].status.fingerprint()
         st = self.roles[cid].status
         if st.shields > 0:
             st.shields -= 1
             # 找自称(25)：护盾被破后立刻上升5名
             if cid == 25 and st.shields == 0 and self.roles[25].alive and (not st.perma_disabled):
                 self.move_by(25, -5, source=None, note="护盾被破上升5名")
-            self._oulu_bump_on_status_change(cid, before_brief)
+            self._oulu_bump_on_status_change(cid, before_brief, source)
             return True
         if st.shield_perm > 0:
             st.shield_perm -= 1
-            self._oulu_bump_on_status_change(cid, before_brief)
+            self._oulu_bump_on_status_change(cid, before_brief, source)
             return True        # 洪伟之赐 / 雷霆手腕：各自抵挡一次伤害
-        if getattr(st, "hongwei_gift_shield", 0) > 0:
+        if st.hongwei_gift_shield > 0:
             st.hongwei_gift_shield = 0
-            self._log(f"  · 洪伟之赐抵死：{self.N(cid)}（消耗）")
-            self._oulu_bump_on_status_change(cid, before_brief)
+            self._log("  · 洪伟之赐抵死：{0:N}（消耗）", cid, kind="shield_block", targets=(cid,), reason="洪伟之赐")
+            self._oulu_bump_on_status_change(cid, before_brief, source)
             return True
-        if getattr(st, "thunder_wrist_shield", 0) > 0:
+        if st.thunder_wrist_shield > 0:
             st.thunder_wrist_shield = 0
-            self._log(f"  · 雷霆手腕抵死：{self.N(cid)}（消耗）")
-            self._oulu_bump_on_status_change(cid, before_brief)
+            self._log("  · 雷霆手腕抵死：{0:N}（消耗）", cid, kind="shield_block", targets=(cid,), reason="雷霆手腕")
+            self._oulu_bump_on_status_change(cid, before_brief, source)
             return True
 
         return False
@@ -440,64 +1267,111 @@ class Engine:
             return False
         return True
 
-    def _on_status_change(self, cid: int, before: str):
-        """统一处理“状态发生变化”后的被动。before/after 使用 Status.brief()。"""
-        if cid not in self.roles:
-            return
-        after = self.roles[cid].status.brief()
+    # ---------- 技能绑定 ----------
+    def _bind_skills(self):
+        """把 SKILLS 里的函数绑定到本引擎（每个引擎一次，之后 dispatch 直接查表）。"""
+        self._skills_version = SKILLS.version
+        self._actives: Dict[int, Callable[[], None]] = {cid: fn.__get__(self) for cid, fn in SKILLS.actives.items()}
+        self._death_triggers: Dict[int, Callable[[Optional[int]], None]] = {
+            cid: fn.__get__(self) for cid, fn in SKILLS.death_triggers.items()}
+        # 状态变化订阅：cid -> [(被动名, 关心的字段 或 None, handler)]
+        self._status_watchers: Dict[int, List[Tuple[str, Optional[frozenset], Callable]]] = {}
+        for cid, name, fn, fields, _scope in SKILLS.passives.get("status_change", ()):
+            self.watch_status(cid, name, fn.__get__(self), fields)
+        # 其余事件：event -> (对任意主体都要检查的钩子, {主体 cid: 上面那些 + 该角色自己的钩子})，
+        # 都按登记顺序排好。钩子为 (登记序号, 须在场存活的 cid 或 None, 已绑定的函数)
+        self._hooks: Dict[str, Tuple[list, Dict[int, list]]] = {}
+        for event, entries in SKILLS.passives.items():
+            if event == "status_change":
+                continue
+            shared: list = []
+            own: Dict[int, list] = {}
+            for seq, (cid, _name, fn, _fields, scope) in enumerate(entries):
+                hook = (seq, cid if scope == "watch" else None, fn.__get__(self))
+                if scope == "own":
+                    own.setdefault(cid, []).append(hook)
+                else:
+                    shared.append(hook)
+            self._hooks[event] = (shared, {cid: sorted(shared + hooks) for cid, hooks in own.items()})
+    def _run_hooks(self, event: str, subject: Optional[int], *args):
+        """触发 event 上登记的被动：subject 自己的 + 在场存活角色的 + 公共的，按登记顺序。"""
+        shared, merged = self._hooks.get(event, _NO_HOOKS)
+        roles = self.roles
+        for _seq, owner, fn in merged.get(subject, shared):
+            if owner is not None:
+                r = roles.get(owner)
+                if r is None or not r.alive:
+                    continue
+            fn(*args)
+    # ---------- 状态变化事件 ----------
+    def watch_status(self, cid: int, name: str, handler: Callable[[int, List[StatusChange]], None],
+                     fields: Optional[Iterable[str]] = None):
+        """订阅 cid 的状态变化。fields 为关心的显示字段（None=全部）；handler(cid, changes) 只收到这些字段的变化。"""
+        self._status_watchers.setdefault(cid, []).append(
+            (name, None if fields is None else frozenset(fields), handler))
+    def _on_status_change(self, cid: int, before: tuple, source: Optional[int] = None):
+        """统一处理“状态发生变化”后的被动。before 为变化前的 Status.fingerprint()。"""
+        self._emit_status_changes(cid, before, source, None)
+    def _oulu_bump_on_status_change(self, cid: int, before: tuple, source: Optional[int] = None):
+        """同 _on_status_change，但只通知藕禄(13) 风过无痕（护盾得失等路径只触发这一条被动）。"""
+        self._emit_status_changes(cid, before, source, "风过无痕")
+    def _emit_status_changes(self, cid: int, before: tuple, source: Optional[int], only: Optional[str]):
+        watchers = self._status_watchers.get(cid)
+        if not watchers or cid not in self.roles:
+            return
+        after = self.roles[cid].status.fingerprint()
         if after == before:
             return
-
-                # 44 冷雨霏：无懈可击——每次自身状态变化，获得1层乘胜追击（最高5）
-        if cid == 44 and self.roles[44].alive and (not self.roles[44].status.perma_disabled):
-            st44 = self.roles[44].status
-            before_chase = getattr(st44, "chase", 0)
-            st44.chase = min(3, before_chase + 1)
-            if st44.chase != before_chase:
-                self._log(f"  · 无懈可击：{self.N(44)} 获得1层【乘胜追击】(当前{st44.chase}/3)")
-
-        # 13 藕禄：风过无痕——状态变化就上升一位
-        if cid == 13 and self.roles[13].alive and (not self.roles[13].status.perma_disabled):
-            self.move_by(13, -1, source=None, note="风过无痕")
-
-        # 33 沈澄婕：特异性免疫（新获得的状态类型立即记录并给予免疫）
-        if cid == 33:
-            self._scj_sync_and_grant()
-
-        # 规则：每次“记录到新的状态效果”时，都获得1回合特异性免疫（仍受世界规则）
-        if cid == 33 and self.roles[33].alive and (not self.roles[33].status.perma_disabled):
-            before_set = set([x for x in before.split("；") if x.strip()])
-            after_set = set([x for x in after.split("；") if x.strip()])
-            gained = [x for x in (after_set - before_set) if x]
-
-            marked = set(self.roles[33].mem.get("scj_marked", []))
-            new_recorded = False
-            for tag in gained:
-                # 雷霆从1到2等升级也视为“获得新特性”并触发特异性免疫
-                if "雷霆" in tag:
-                    new_recorded = True
-                if tag not in marked:
-                    marked.add(tag)
-                    new_recorded = True
-            self.roles[33].mem["scj_marked"] = list(marked)
-
-            if new_recorded:
-                before = self.roles[33].status.spec_immune_ttl
-                self.roles[33].status.spec_immune_ttl = max(self.roles[33].status.spec_immune_ttl, 2)
-                if before == 0 and self.roles[33].status.spec_immune_ttl > 0:
-                    self.roles[33].status.spec_immune_gained_this_turn = True
-                self._log("  · 特异性免疫：记录到新状态 → 本回合无敌（仍受世界规则）")
-                self.move_by(33, -5, source=None, note="特异性免疫强化上升5名")
-
-    def _oulu_bump_on_status_change(self, cid: int, before: str):
-        """藕禄(13) 被动：状态效果发生改变时，排名上升一位。"""
-        if cid != 13:
-            return
-        if (13 not in self.roles) or (not self.roles[13].alive) or self.roles[13].status.perma_disabled:
-            return
-        after = self.roles[13].status.brief()
-        if after != before:
-            self.move_by(13, -1, source=None, note="风过无痕")
+        changes = status_changes(cid, before, after, source)
+        if not changes:
+            return
+        for name, fields, handler in watchers:
+            if only is not None and name != only:
+                continue
+            hit = changes if fields is None else [c for c in changes if c.field in fields]
+            if hit:
+                handler(cid, hit)
+    def _passive_wuxie(self, cid: int, changes: List[StatusChange]):
+        """冷雨霏(44) 无懈可击：每次自身状态变化，获得1层乘胜追击（最高3）。"""
+        if not self.roles[44].alive or self.roles[44].status.perma_disabled:
+            return
+        st44 = self.roles[44].status
+        before_chase = st44.chase
+        st44.chase = min(3, before_chase + 1)
+        if st44.chase != before_chase:
+            self._log("  · 无懈可击：{0:N} 获得1层【乘胜追击】(当前{1}/3)", 44, st44.chase)
+    def _passive_fengguo(self, cid: int, changes: List[StatusChange]):
+        """藕禄(13) 风过无痕：状态效果发生改变时，排名上升一位。"""
+        if not self.roles[13].alive or self.roles[13].status.perma_disabled:
+            return
+        self.move_by(13, -1, source=None, note="风过无痕")
+    def _passive_scj_immune(self, cid: int, changes: List[StatusChange]):
+        """沈澄婕(33) 特异性免疫：每次“记录到新的状态效果”时，获得1回合特异性免疫（仍受世界规则）。"""
+        self._scj_sync_and_grant()
+        if not self.roles[33].alive or self.roles[33].status.perma_disabled:
+            return
+        marked = set(self.roles[33].mem.scj_marked)
+        new_recorded = False
+        for c in changes:
+            tag = c.tag
+            if not tag:
+                continue
+            # 雷霆从1到2等升级也视为“获得新特性”并触发特异性免疫
+            if "雷霆" in tag:
+                new_recorded = True
+            if tag not in marked:
+                marked.add(tag)
+                new_recorded = True
+        self.roles[33].mem.scj_marked = list(marked)
+
+        if new_recorded:
+            st = self.roles[33].status
+            before = st.spec_immune_ttl
+            st.spec_immune_ttl = max(st.spec_immune_ttl, 2)
+            if before == 0 and st.spec_immune_ttl > 0:
+                st.spec_immune_gained_this_turn = True
+            self._log("  · 特异性免疫：记录到新状态 → 本回合无敌（仍受世界规则）")
+            self.move_by(33, -5, source=None, note="特异性免疫强化上升5名")
     # ---------- 绝息免疫（朱昊泽重做需求） ----------
     def _juexi_blocks(self, source: Optional[int], target: int, effect: str) -> bool:
         """若 source 带绝息且 target 为朱昊泽(4)，则朱昊泽免疫该次技能影响并消耗 source 的绝息。
@@ -512,7 +1386,7 @@ class Engine:
             return False
         if st.juexi_ttl > 0:
             st.juexi_ttl = 0
-            self._log(f"  · 【绝息免疫】{self.N(4)} 免疫来自 {self.N(source)} 的技能效果（{effect}），并使其绝息消失")
+            self._log("  · 【绝息免疫】{0:N} 免疫来自 {1:N} 的技能效果（{2}），并使其绝息消失", 4, source, effect)
             return True
         return False
 
@@ -529,21 +1403,24 @@ class Engine:
 
         # 隐身：不被任何技能选中（不包括世界规则）
         if self.roles[target].status.invisible:
-            self._log(f"  · 隐身免疫：{self.N(target)} 免疫来自 {self.N(source)} 的技能影响（{effect}）")
+            self._log("  · 隐身免疫：{0:N} 免疫来自 {1:N} 的技能影响（{2}）", target, source, effect)
             return False
 
         # 虞劲枫(35)：绝地反击
         if target == 35 and (not self.roles[35].status.perma_disabled):
-            mem = self.roles[35].mem.setdefault("yjf_hits", {})  # source->count
+            m35 = self.roles[35].mem
+            if m35.yjf_hits is None:
+                m35.yjf_hits = {}
+            hits = m35.yjf_hits  # source->count
             key = str(source)
-            mem[key] = int(mem.get(key, 0)) + 1
-            cnt = mem[key]
+            hits[key] = hits.get(key, 0) + 1
+            cnt = hits[key]
             if cnt >= 2 and source in self.roles and self.roles[source].alive:
-                self._log(f"  · 绝地反击：{self.N(35)} 第二次被 {self.N(source)} 选中 → 反击淘汰 {self.N(source)}")
+                self._log("  · 绝地反击：{0:N} 第二次被 {1:N} 选中 → 反击淘汰 {2:N}", 35, source, source)
                 # 反击为技能淘汰（source=35），绕过护盾/复活
                 self.kill(source, 35, "绝地反击反杀", bypass_shield=True, bypass_revive=True)
             else:
-                self._log(f"  · 绝地反击：{self.N(35)} 被 {self.N(source)} 选中 → 免疫（第{cnt}次）")
+                self._log("  · 绝地反击：{0:N} 被 {1:N} 选中 → 免疫（第{2}次）", 35, source, cnt)
             return False
 
         return True
@@ -552,9 +1429,9 @@ class Engine:
         """对某个状态字段做写入：走统一选中入口 + 状态变化钩子。"""
         if not self.apply_selection(source, target, note or f"状态:{attr}"):
             return False
-        before = self.roles[target].status.brief()
+        before = self.roles[target].status.fingerprint()
         setattr(self.roles[target].status, attr, value)
-        self._on_status_change(target, before)
+        self._on_status_change(target, before, source)
         return True
 
 
@@ -578,20 +1455,20 @@ class Engine:
             types.add("暮印")
         if st.focused:
             types.add("集火")
-        if getattr(st, "invisible", False):
+        if st.invisible:
             types.add("隐身")
-        if getattr(st, "fish", False):
+        if st.fish:
             types.add("鱼")
-        if getattr(st, "dying_ttl", 0) > 0:
+        if st.dying_ttl > 0:
             types.add("濒亡")
-        if getattr(st, "attached_life", False):
+        if st.attached_life:
             types.add("附生")
-        if getattr(st, "lone_wolf", False):
+        if st.lone_wolf:
             types.add("孤军奋战")
-        if getattr(st, "juexi_ttl", 0) > 0:
+        if st.juexi_ttl > 0:
             types.add("绝息")
         # 特异免疫本身也算一种状态；记录它并不会再触发自己（避免循环）
-        if getattr(st, "spec_immune_ttl", 0) > 0:
+        if st.spec_immune_ttl > 0:
             types.add("特异性免疫")
         return types
 
@@ -616,7 +1493,7 @@ class Engine:
             before = st.scj_layers
             st.scj_layers = min(3, st.scj_layers + len(newly))
             if st.scj_layers != before:
-                self._log(f"  · 【沈澄婕】记录到新存活者 {len(newly)} 名，层数 {before}→{st.scj_layers}")
+                self._log(lambda: f"  · 【沈澄婕】记录到新存活者 {len(newly)} 名，层数 {before}→{st.scj_layers}")
 
     # ---------- 双生 ----------
     # ---------- 双生 ----------
@@ -636,11 +1513,11 @@ class Engine:
         if not self.roles[partner].alive:
             return
         if self.rng.random() > 0.75:
-            self._log(f"  · 双生传导失败：{self.N(cid)} 未影响 {self.N(partner)}")
+            self._log("  · 双生传导失败：{0:N} 未影响 {1:N}", cid, partner)
             return
-        self._log(f"  · 双生传导成功：{self.N(cid)} → {self.N(partner)}（{kind}）")
+        self._log("  · 双生传导成功：{0:N} → {1:N}（{2}）", cid, partner, kind)
         if kind == "gain_shield":
-            self.give_shield(partner, 1, ttl=1, perm=False, note="双生复制护盾")
+            self.give_shield(partner, 1, ttl=1, perm=False, note="双生复制护盾", source=cid)
         elif kind in ("swap", "move"):
             d = self.rng.choice([-1, +1])
             self.move_by(partner, d, source=None, note="双生±1位移")
@@ -653,8 +1530,8 @@ class Engine:
         if partner is None or partner not in self.roles:
             return
         if self.roles[partner].alive:
-            self._log(f"  · 双生死亡反馈：{self.N(partner)} 获得护盾1层")
-            self.give_shield(partner, 1, ttl=1, perm=False, note="双生死亡反馈")
+            self._log("  · 双生死亡反馈：{0:N} 获得护盾1层", partner)
+            self.give_shield(partner, 1, ttl=1, perm=False, note="双生死亡反馈", source=dead)
     # ---------- 排名操作 ----------
     def swap(self, a: int, b: int, source: Optional[int] = None, note: str = ""):
         if not (self.roles[a].alive and self.roles[b].alive):
@@ -671,8 +1548,9 @@ class Engine:
         if pa is None or pb is None:
             return
         self.rank[pa], self.rank[pb] = self.rank[pb], self.rank[pa]
-        self._log(f"  · 交换：{self.N(a)} ⇄ {self.N(b)}" + (f"（{note}）" if note else ""))
-        self._check_shenwei_loss()
+        self._log(lambda: f"  · 交换：{self.N(a)} ⇄ {self.N(b)}" + (f"（{note}）" if note else ""),
+                  kind="swap", actor=source, targets=(a, b), reason=note, ranks=((a, pa + 1, pb + 1), (b, pb + 1, pa + 1)))
+        self._run_hooks("rank_change", None)
     def move_by(self, cid: int, delta: int, source: Optional[int] = None, note: str = ""):
         if not self.roles[cid].alive:
             return
@@ -681,10 +1559,10 @@ class Engine:
         # 防线：抵消首次下降类位移
         st = self.roles[cid].status
         if source == 29 and cid != 29:
-            self.roles[29].mem["did_displace"] = True
-        if delta > 0 and getattr(st, "defense_line_ttl", 0) > 0 and (not getattr(st, "defense_line_block", False)):
+            self.roles[29].mem.did_displace = True
+        if delta > 0 and st.defense_line_ttl > 0 and (not st.defense_line_block):
             st.defense_line_block = True
-            self._log(f"  · 防线：{self.N(cid)} 抵消一次下降位移")
+            self._log("  · 防线：{0:N} 抵消一次下降位移", cid)
             return
         if not self.apply_selection(source, cid, "位移"):
             return
@@ -695,27 +1573,27 @@ class Engine:
         if st.doubled_move_next:
             delta *= 2
             st.doubled_move_next = False
-            self._log(f"  · 厄运翻倍生效：{self.N(cid)} 本次位移数值翻倍")
+            self._log("  · 厄运翻倍生效：{0:N} 本次位移数值翻倍", cid)
         newp = max(0, min(len(self.rank) - 1, p + delta))
         if newp == p:
             return
-        self.rank.pop(p)
-        self.rank.insert(newp, cid)
-        self._log(f"  · 位移：{self.N(cid)} {p+1}→{newp+1}" + (f"（{note}）" if note else ""))
-        self._check_shenwei_loss()
+        self.rank.move(p, newp)
+        self._log(lambda: f"  · 位移：{self.N(cid)} {p+1}→{newp+1}" + (f"（{note}）" if note else ""),
+                  kind="move", actor=source, targets=(cid,), reason=note, ranks=((cid, p + 1, newp + 1),))
+        self._run_hooks("rank_change", None)
     def move_to_first(self, cid: int, source: Optional[int] = None, note: str = ""):
         """Move character to rank #1 (top) if alive and present in rank list."""
         if (cid not in self.rank) or (not self.roles[cid].alive):
             return
-        cur = self.rank.index(cid)
+        cur = self.pos(cid)
         if cur == 0:
             return
-        self.rank.pop(cur)
-        self.rank.insert(0, cid)
+        self.rank.move(cur, 0)
         if note:
-            self._log(f"  · 位移：{self.N(cid)} → 第1名（{note}）")
+            self._log("  · 位移：{0:N} → 第1名（{1}）", cid, note,
+                      kind="move", actor=source, targets=(cid,), reason=note, ranks=((cid, cur + 1, 1),))
         else:
-            self._log(f"  · 位移：{self.N(cid)} → 第1名")
+            self._log("  · 位移：{0:N} → 第1名", cid, kind="move", actor=source, targets=(cid,), ranks=((cid, cur + 1, 1),))
 
     def insert_rank(self, cid: int, new_rank: int, source: Optional[int] = None, note: str = ""):
         if not self.roles[cid].alive:
@@ -728,11 +1606,11 @@ class Engine:
         if p is None:
             return
         new_rank = max(1, min(len(self.rank), new_rank))
-        self.rank.pop(p)
-        self.rank.insert(new_rank - 1, cid)
-        self._log(f"  · 插入：{self.N(cid)} → 第{new_rank}名" + (f"（{note}）" if note else ""))
+        self.rank.move(p, new_rank - 1)
+        self._log(lambda: f"  · 插入：{self.N(cid)} → 第{new_rank}名" + (f"（{note}）" if note else ""),
+                  kind="move", actor=source, targets=(cid,), reason=note, ranks=((cid, p + 1, new_rank),))
+        self._run_hooks("rank_change", None)
     # ---------- mls 被动 ----------
-        self._check_shenwei_loss()
     def mls_try_immune(self, cid: int, effect_desc: str) -> bool:
         if cid != 10:
             return False
@@ -746,7 +1624,7 @@ class Engine:
             return False
         st.mls_immune_used_this_turn = True
         st.mls_immune_used += 1
-        self._log(f"  · mls(10) 绝对领域：免疫一次技能影响（{effect_desc}）并排名+1（已用{st.mls_immune_used}/3）")
+        self._log("  · mls(10) 绝对领域：免疫一次技能影响（{0}）并排名+1（已用{1}/3）", effect_desc, st.mls_immune_used)
         self.move_by(10, -1, source=None, note="绝对领域+1")
         return True
     def is_mls_unselectable_by_active_kill(self, target: int) -> bool:
@@ -759,7 +1637,7 @@ class Engine:
             return False
         # Streamlit helper: generic invincible toggle
         if victim in self.__dict__.get('_invincible_cids', set()):
-            self._log(f"  · 无敌：{self.N(victim)} 免疫本次淘汰（{reason}）")
+            self._log("  · 无敌：{0:N} 免疫本次淘汰（{1}）", victim, reason)
             return False
 
         # Joke mode: 找自称(25) is invincible (immune to everything, including world rules)
@@ -768,7 +1646,7 @@ class Engine:
             return False
         # 沈澄婕(33)：特异性免疫期间无敌（包含世界规则伤害），但不免疫终局末位淘汰
         if victim == 33 and self.roles[33].status.spec_immune_ttl > 0 and ("终局末位淘汰" not in reason):
-            self._log(f"  · 特异性免疫：{self.N(33)} 免疫死亡（{reason}）")
+            self._log("  · 特异性免疫：{0:N} 免疫死亡（{1}）", 33, reason)
             return False
         if self._juexi_blocks(killer, victim, reason):
             return False
@@ -780,15 +1658,14 @@ class Engine:
         # 获得永久【遗策】(perma_disabled=True)，并插至第一名；每局仅触发一次。
         if victim == 9 and (not bypass_revive):
             r9 = self.roles[9]
-            if (not r9.status.perma_disabled) and (not r9.mem.get("shufa_revive_used", False)):
-                r9.mem["shufa_revive_used"] = True
+            if (not r9.status.perma_disabled) and (not r9.mem.shufa_revive_used):
+                r9.mem.shufa_revive_used = True
                 # 立刻“复活”：本次淘汰无效化
                 r9.alive = True
                 r9.status.perma_disabled = True  # 永久遗策
                 # 清理容易导致连锁的问题状态（保守：清雷霆与濒亡）
                 r9.status.thunder = 0
-                if hasattr(r9.status, "dying_ttl"):
-                    r9.status.dying_ttl = 0
+                r9.status.dying_ttl = 0
                 # 插到第一名
                 self._log("  · 书法家(9) 死而复生：复活并获得永久【遗策】，直插第1名（本局一次）")
                 self.insert_rank(9, 1, source=None, note="书法家复活直插第一")
@@ -797,21 +1674,22 @@ class Engine:
 
         # 俞守衡(42) 鱼珠回魂：每局一次，被淘汰时改为进入濒亡3回合（濒亡期间不能行动）；不免疫世界规则
         if victim == 42 and killer is not None and (not bypass_revive) and (not self.roles[42].status.perma_disabled):
-            if not self.roles[42].mem.get("fish_soul_used", False):
-                self.roles[42].mem["fish_soul_used"] = True
-                before42 = self.roles[42].status.brief()
+            if not self.roles[42].mem.fish_soul_used:
+                self.roles[42].mem.fish_soul_used = True
+                before42 = self.roles[42].status.fingerprint()
                 self.roles[42].status.dying_ttl = 3
                 self._log("  · 鱼珠回魂：俞守衡(42) 进入【濒亡】3回合（本局一次）")
-                self._on_status_change(42, before42)
+                self._on_status_change(42, before42, 42)
                 return False
 
         # 护盾
         if not bypass_shield and self.roles[victim].status.total_shields() > 0:
-            self.consume_shield_once(victim)
-            self._log(f"  · 护盾抵死：{self.N(victim)}（{reason}）")
-            if "雷霆" in str(reason) and self.roles[victim].status.thunder >= 3:
+            self.consume_shield_once(victim, killer)
+            self._log("  · 护盾抵死：{0:N}（{1}）", victim, reason,
+                      kind="shield_block", actor=killer, targets=(victim,), reason=reason)
+            if "雷霆" in str(reason) and self.roles[victim].status.thunder >= self.params.thunder_lethal:
                 self.roles[victim].status.thunder = 0
-                self._log(f"  · 雷霆清除：{self.N(victim)} 因护盾抵消雷霆致死，雷霆归零")
+                self._log("  · 雷霆清除：{0:N} 因护盾抵消雷霆致死，雷霆归零", victim)
             # 变更：删除郑孑健“坚毅之魂”——这里不再触发任何护盾消耗斩杀
             return False
         # 左右脑复活
@@ -819,10 +1697,10 @@ class Engine:
             st = self.roles[24].status
             if st.revives_left > 0:
                 st.revives_left -= 1
-                self._log(f"  · 左右脑(24) 双重生命：立即复活（剩余{st.revives_left}）")
-                if self.roles[victim].status.thunder >= 3:
+                self._log("  · 左右脑(24) 双重生命：立即复活（剩余{0}）", st.revives_left)
+                if self.roles[victim].status.thunder >= self.params.thunder_lethal:
                     self.roles[victim].status.thunder = 0
-                    self._log(f"  · 雷霆清除：{self.N(victim)} 复活后雷霆归零")
+                    self._log("  · 雷霆清除：{0:N} 复活后雷霆归零", victim)
                 return False
         # 严雅(29) 复活直升第一机制已移除
 
@@ -830,128 +1708,141 @@ class Engine:
         # 真死亡
         self.roles[victim].alive = False
         self.roles[victim].status.thunder = 0
-        self.roles[victim].mem["dead_turn"] = self.turn
-        self.deaths_this_turn.append(DeathRecord(victim, killer, reason))
-        # 30 陈心如：回声追索（本回合发生淘汰则标记一名高于自己的角色迂回2回合）
-        if self.roles.get(30) and self.roles[30].alive and (not self.roles[30].status.perma_disabled):
-            if int(self.roles[30].mem.get("detour_turn", -1)) != self.turn:
-                self.roles[30].mem["detour_turn"] = self.turn
-                r30 = self.rank_no(30)
-                if r30 is not None:
-                    cand = []
-                    for x in self.alive_ids():
-                        if x == 30:
-                            continue
-                        rx = self.rank_no(x)
-                        if rx is not None and rx < r30:
-                            cand.append(x)
-                    if cand:
-                        t = self.rng.choice(cand)
-                        self.roles[t].status.detour_ttl = max(getattr(self.roles[t].status, "detour_ttl", 0), 2)
-                        self._log(f"  · 回声追索：{self.N(30)} 使 {self.N(t)} 获得【迂回】(2回合)")
-
-        # 37 真相解码：若存在目击时自己被淘汰，则连带凶手一起被淘汰
-        if victim == 37:
-            st37 = self.roles[37].status
-            if getattr(st37, "witness", False) and killer is not None and self.roles.get(killer) and self.roles[killer].alive:
-                self._log(f"  · 真相解码：{self.N(37)} 持有目击被淘汰 → 连带淘汰凶手 {self.N(killer)}")
-                self.kill(killer, 37, "真相解码连坐", bypass_shield=True)
-
-        # 37 破绽洞察：监听低于自己排名的来源淘汰
-        if killer is not None and victim != killer and self.roles.get(37) and self.roles[37].alive and (not self.roles[37].status.perma_disabled):
-            sr = self.rank_no(37)
-            vr = self.rank_no(victim)
-            if sr is not None and vr is not None and vr > sr:
-                st37 = self.roles[37].status
-                if not getattr(st37, "witness", False):
-                    if int(self.roles[37].mem.get("witness_block_turn", -1)) != self.turn:
-                        st37.witness = True
-                        self._log(f"  · 破绽洞察：{self.N(37)} 获得【目击】")
-                else:
-                    st37.witness = False
-                    self.roles[37].mem["witness_block_turn"] = self.turn
-                    kr = self.rank_no(killer)
-                    self._log(f"  · 破绽洞察：{self.N(37)} 目击触发 → 反制淘汰凶手 {self.N(killer)}")
-                    killed = self.kill(killer, 37, "破绽洞察反制", bypass_shield=True)
-                    if killed and kr is not None and sr is not None:
-                        diff = abs(sr - kr)
-                        if diff > 0:
-                            self._log(f"  · 破绽洞察：上升差值 {diff} 名")
-                            self.move_by(37, -diff, source=37, note="破绽洞察位移")
-
-        # 43 救赎祷言：相邻二人被淘汰后复活（场上剩余>=4）
-        if killer is not None and self.roles.get(43) and self.roles[43].alive and (not self.roles[43].status.perma_disabled):
-            alive_cnt = len(self.alive_ids())
-            if alive_cnt >= 4:
-                p43 = self.pos(43)
-                if p43 is not None:
-                    revived = []
-                    for dp in (-1, 1):
-                        q = p43 + dp
-                        if 0 <= q < len(self.rank):
-                            neigh = self.rank[q]
-                            if neigh == victim and (not self.roles[neigh].alive):
-                                self.roles[neigh].alive = True
-                                self.roles[neigh].status.dying_ttl = 0
-                                revived.append(neigh)
-                    if revived:
-                        self.roles[43].status.defense_ttl = max(getattr(self.roles[43].status, "defense_ttl", 0), 3)
-                        for x in revived:
-                            self.roles[x].status.defense_ttl = max(getattr(self.roles[x].status, "defense_ttl", 0), 3)
-                        self._log(f"  · 救赎祷言：{self.N(43)} 复活相邻被淘汰者 " + "、".join(self.N(x) for x in revived) + " 并授予【辩护】(3回合)")
-
+        self.roles[victim].mem.dead_turn = self.turn
+        rec = DeathRecord(victim, killer, reason)
+        self.deaths_this_turn.append(rec)
+        self.death_records.append(rec)
+        self._log_kill(victim, killer, reason)
+        self._run_hooks("death", victim, victim, killer, reason, bypass_revive)
         self.elimination_order.append(victim)
         self.elimination_turn[victim] = self.turn
-
-        # 随机事件NPC被淘汰：给予淘汰者特殊状态
-        if victim == getattr(self, "HW_CID", 1001):
-            if killer is not None and killer in self.roles and self.roles[killer].alive:
-                before_k = self.roles[killer].status.brief()
-                self.roles[killer].status.hongwei_gift_shield = 1
-                self._log(f"  · 洪伟陨落：{self.N(killer)} 获得【洪伟之赐】（抵挡一次伤害；每回合上升2名）")
-                self._on_status_change(killer, before_k)
-        if victim == getattr(self, "LDL_CID", 1002):
-            if killer is not None and killer in self.roles and self.roles[killer].alive:
-                before_k = self.roles[killer].status.brief()
-                self.roles[killer].status.thunder_wrist_shield = 1
-                self._log(f"  · 李东雷陨落：{self.N(killer)} 获得【雷霆手腕】（抵挡一次伤害；每回合给上一名+1雷霆）")
-                self._on_status_change(killer, before_k)
+        self._run_hooks("kill", victim, victim, killer, reason, bypass_revive)
+        return True
+    # ---------- 淘汰相关被动（登记在 SKILLS 的 death / kill 事件上） ----------
+    def _passive_huisheng(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """30 陈心如：回声追索（本回合发生淘汰则标记一名高于自己的角色迂回2回合）。"""
+        if self.roles[30].status.perma_disabled:
+            return
+        if self.roles[30].mem.detour_turn != self.turn:
+            self.roles[30].mem.detour_turn = self.turn
+            r30 = self.rank_no(30)
+            if r30 is not None:
+                cand = []
+                for x in self.alive_ids():
+                    if x == 30:
+                        continue
+                    rx = self.rank_no(x)
+                    if rx is not None and rx < r30:
+                        cand.append(x)
+                if cand:
+                    t = self.rng.choice(cand)
+                    self.roles[t].status.detour_ttl = max(self.roles[t].status.detour_ttl, 2)
+                    self._log("  · 回声追索：{0:N} 使 {1:N} 获得【迂回】(2回合)", 30, t, kind="status_gain", actor=30, targets=(t,), reason="迂回")
+    def _passive_zhenxiang(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """37 真相解码：若存在目击时自己被淘汰，则连带凶手一起被淘汰。"""
+        st37 = self.roles[37].status
+        if st37.witness and killer is not None and self.roles.get(killer) and self.roles[killer].alive:
+            self._log("  · 真相解码：{0:N} 持有目击被淘汰 → 连带淘汰凶手 {1:N}", 37, killer)
+            self.kill(killer, 37, "真相解码连坐", bypass_shield=True)
+    def _passive_pozhan(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """37 破绽洞察：监听低于自己排名的来源淘汰。"""
+        if killer is None or victim == killer or self.roles[37].status.perma_disabled:
+            return
+        sr = self.rank_no(37)
+        vr = self.rank_no(victim)
+        if sr is not None and vr is not None and vr > sr:
+            st37 = self.roles[37].status
+            if not st37.witness:
+                if self.roles[37].mem.witness_block_turn != self.turn:
+                    st37.witness = True
+                    self._log("  · 破绽洞察：{0:N} 获得【目击】", 37, kind="status_gain", actor=37, targets=(37,), reason="目击")
+            else:
+                st37.witness = False
+                self.roles[37].mem.witness_block_turn = self.turn
+                kr = self.rank_no(killer)
+                self._log("  · 破绽洞察：{0:N} 目击触发 → 反制淘汰凶手 {1:N}", 37, killer)
+                killed = self.kill(killer, 37, "破绽洞察反制", bypass_shield=True)
+                if killed and kr is not None and sr is not None:
+                    diff = abs(sr - kr)
+                    if diff > 0:
+                        self._log("  · 破绽洞察：上升差值 {0} 名", diff)
+                        self.move_by(37, -diff, source=37, note="破绽洞察位移")
+    def _passive_jiushu(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """43 救赎祷言：相邻二人被淘汰后复活（场上剩余>=4）。"""
+        if killer is None or self.roles[43].status.perma_disabled:
+            return
+        alive_cnt = len(self.alive_ids())
+        if alive_cnt >= 4:
+            p43 = self.pos(43)
+            if p43 is not None:
+                revived = []
+                for dp in (-1, 1):
+                    q = p43 + dp
+                    if 0 <= q < len(self.rank):
+                        neigh = self.rank[q]
+                        if neigh == victim and (not self.roles[neigh].alive):
+                            self.roles[neigh].alive = True
+                            self.roles[neigh].status.dying_ttl = 0
+                            revived.append(neigh)
+                if revived:
+                    self.roles[43].status.defense_ttl = max(self.roles[43].status.defense_ttl, 3)
+                    for x in revived:
+                        self.roles[x].status.defense_ttl = max(self.roles[x].status.defense_ttl, 3)
+                    self._log(lambda: f"  · 救赎祷言：{self.N(43)} 复活相邻被淘汰者 " + "、".join(self.N(x) for x in revived) + " 并授予【辩护】(3回合)")
+    def _passive_hongwei_fall(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """随机事件NPC 洪伟被淘汰：淘汰者获得洪伟之赐。"""
+        if killer is not None and killer in self.roles and self.roles[killer].alive:
+            before_k = self.roles[killer].status.fingerprint()
+            self.roles[killer].status.hongwei_gift_shield = 1
+            self._log("  · 洪伟陨落：{0:N} 获得【洪伟之赐】（抵挡一次伤害；每回合上升2名）", killer,
+                      kind="status_gain", targets=(killer,), reason="洪伟之赐")
+            self._on_status_change(killer, before_k, victim)
+    def _passive_lidonglei_fall(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """随机事件NPC 李东雷被淘汰：淘汰者获得雷霆手腕。"""
+        if killer is not None and killer in self.roles and self.roles[killer].alive:
+            before_k = self.roles[killer].status.fingerprint()
+            self.roles[killer].status.thunder_wrist_shield = 1
+            self._log("  · 李东雷陨落：{0:N} 获得【雷霆手腕】（抵挡一次伤害；每回合给上一名+1雷霆）", killer,
+                      kind="status_gain", targets=(killer,), reason="雷霆手腕")
+            self._on_status_change(killer, before_k, victim)
+    def _passive_lone_wolf_on_kill(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
         self.check_qiyinlu_lone_wolf()
-
-        # 李知雨(31) 改动：若被【世界规则处决】淘汰，则随机给一名存活者施加【附生】（每局一次）。
-        if victim == 31 and killer is None and (not bypass_revive) and (reason == "世界规则处决"):
-            if not self.roles[31].mem.get("candle_used", False):
-                self.roles[31].mem["candle_used"] = True
+    def _passive_candle_world(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """李知雨(31) 改动：若被【世界规则处决】淘汰，则随机给一名存活者施加【附生】（每局一次）。"""
+        if killer is None and (not bypass_revive) and (reason == "世界规则处决"):
+            if not self.roles[31].mem.candle_used:
+                self.roles[31].mem.candle_used = True
                 candidates = [c for c in self.alive_ids()
                               if c != 31 and c not in (getattr(self, "HW_CID", 1001), getattr(self, "LDL_CID", 1002))]
                 if candidates:
                     t = self.rng.choice(candidates)
-                    before_t = self.roles[t].status.brief()
+                    before_t = self.roles[t].status.fingerprint()
                     self.roles[t].status.attached_life = True
-                    self.roles[t].mem["attached_life_of"] = 31
-                    self._log(f"  · 残灯复明：世界规则淘汰李知雨(31) → 随机使 {self.N(t)} 获得【附生】")
-                    self._on_status_change(t, before_t)
+                    self.roles[t].mem.attached_life_of = 31
+                    self._log("  · 残灯复明：世界规则淘汰李知雨(31) → 随机使 {0:N} 获得【附生】", t,
+                              kind="status_gain", actor=31, targets=(t,), reason="附生")
+                    self._on_status_change(t, before_t, 31)
                 else:
                     self._log("  · 残灯复明：但无人可获得【附生】")
-        # 李知雨(31) 残灯复明：被淘汰时给淘汰者附生；附生者再死则31复活顶替（每局一次）
-        if victim == 31:
-            if not self.roles[31].mem.get("candle_used", False):
-                self.roles[31].mem["candle_used"] = True
-                if killer is not None and killer in self.roles and self.roles[killer].alive:
-                    uses = int(self.roles[31].mem.get("attached_uses", 0)) if 31 in self.roles else 0
-                    if uses >= 2:
-                        self._log("  · 残灯复明：本局附生已触发2次 → 不再给予【附生】")
-                    else:
-                        before_k = self.roles[killer].status.brief()
-                        self.roles[killer].status.attached_life = True
-                        self.roles[killer].mem["attached_life_of"] = 31
-                        if 31 in self.roles:
-                            self.roles[31].mem["attached_uses"] = uses + 1
-                        self._log(f"  · 残灯复明：{self.N(killer)} 获得【附生】")
-                        self._on_status_change(killer, before_k)
-
-        # 附生触发：附生者被淘汰 → 李知雨(31) 立刻复活并顶替其位置
-        if self.roles[victim].status.attached_life and self.roles[victim].mem.get("attached_life_of") == 31:
+    def _passive_candle(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """李知雨(31) 残灯复明：被淘汰时给淘汰者附生；附生者再死则31复活顶替（每局一次）。"""
+        if not self.roles[31].mem.candle_used:
+            self.roles[31].mem.candle_used = True
+            if killer is not None and killer in self.roles and self.roles[killer].alive:
+                uses = self.roles[31].mem.attached_uses if 31 in self.roles else 0
+                if uses >= 2:
+                    self._log("  · 残灯复明：本局附生已触发2次 → 不再给予【附生】")
+                else:
+                    before_k = self.roles[killer].status.fingerprint()
+                    self.roles[killer].status.attached_life = True
+                    self.roles[killer].mem.attached_life_of = 31
+                    if 31 in self.roles:
+                        self.roles[31].mem.attached_uses = uses + 1
+                    self._log("  · 残灯复明：{0:N} 获得【附生】", killer, kind="status_gain", actor=31, targets=(killer,), reason="附生")
+                    self._on_status_change(killer, before_k, 31)
+    def _passive_candle_attached(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """附生触发：附生者被淘汰 → 李知雨(31) 立刻复活并顶替其位置。"""
+        if self.roles[victim].status.attached_life and self.roles[victim].mem.attached_life_of == 31:
             if 31 in self.roles and (not self.roles[31].alive):
                 pos = self.pos(victim)
                 self.roles[31].alive = True
@@ -963,28 +1854,26 @@ class Engine:
                     self.rank = [cid for cid in self.rank if cid != 31]
                     self.rank.insert(pos, 31)
                 self._compact()
-                self._log(f"  · 残灯复明：附生者 {self.N(victim)} 被淘汰 → 李知雨(31) 复活并顶替其位置")
-        # 找自称：祝福叠加/兑换护盾
-        if victim != 25 and (25 in self.roles) and self.roles[25].alive and (not self.roles[25].status.perma_disabled):
-            st25 = self.roles[25].status
-            st25.mem_bless = st25.__dict__.get("mem_bless", 0)  # 兼容：不新增字段也能用
-            st25.mem_bless += 1
-            st25.__dict__["mem_bless"] = st25.mem_bless
-            self._log(f"  · 找自称(25) 获得祝福+1（现为{st25.mem_bless}层）")
-            if st25.mem_bless >= 8:
-                self._log("  · 找自称(25) 祝福叠满8层：兑换1层护盾，并清空祝福")
-                self.give_shield(25, 1, ttl=1, perm=False, note="祝福兑换护盾")
-                st25.__dict__["mem_bless"] = 0
-
-        # Sunny死亡：仅第一次被淘汰时，击败者获得腐化；第二次被淘汰不再赋予腐化
-        if victim == 26:
-            dt = self.roles[26].mem.get("death_times", 0) + 1
-            self.roles[26].mem["death_times"] = dt
-            if dt == 1 and killer is not None and killer in self.roles and self.roles[killer].alive:
-                if not self.roles[killer].status.corrupted:
-                    self.roles[killer].status.corrupted = True
-                    self._log(f"  · 【天命使然】{self.N(killer)} 获得腐化")
-        return True
+                self._log("  · 残灯复明：附生者 {0:N} 被淘汰 → 李知雨(31) 复活并顶替其位置", victim)
+    def _passive_bless(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """找自称(25)：他人被淘汰时祝福叠加，叠满8层兑换护盾。"""
+        if victim == 25 or self.roles[25].status.perma_disabled:
+            return
+        st25 = self.roles[25].status
+        st25.mem_bless += 1
+        self._log("  · 找自称(25) 获得祝福+1（现为{0}层）", st25.mem_bless)
+        if st25.mem_bless >= 8:
+            self._log("  · 找自称(25) 祝福叠满8层：兑换1层护盾，并清空祝福")
+            self.give_shield(25, 1, ttl=1, perm=False, note="祝福兑换护盾", source=25)
+            st25.mem_bless = 0
+    def _passive_tianming(self, victim: int, killer: Optional[int], reason: str, bypass_revive: bool):
+        """Sunny(26) 死亡：仅第一次被淘汰时，击败者获得腐化；第二次被淘汰不再赋予腐化。"""
+        dt = self.roles[26].mem.death_times + 1
+        self.roles[26].mem.death_times = dt
+        if dt == 1 and killer is not None and killer in self.roles and self.roles[killer].alive:
+            if not self.roles[killer].status.corrupted:
+                self.roles[killer].status.corrupted = True
+                self._log("  · 【天命使然】{0:N} 获得腐化", killer)
     # =========================
     # 新开局 / 回合推进
     # =========================
@@ -1017,22 +1906,42 @@ class Engine:
         self.no_death_streak = 0
         self.pending_endgame_execute = False
         self.log = []
-        self.replay_frames = []
+        self.log_events = []
+        self.replay_frames = ReplayFrames()
         self.deaths_this_turn = []
+        self.death_records = []
         self.elimination_order = []
         for r in self.roles.values():
             r.alive = True
             r.status = Status()
-            r.mem = {}
+            r.mem.reset()
         # 初始排名随机
-        self.rank = list(self.roles.keys())
-        self.rng.shuffle(self.rank)
+        order = list(self.roles.keys())
+        self.rng.shuffle(order)
+        self.rank = order
         # 每局随机生成一次“技能发动顺序”，之后每回合按此顺序循环（仅对存活且有主动技能者生效）
         self.skill_order = self.rank[:]  # 以初始排名的随机结果作为基础，再打乱一次更独立
         self.rng.shuffle(self.skill_order)
         # 双生：藕禄(13) 随机绑定（发动时绑定一次）
         self.twin_pair = (13, -1)
         self._log("【新开局】已生成初始排名")
+        self._undo = deque(maxlen=self.undo_depth)
+        if self.undo_depth:
+            self._undo.append(self.checkpoint())
+    def reset(self, seed: Optional[int] = None):
+        """原地重开一局（复用已建好的角色表/正则），供批量模拟重复使用同一个引擎。
+
+        只清理对局间会残留的可变状态，再走 new_game()；结果与 Engine(seed, ...) 新建完全一致。
+        """
+        self.base_seed = seed
+        self.skill_exception_count = 0
+        self.skill_exception_examples = []
+        self._active_logged = set()
+        self.elimination_turn = {}
+        self.start_rank_snapshot = {}
+        if self._skills_version != SKILLS.version:
+            self._bind_skills()
+        self.new_game()
     def spread_corruption_and_check(self):
         alive = self.alive_ids()
         if not alive:
@@ -1040,34 +1949,37 @@ class Engine:
         sources = [cid for cid in alive if self.roles[cid].status.corrupted]
         if sources:
             to_infect = set()
+            infector: Dict[int, int] = {}  # 被感染者 -> 传染给他的腐化者（状态变化的来源）
             for cid in sources:
                 p = self.pos(cid)
                 if p is None:
                     continue
-                if p - 1 >= 0:
-                    to_infect.add(self.rank[p - 1])
-                if p + 1 < len(self.rank):
-                    to_infect.add(self.rank[p + 1])
+                for q in (p - 1, p + 1):
+                    if 0 <= q < len(self.rank):
+                        to_infect.add(self.rank[q])
+                        infector.setdefault(self.rank[q], cid)
             newly = [x for x in to_infect if self.roles[x].alive and (not self.roles[x].status.corrupted)]
             for x in newly:
-                before_x = self.roles[x].status.brief()
+                before_x = self.roles[x].status.fingerprint()
                 self.roles[x].status.corrupted = True
-                self._oulu_bump_on_status_change(x, before_x)
+                self._oulu_bump_on_status_change(x, before_x, infector[x])
             if newly:
-                self._log("【腐化】扩散：" + "、".join(self.N(x) for x in newly))
+                self._log(lambda: "【腐化】扩散：" + "、".join(self.N(x) for x in newly))
         alive = self.alive_ids()
         if alive and all(self.roles[cid].status.corrupted for cid in alive):
             self._log("【腐化】全场腐化达成：清除所有腐化效果")
             for cid in self.roles:
-                before_c = self.roles[cid].status.brief()
+                before_c = self.roles[cid].status.fingerprint()
                 self.roles[cid].status.corrupted = False
                 self._oulu_bump_on_status_change(cid, before_c)
+            if 26 not in self.roles:
+                return
             st26 = self.roles[26].status
             if not st26.sunny_revive_used:
                 st26.sunny_revive_used = True
                 if not self.roles[26].alive:
                     self.roles[26].alive = True
-                    if st26.thunder >= 3:
+                    if st26.thunder >= self.params.thunder_lethal:
                         st26.thunder = 0
                         self._log("  · 雷霆清除：Sunny 复活后雷霆归零")
                     self._compact()
@@ -1081,16 +1993,157 @@ class Engine:
         if self.game_over:
             self._log("【提示】本局已结束，请点击【新开局】重新开始。")
             return
+        self._play_turn()
+        if self.undo_depth:
+            self._undo.append(self.checkpoint())
+    # ---------- 悔棋 ----------
+    def checkpoint(self) -> TurnCheckpoint:
+        """当前局面的检查点。只拷字段值，耗时与角色数成正比，与已进行的回合数无关。"""
+        version, words, gauss = self.rng.getstate()
+        role_state = {}
+        for cid, r in self.roles.items():
+            st = r.status
+            role_state[cid] = (r.alive, r.name, st,
+                               _undo_values(_status_state(st), _STATUS_CONTAINERS),
+                               _undo_values(_mem_state(r.mem), _MEM_CONTAINERS))
+        return TurnCheckpoint(
+            turn=self.turn,
+            rng_state=(version, array.array("I", words), gauss),
+            rank=tuple(self.rank),
+            roles=dict(self.roles),
+            role_state=role_state,
+            fields=_undo_values(_engine_undo_state(self), _UNDO_CONTAINERS),
+            log_len=len(self.log),
+            death_len=len(self.death_records),
+            frames=self.replay_frames,
+        )
+    def restore(self, cp: TurnCheckpoint):
+        """把局面还原到检查点（检查点本身不被改动，可以反复还原）。"""
+        version, words, gauss = cp.rng_state
+        self.rng.setstate((version, tuple(words), gauss))
+        if self.roles.keys() != cp.roles.keys():
+            self.roles.clear()
+            self.roles.update(cp.roles)
+        # 没变的字段不重写（现场的容器本来就是另一份拷贝，内容相等即可）
+        for cid, (alive, name, st, st_state, mem_state) in cp.role_state.items():
+            r = self.roles[cid]
+            if r.alive != alive:
+                r.alive = alive
+            if r.name != name:
+                r.name = name
+            if r.status is not st:
+                r.status = st
+            if _status_state(st) != st_state:
+                st.__setstate__(_undo_values(st_state, _STATUS_CONTAINERS))
+            mem = r.mem
+            if _mem_state(mem) != mem_state:
+                for n, v in zip(RoleMem.__slots__, _undo_values(mem_state, _MEM_CONTAINERS)):
+                    setattr(mem, n, v)
+        for n, v in zip(_UNDO_FIELDS, _undo_values(cp.fields, _UNDO_CONTAINERS)):
+            setattr(self, n, v)
+        self.rank = list(cp.rank)
+        del self.log[cp.log_len:]
+        del self.log_events[cp.log_len:]
+        del self.death_records[cp.death_len:]
+        self.replay_frames = cp.frames
+    @property
+    def can_undo(self) -> bool:
+        return len(self._undo) > 1
+    def undo_turn(self) -> bool:
+        """退回上一回合结束时的局面；之后再 tick_alive_turns() + next_turn() 会原样重演被撤销的回合。"""
+        if len(self._undo) < 2:
+            return False
+        self._undo.pop()
+        self.restore(self._undo[-1])
+        return True
+    # ---------- 存档 / 分支 ----------
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k not in _ENGINE_TRANSIENT}
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_transient()
+    def _reset_transient(self):
+        self._alive_rank = None
+        self._alive_key = (-1, -1)
+        self._alive_cache = ()
+        self._alive_at = None
+        self._bind_skills()
+    def fork(self, history: bool = True, fast_mode: Optional[bool] = None) -> "Engine":
+        """当前局面的独立副本，之后两边各自推演、互不影响（比 copy.deepcopy 快一个量级）。
+
+        随机数状态也一并复制：不重新播种的话，分支会原样重演同一个未来（e.rng.seed(x) 换一条）。
+        history=False 不带日志/回放帧（推演用）；fast_mode=None 保持原设置。
+        悔棋检查点引用的是原引擎的对象，不复制：分支从当前局面重新开始记录。
+        """
+        new = type(self).__new__(type(self))
+        d = new.__dict__
+        for k, v in self.__dict__.items():
+            if k not in _ENGINE_TRANSIENT:
+                d[k] = v.copy() if isinstance(v, (list, dict, set)) else v
+        new.rng = random.Random()
+        new.rng.setstate(self.rng.getstate())
+        new.roles = RoleTable({cid: r.copy() for cid, r in self.roles.items()})
+        new.rank = list(self._rank)
+        if history:
+            # kill() 会改写最后一条 LogEvent：这一条各用各的
+            if new.log_events:
+                new.log_events[-1] = replace(new.log_events[-1])
+            new.replay_frames = self.replay_frames.copy()
+            frames = new.replay_frames._frames
+            if frames and new.log_events and frames[-1][2] is self.log_events[-1]:
+                frames[-1] = frames[-1][:2] + (new.log_events[-1],) + frames[-1][3:]
+        else:
+            new.log = []
+            new.log_events = []
+            new.replay_frames = ReplayFrames()
+        if fast_mode is not None:
+            new.fast_mode = fast_mode
+            new.undo_depth = 0 if fast_mode else UNDO_DEPTH
+        new._undo = deque(maxlen=new.undo_depth)
+        new._reset_transient()
+        if new.undo_depth:
+            new._undo.append(new.checkpoint())
+        return new
+    def dumps(self, history: bool = True) -> bytes:
+        """完整局面的二进制存档（含随机数状态），loads() 读回后继续推演与原局完全一致。
+
+        history=False 不带日志/回放帧/悔棋检查点，体积小得多（复现崩溃、分支推演够用）。
+        存档就是 pickle：只读自己存的档。
+        """
+        obj = self if history else self.fork(history=False)
+        body = zlib.compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+        return SAVE_MAGIC + struct.pack("<H", SAVE_VERSION) + body
+    @classmethod
+    def loads(cls, data: bytes) -> "Engine":
+        if data[:len(SAVE_MAGIC)] != SAVE_MAGIC:
+            raise ValueError("not a game save")
+        (version,) = struct.unpack_from("<H", data, len(SAVE_MAGIC))
+        if version != SAVE_VERSION:
+            raise ValueError(f"unsupported save version: {version}")
+        e = pickle.loads(zlib.decompress(data[len(SAVE_MAGIC) + 2:]))
+        if not isinstance(e, cls):
+            raise ValueError(f"save does not contain a {cls.__name__}")
+        return e
+    def save(self, path: str, history: bool = True):
+        """写存档文件（先写临时文件再替换，写到一半中断不会留下坏档）。"""
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.dumps(history))
+        os.replace(tmp, path)
+    @classmethod
+    def load(cls, path: str) -> "Engine":
+        with open(path, "rb") as f:
+            return cls.loads(f.read())
+    def _play_turn(self):
         self.turn += 1
         # ---- Per-turn status TTL decay (fix: purify expires correctly) ----
         for _cid, _r in self.roles.items():
             st = _r.status
             # Purify: lasts exactly N turns, then expires
-            if hasattr(st, "purify_ttl"):
-                if st.purify_ttl > 0:
-                    st.purify_ttl -= 1
-                    if st.purify_ttl <= 0:
-                        st.purify_ttl = 0
+            if st.purify_ttl > 0:
+                st.purify_ttl -= 1
+                if st.purify_ttl <= 0:
+                    st.purify_ttl = 0
         # ---------------------------------------------------------------
 
         self._active_logged.clear()
@@ -1099,18 +2152,18 @@ class Engine:
         for _cid, _r in self.roles.items():
             _r.status.spec_immune_gained_this_turn = False
         if self.roles.get(29):
-            self.roles[29].mem["did_kill"] = False
-            self.roles[29].mem["did_displace"] = False
+            self.roles[29].mem.did_kill = False
+            self.roles[29].mem.did_displace = False
         
         # store start-of-turn ranks
         for _cid in self.alive_ids():
-            self.roles[_cid].mem["start_rank"] = self.rank_no(_cid)
+            self.roles[_cid].mem.start_rank = self.rank_no(_cid)
         # store start-of-turn status signature for 严雅(29) excluding 静默
-        if self.roles.get(28) and self.roles[28].alive:
-            self.roles[29].mem["start_status_no_silent"] = self._status_sig_no_silent(28)
-        self.replay_frames = []
+        if self.roles.get(28) and self.roles[28].alive and self.roles.get(29):
+            self.roles[29].mem.start_status_no_silent = self._status_sig_no_silent(28)
+        self.replay_frames = ReplayFrames()
         self._log("")
-        self._log(f"========== 【第{self.turn}回合开始】 ==========")
+        self._log("========== 【第{0}回合开始】 ==========", self.turn, kind="turn_boundary")
         self.start_rank_snapshot = {cid: self.rank_no(cid) for cid in self.alive_ids()}
 
 
@@ -1125,15 +2178,15 @@ class Engine:
                     if len(alive_now2) >= 2:
                         target = alive_now2[-1]
                         if target != 36:
-                            self._log(f"【神威】处决末位：{self.N(target)}（可被护盾抵消）")
+                            self._log("【神威】处决末位：{0:N}（可被护盾抵消）", target)
                             self.kill(target, 36, "神威处决", bypass_shield=False, bypass_revive=False)
                             self.step_death_triggers()
                             self._compact()
         # 回合开始：末位斩杀待执行
         alive_now = self.alive_ids()
-        if self.pending_endgame_execute and alive_now and len(alive_now) <= 3:
+        if self.pending_endgame_execute and alive_now and len(alive_now) <= self.params.endgame_alive:
             target = alive_now[-1]
-            self._log(f"【末位斩杀】执行：斩杀末位 {self.N(target)}（可被护盾抵消）")
+            self._log("【末位斩杀】执行：斩杀末位 {0:N}（可被护盾抵消）", target)
             self.kill(target, None, "末位斩杀", bypass_shield=False, bypass_revive=False)
             self.step_death_triggers()
             self._compact()
@@ -1161,53 +2214,57 @@ class Engine:
         self.step_update_and_cleanup()
         # 连续无人死亡计数（仅终局≤3）
         alive_after = self.alive_ids()
-        if len(alive_after) <= 3:
+        if len(alive_after) <= self.params.endgame_alive:
             if len(self.deaths_this_turn) == 0:
                 self.no_death_streak += 1
             else:
                 self.no_death_streak = 0
         else:
             self.no_death_streak = 0
-        self._log(f"========== 【第{self.turn}回合结束】 存活{len(self.alive_ids())}人；连续无人死亡={self.no_death_streak} ==========")
+        self._log(lambda: f"========== 【第{self.turn}回合结束】 存活{len(self.alive_ids())}人；连续无人死亡={self.no_death_streak} ==========",
+                  kind="turn_boundary")
         alive = self.alive_ids()
         if not alive:
             self.game_over = True
             return
-        if len(alive) > 3:
+        if len(alive) > self.params.endgame_alive:
             self.pending_endgame_execute = False
         else:
-            if (not self.pending_endgame_execute) and self.no_death_streak >= 3:
+            if (not self.pending_endgame_execute) and self.no_death_streak >= self.params.endgame_no_death_turns:
                 self.pending_endgame_execute = True
-                self._log("【末位斩杀】存活≤3且连续3回合无人淘汰：下一回合将斩杀末位（可被护盾抵消）")
+                self._log("【末位斩杀】存活≤{0}且连续{1}回合无人淘汰：下一回合将斩杀末位（可被护盾抵消）", self.params.endgame_alive, self.params.endgame_no_death_turns)
         # 胜利判定
         alive = self.alive_ids()
         if len(alive) == 1:
             winner = alive[0]
             second = self.elimination_order[-1] if len(self.elimination_order) >= 1 else None
             third = self.elimination_order[-2] if len(self.elimination_order) >= 2 else None
-            self._log(f"🏆【胜利】{self.N(winner)} 活到最后，获得胜利！")
+            self._log("🏆【胜利】{0:N} 活到最后，获得胜利！", winner)
             if second is not None:
-                self._log(f"🥈【第二名】{self.N(second)}")
+                self._log("🥈【第二名】{0:N}", second)
             if third is not None:
-                self._log(f"🥉【第三名】{self.N(third)}")
+                self._log("🥉【第三名】{0:N}", third)
             self.game_over = True
     # =========================
     # 步骤1：世界规则
     # =========================
     def step_world_rule(self):
+        P = self.params
         alive = self.alive_ids()
-        if len(alive) < 4:
-            self._log("【世界规则】存活人数不足4，不触发")
+        need = max(P.world_rule_min_alive, P.world_rule_execute_rank)
+        if len(alive) < need:
+            self._log("【世界规则】存活人数不足{0}，不触发", need)
             return
         # 世界事件开始
         self.world_event_triggered_this_turn = True
         # 沈澄婕(33)：若触发世界事件且有特异性免疫 -> 立刻插入第一
-        if self.roles.get(33) and self.roles[33].alive and getattr(self.roles[33].status, 'spec_immune_ttl', 0) > 0:
-            self._log(f"【沈澄婕】世界事件触发且有特异性免疫 → 立刻插入第一")
+        if self.roles.get(33) and self.roles[33].alive and self.roles[33].status.spec_immune_ttl > 0:
+            self._log("【沈澄婕】世界事件触发且有特异性免疫 → 立刻插入第一")
             self.insert_rank(33, 1, note="沈澄婕-世界事件免疫")
-        target4 = alive[3]
-        self._log(f"【世界规则】处决第4名：{self.N(target4)}")
-        if target4 == 20 and (not self.roles[11].alive) and (not self.roles[20].status.perma_disabled):
+        target4 = alive[P.world_rule_execute_rank - 1]
+        self._log("【世界规则】处决第{0}名：{1:N}", P.world_rule_execute_rank, target4)
+        son_dead = (11 in self.roles) and (not self.roles[11].alive)
+        if target4 == 20 and son_dead and (not self.roles[20].status.perma_disabled):
             st = self.roles[20].status
             if not st.father_world_immune_used:
                 st.father_world_immune_used = True
@@ -1216,7 +2273,8 @@ class Engine:
                 self.kill(target4, None, "世界规则处决", bypass_shield=False)
         else:
             self.kill(target4, None, "世界规则处决", bypass_shield=False)
-        if (not self.roles[11].alive) and self.roles[20].alive and (not self.roles[20].status.perma_disabled):
+        son_dead = (11 in self.roles) and (not self.roles[11].alive)
+        if son_dead and self.roles.get(20) and self.roles[20].alive and (not self.roles[20].status.perma_disabled):
             st = self.roles[20].status
             if st.father_world_boost_count < 3:
                 st.father_world_boost_count += 1
@@ -1227,22 +2285,22 @@ class Engine:
         if not alive:
             return
         thunder_targets: List[int] = []
-        for idx in (4, 5, 6):
-            if idx < len(alive):
-                thunder_targets.append(alive[idx])
+        for no in P.thunder_ranks:
+            if 0 < no <= len(alive):
+                thunder_targets.append(alive[no - 1])
         if thunder_targets:
-            self._log("【世界规则】雷霆降临：第5/6/7名获得一层雷霆")
+            self._log(lambda: f"【世界规则】雷霆降临：第{'/'.join(str(no) for no in P.thunder_ranks)}名获得一层雷霆")
             for t in thunder_targets:
                 if not self.roles[t].alive:
                     continue
                 st = self.roles[t].status
-                before_t = self.roles[t].status.brief()
+                before_t = self.roles[t].status.fingerprint()
                 st.thunder += 1
                 self._oulu_bump_on_status_change(t, before_t)
-                self._log(f"  · {self.N(t)} 雷霆层数={st.thunder}")
-                if st.thunder >= 3:
-                    self._log(f"  · 雷霆满3：{self.N(t)} 立刻死亡")
-                    self.kill(t, None, "雷霆叠满3层处决", bypass_shield=False, bypass_revive=True)
+                self._log("  · {0:N} 雷霆层数={1}", t, st.thunder)
+                if st.thunder >= P.thunder_lethal:
+                    self._log("  · 雷霆满{0}：{1:N} 立刻死亡", P.thunder_lethal, t)
+                    self.kill(t, None, P.thunder_reason, bypass_shield=False, bypass_revive=True)
         self._compact()
     
     # =========================
@@ -1264,13 +2322,13 @@ class Engine:
         """
         随机事件触发（世界规则后、角色技能前）：
         - 第1回合不触发
-        - 每回合 25% 概率触发
-        - 触发后等概率抽取 1 个事件并执行
+        - 每回合 25% 概率触发（params.event_chance）
+        - 触发后等概率抽取 1 个事件并执行（params.event_weights 不全相等时按权重抽取）
         - 日志输出金色行：触发随机事件：【事件名】！（简短描述）
         """
         if self.turn <= 1:
             return
-        if self.rng.random() >= 0.25:
+        if self.rng.random() >= self.params.event_chance:
             return
 
         events = [
@@ -1281,27 +2339,35 @@ class Engine:
             ("氧化还原反应", self._ev_redox),
             ("骰子", self._ev_shuffle_rank),
         ]
-        name, fn = self.rng.choice(events)
+        weights = [self.params.event_weights.get(name, 1.0) for name, _fn in events]
+        if len(set(weights)) == 1:
+            if weights[0] <= 0:
+                return
+            name, fn = self.rng.choice(events)
+        else:
+            name, fn = self.rng.choices(events, weights=weights)[0]
         desc = fn() or ""
-        if desc:
-            self._log(f"触发随机事件：【{name}】！{desc}")
+        if callable(desc):
+            self._log(lambda: f"触发随机事件：【{name}】！{desc()}", kind="event_trigger", reason=name)
+        elif desc:
+            self._log("触发随机事件：【{0}】！{1}", name, desc, kind="event_trigger", reason=name)
         else:
-            self._log(f"触发随机事件：【{name}】！")
+            self._log("触发随机事件：【{0}】！", name, kind="event_trigger", reason=name)
         self._compact()
 
     def _ev_spawn_hw(self) -> str:
         cid = getattr(self, "HW_CID", 1001)
         self._ensure_npc(cid, "洪伟")
-        self.roles[cid].mem["npc_casts"] = 0
+        self.roles[cid].mem.npc_casts = 0
         return "洪伟加入游戏，并将在接下来3回合（世界规则后）施放技能。"
 
     def _ev_spawn_ldl(self) -> str:
         cid = getattr(self, "LDL_CID", 1002)
         self._ensure_npc(cid, "李东雷")
-        self.roles[cid].mem["npc_casts"] = 0
+        self.roles[cid].mem.npc_casts = 0
         return "李东雷加入游戏，并将在接下来3回合（世界规则后）施放技能。"
 
-    def _ev_ice_sun(self) -> str:
+    def _ev_ice_sun(self) -> LogText:
         # 随机复活三名已阵亡角色（排除容易出bug的特例）
         dead = []
         for cid, r in self.roles.items():
@@ -1310,10 +2376,10 @@ class Engine:
             if cid in (getattr(self, "HW_CID", 1001), getattr(self, "LDL_CID", 1002)):
                 continue
             # Sunnydayorange 腐化时不复活
-            if cid == 26 and getattr(r.status, "corrupted", False):
+            if cid == 26 and r.status.corrupted:
                 continue
             # 李知雨：避免“附生/残灯”等链式状态导致错位（保守：已触发残灯不复活）
-            if cid == 31 and r.mem.get("candle_used", False):
+            if cid == 31 and r.mem.candle_used:
                 continue
             dead.append(cid)
 
@@ -1332,20 +2398,19 @@ class Engine:
             st = self.roles[cid].status
             # 复活时清理部分容易连锁的即时状态（保守）
             st.thunder = 0
-            if hasattr(st, "dying_ttl"):
-                st.dying_ttl = 0
+            st.dying_ttl = 0
             # 插入到随机位置
             if cid not in self.rank:
                 pos = self.rng.randint(0, len(self.rank))
                 self.rank.insert(pos, cid)
 
-        return "复活了 " + "、".join(self.N(c) for c in picks) + "。"
+        return lambda: "复活了 " + "、".join(self.N(c) for c in picks) + "。"
 
     def _ev_reverse_rank(self) -> str:
         self.rank = list(reversed(self.rank))
         return "所有人排名完全颠倒。"
 
-    def _ev_redox(self) -> str:
+    def _ev_redox(self) -> LogText:
         alive = [cid for cid in self.alive_ids()
                  if cid not in (getattr(self, "HW_CID", 1001), getattr(self, "LDL_CID", 1002))]
         if not alive:
@@ -1358,18 +2423,20 @@ class Engine:
         reduc = rest[:2] if len(rest) >= 2 else (rest[:] if rest else oxid[:2])
 
         for cid in oxid:
-            before = self.roles[cid].status.brief()
-            self.roles[cid].status.oxid_ttl = max(getattr(self.roles[cid].status, "oxid_ttl", 0), 3)
+            before = self.roles[cid].status.fingerprint()
+            self.roles[cid].status.oxid_ttl = max(self.roles[cid].status.oxid_ttl, 3)
             self._on_status_change(cid, before)
         for cid in reduc:
-            before = self.roles[cid].status.brief()
-            self.roles[cid].status.reduce_ttl = max(getattr(self.roles[cid].status, "reduce_ttl", 0), 3)
+            before = self.roles[cid].status.fingerprint()
+            self.roles[cid].status.reduce_ttl = max(self.roles[cid].status.reduce_ttl, 3)
             self._on_status_change(cid, before)
 
-        return f"{'、'.join(self.N(c) for c in oxid)} 获得【氧化】3回合；{'、'.join(self.N(c) for c in reduc)} 获得【还原】3回合。"
+        return lambda: f"{'、'.join(self.N(c) for c in oxid)} 获得【氧化】3回合；{'、'.join(self.N(c) for c in reduc)} 获得【还原】3回合。"
 
     def _ev_shuffle_rank(self) -> str:
-        self.rng.shuffle(self.rank)
+        order = list(self.rank)
+        self.rng.shuffle(order)
+        self.rank = order
         return "所有人排名被打乱。"
 
     def step_event_npc_actions(self):
@@ -1411,7 +2478,7 @@ class Engine:
         return res
 
     def _npc_cast_hw(self, cid: int):
-        casts = int(self.roles[cid].mem.get("npc_casts", 0))
+        casts = self.roles[cid].mem.npc_casts
         if casts >= 3:
             self.roles[cid].alive = False
             self.rank = [x for x in self.rank if x != cid]
@@ -1423,9 +2490,9 @@ class Engine:
         for t in neigh:
             if t in self.roles and self.roles[t].alive:
                 # 永久护盾：perm=True, ttl=0
-                self.give_shield(t, 1, ttl=0, perm=True, note="洪伟赐福(永久)")
-        self.roles[cid].mem["npc_casts"] = casts + 1
-        self._log(f"  · 洪伟施法：随机换位，并为相邻2人添加永久护盾（第{casts+1}/3次）")
+                self.give_shield(t, 1, ttl=0, perm=True, note="洪伟赐福(永久)", source=cid)
+        self.roles[cid].mem.npc_casts = casts + 1
+        self._log("  · 洪伟施法：随机换位，并为相邻2人添加永久护盾（第{0}/3次）", casts+1)
 
         if casts + 1 >= 3:
             self.roles[cid].alive = False
@@ -1433,7 +2500,7 @@ class Engine:
             self._log("  · 洪伟离场")
 
     def _npc_cast_ldl(self, cid: int):
-        casts = int(self.roles[cid].mem.get("npc_casts", 0))
+        casts = self.roles[cid].mem.npc_casts
         if casts >= 3:
             self.roles[cid].alive = False
             self.rank = [x for x in self.rank if x != cid]
@@ -1444,15 +2511,15 @@ class Engine:
         neigh = self._npc_adjacent_two(cid)
         for t in neigh:
             if t in self.roles and self.roles[t].alive:
-                before_t = self.roles[t].status.brief()
+                before_t = self.roles[t].status.fingerprint()
                 self.roles[t].status.thunder += 1
-                self._oulu_bump_on_status_change(t, before_t)
-                if self.roles[t].status.thunder >= 3:
-                    self._log(f"  · 雷霆满3：{self.N(t)} 立刻死亡")
-                    self.kill(t, None, "雷霆叠满3层处决", bypass_shield=False, bypass_revive=True)
+                self._oulu_bump_on_status_change(t, before_t, cid)
+                if self.roles[t].status.thunder >= self.params.thunder_lethal:
+                    self._log("  · 雷霆满{0}：{1:N} 立刻死亡", self.params.thunder_lethal, t)
+                    self.kill(t, None, self.params.thunder_reason, bypass_shield=False, bypass_revive=True)
 
-        self.roles[cid].mem["npc_casts"] = casts + 1
-        self._log(f"  · 李东雷施法：随机换位，并为相邻2人添加1层雷霆（第{casts+1}/3次）")
+        self.roles[cid].mem.npc_casts = casts + 1
+        self._log("  · 李东雷施法：随机换位，并为相邻2人添加1层雷霆（第{0}/3次）", casts+1)
 
         if casts + 1 >= 3:
             self.roles[cid].alive = False
@@ -1466,7 +2533,7 @@ class Engine:
         # 新规则：每局游戏随机生成一个技能发动顺序，之后每回合按该顺序进行
         if not self.skill_order:
             # 兜底：若未生成则立即生成一次（不输出日志）
-            self.skill_order = self.alive_ids()[:]
+            self.skill_order = list(self.alive_ids())
             self.rng.shuffle(self.skill_order)
         alive_set = {cid for cid in self.alive_ids()}
         # 按固定顺序遍历：只执行存活者；顺序列表中若有人已死亡则跳过
@@ -1476,11 +2543,11 @@ class Engine:
                 continue
             if not self.can_act(cid):
                 why = "遗策" if self.roles[cid].status.perma_disabled else ("封印" if self.roles[cid].status.sealed > 0 else "遗忘")
-                self._log(f"  · {self.N(cid)} 无法发动（{why}）")
+                self._log("  · {0:N} 无法发动（{1}）", cid, why)
                 continue
             if cid not in self._active_logged:
                 self._active_logged.add(cid)
-                self._log(f"【{self.N(cid)}】发动主动技能…")
+                self._log("【{0:N}】发动主动技能…", cid)
             if cid == 33 and self.roles[33].alive and (not self.roles[33].status.perma_disabled):
                 st33 = self.roles[33].status
                 if st33.spec_immune_ttl > 0 and (not st33.spec_immune_gained_this_turn):
@@ -1490,58 +2557,22 @@ class Engine:
                     self.move_by(33, -2, source=None, note="无特异性免疫发动上升2名")
             # 施禹谦(36) 天罚灭世：若上回合排名下降，则在本回合发动主动技能前升至第一并获得【神威】
             if cid == 36 and self.roles[36].alive and (not self.roles[36].status.perma_disabled):
-                if self.roles[36].mem.get("tfms_pending", False):
+                if self.roles[36].mem.tfms_pending:
                     if self.rank_no(36) != 1:
-                        before36 = self.roles[36].status.brief()
+                        before36 = self.roles[36].status.fingerprint()
                         self.roles[36].status.shenwei = True
-                        self._on_status_change(36, before36)
+                        self._on_status_change(36, before36, 36)
                         self.move_to_first(36, source=None, note="天罚灭世触发：升至第1名并获得神威")
                         self._log("  · 天罚灭世触发：上回合排名下降 → 本回合发动时升至第一并获得【神威】")
-                    self.roles[36].mem["tfms_pending"] = False
+                    self.roles[36].mem.tfms_pending = False
             self.dispatch_active(cid)
             if self.roles[cid].status.dusk_mark > 0:
-                self._log(f"  · 黄昏标记：{self.N(cid)} 因发动主动，排名下降1位")
+                self._log("  · 黄昏标记：{0:N} 因发动主动，排名下降1位", cid)
                 self.move_by(cid, +1, source=None, note="黄昏标记惩罚")
     def dispatch_active(self, cid: int):
-        fn_map = {
-            1: self.act_1,
-            3: self.act_3,
-            4: self.act_4,
-            6: self.act_6,
-            7: self.act_7,
-            8: self.act_8,
-            9: self.act_9,
-            10: self.act_10,
-            11: self.act_11,
-            12: self.act_12,
-            13: self.act_13,
-            14: self.act_14,
-            15: self.act_15,
-            16: self.act_16,
-            17: self.act_17,
-            18: self.act_18,
-            19: self.act_19,
-            20: self.act_20,
-            21: self.act_21,
-            23: self.act_23,
-            24: self.act_24,
-            25: self.act_25,
-            26: self.act_26,
-            27: self.act_27,
-            29: self.act_29,
-            34: self.act_34,
-            36: self.act_36,
-            38: self.act_38,
-            39: self.act_39,
-            40: self.act_40,
-            41: self.act_41,
-            33: self.act_33,
-                    42: self.act_42,
-                    46: self.act_46,
-        }
-        fn = fn_map.get(cid)
+        fn = self._actives.get(cid)
         if fn is None:
-            self._log(f"  · 无主动技能")
+            self._log("  · 无主动技能")
             return
         try:
             fn()
@@ -1560,7 +2591,7 @@ class Engine:
                 except Exception:
                     pass
             if not self.fast_mode:
-                self._log(f"  · 【异常】{self.N(cid)} 的主动技能错误：{type(e).__name__}: {e}")
+                self._log(lambda exc=e: f"  · 【异常】{self.N(cid)} 的主动技能错误：{type(exc).__name__}: {exc}")
             return
     # =========================
     # 步骤3：死亡触发
@@ -1574,15 +2605,9 @@ class Engine:
         while i < len(self.deaths_this_turn):
             rec = self.deaths_this_turn[i]
             i += 1
-            v = rec.victim
-            if v == 7:
-                self.on_death_7(rec.killer)
-            elif v == 9:
-                self.on_death_9()
-            elif v == 14:
-                self.on_death_14(rec.killer)
-            elif v == 23:
-                self.on_death_23()
+            fn = self._death_triggers.get(rec.victim)
+            if fn is not None:
+                fn(rec.killer)
     # =========================
     # 步骤4：更新/清理 + 被动
     # =========================
@@ -1594,242 +2619,205 @@ class Engine:
             alive_rank = [c for c in self.rank if self.roles[c].alive]
             for i in range(len(alive_rank) - 2):
                 a, b, c = alive_rank[i], alive_rank[i + 1], alive_rank[i + 2]
-                if getattr(self.roles[a].status, "purify_ttl", 0) > 0 and getattr(self.roles[b].status, "purify_ttl", 0) > 0 and getattr(self.roles[c].status, "purify_ttl", 0) > 0:
+                if self.roles[a].status.purify_ttl > 0 and self.roles[b].status.purify_ttl > 0 and self.roles[c].status.purify_ttl > 0:
                     # 清除三人的全部状态（保留perma_disabled与fake标记）
                     for x in (a, b, c):
                         stx = self.roles[x].status
                         perm = stx.perma_disabled
-                        fake = stx.__dict__.get("fake_99999", False)
+                        fake = stx.fake_99999
                         self.roles[x].status = Status(perma_disabled=perm)
-                        self.roles[x].status.__dict__["fake_99999"] = fake
+                        self.roles[x].status.fake_99999 = fake
                     # 设置冷却
-                    self.roles[29].mem["purify_cd"] = 2
-                    self._log(f"  · 净化爆发：{self.N(a)}、{self.N(b)}、{self.N(c)} 相邻且均有净化 → 清除全部状态；{self.N(b)} 直升第一")
+                    self.roles[29].mem.purify_cd = 2
+                    self._log("  · 净化爆发：{0:N}、{1:N}、{2:N} 相邻且均有净化 → 清除全部状态；{3:N} 直升第一", a, b, c, b)
                     self.insert_rank(b, 1, source=None, note="净化爆发直升第一")
                     break
 
         for cid in self.alive_ids():
-            st = self.roles[cid].status
-            before_brief_u = st.brief()
-            # 29 严雅：静默审判（若本回合除静默外状态未改变，则获得静默；若已有静默则消耗并上升2名）
-            if cid == 28 and (not st.perma_disabled):
-                if getattr(st, "silent_ttl", 0) > 0:
-                    self.move_by(28, -2, source=None, note="静默审判上升2名")
-                    st.silent_ttl = 0
-                else:
-                    start_sig = self.roles[29].mem.get("start_status_no_silent", "")
-                    now_sig = self._status_sig_no_silent(28)
-                    if start_sig == now_sig:
-                        st.silent_ttl = 1
-                        self._log(f"  · 静默审判：{self.N(28)} 获得【静默】")
-
-
-
-            # 45 蒋骐键：锁定防线（本回合下降>=2名触发）
-            if cid == 45 and (not st.perma_disabled):
-                sr = self.roles[45].mem.get("start_rank", None)
-                cr = self.rank_no(45)
-                if sr is not None and cr is not None and (cr - sr) >= 2 and getattr(st, "defense_line_ttl", 0) == 0:
-                    st.defense_line_ttl = 2
-                    st.defense_line_block = False
-                    self._log(f"  · 锁定防线：{self.N(45)} 获得【防线】(2回合)")
-                    self.roles[29].mem["silent_grant_turn"] = self.turn
-            if st.shield_ttl > 0:
-                st.shield_ttl -= 1
-                if st.shield_ttl == 0:
-                    st.shields = 0
-            if st.sealed > 0:
-                st.sealed -= 1
-            if st.forgotten > 0:
-                st.forgotten -= 1
-            if st.juexi_ttl > 0:
-                st.juexi_ttl -= 1
-
-            if st.dying_ttl > 0:
-                st.dying_ttl -= 1
-            if st.spec_immune_ttl > 0:
-                st.spec_immune_ttl -= 1
-
-            # 迂回：回合结算下降1名
-            if getattr(st, "detour_ttl", 0) > 0:
-                self.move_by(cid, 1, source=None, note="迂回下降1名")
-                st.detour_ttl -= 1
-
-            # 防线：回合结算上升1名
-            if getattr(st, "frontline_cd", 0) > 0:
-                st.frontline_cd -= 1
-
-            if getattr(st, "defense_line_ttl", 0) > 0:
-                self.move_by(cid, -1, source=None, note="防线上升1名")
-                st.defense_line_ttl -= 1
-                if st.defense_line_ttl <= 0:
-                    st.defense_line_block = False
-
-            # 迫近战线冷却
-            if getattr(st, "frontline_cd", 0) > 0:
-                st.frontline_cd -= 1
-
-# 辩护：持续期间每回合上升1名
-            if getattr(st, "defense_ttl", 0) > 0:
-                self.move_by(cid, -1, source=None, note="辩护上升1名")
-                st.defense_ttl -= 1
-
-            # 圣辉：持续期间每回合上升1名
-            if getattr(st, "shenghui_ttl", 0) > 0:
-                self.move_by(cid, -1, source=None, note="圣辉上升1名")
-                st.shenghui_ttl -= 1
-
-            # 感电：叠满3层后，每回合消耗1层并上升3名
-            if getattr(st, "dian", 0) >= 3:
-                self.move_by(cid, -3, source=None, note="感电爆发上升3名")
-                st.dian = max(0, st.dian - 1)
-
-            # 乘胜追击：叠满3层后，每回合上升3名
-            if getattr(st, "chase", 0) >= 3:
-                self.move_by(cid, -3, source=None, note="乘胜追击上升3名")
-
-            # 氧化/还原：每回合位移并衰减
-            if getattr(st, "oxid_ttl", 0) > 0:
-                self.move_by(cid, -1, source=None, note="氧化上升1名")
-                st.oxid_ttl -= 1
-            if getattr(st, "reduce_ttl", 0) > 0:
-                self.move_by(cid, +1, source=None, note="还原下降1名")
-                st.reduce_ttl -= 1
-
-            # 洪伟之赐：持有期间每回合上升2名（直到抵挡一次伤害被消耗）
-            if getattr(st, "hongwei_gift_shield", 0) > 0:
-                self.move_by(cid, -2, source=None, note="洪伟之赐上升2名")
-            # 雷霆手腕：持有期间每回合给上一名雷霆+1（直到抵挡一次伤害被消耗）
-            if getattr(st, "thunder_wrist_shield", 0) > 0:
-                myr = self.rank_no(cid)
-                if myr is not None and myr > 1:
-                    above = self.rank[myr - 2]
-                    if above in self.roles and self.roles[above].alive:
-                        before_a = self.roles[above].status.brief()
-                        self.roles[above].status.thunder += 1
-                        self._on_status_change(above, before_a)
-                        self._log(f"  · 雷霆手腕：{self.N(cid)} 令 {self.N(above)} 雷霆层数={self.roles[above].status.thunder}")
-                        if self.roles[above].status.thunder >= 3:
-                            self._log(f"  · 雷霆满3：{self.N(above)} 立刻死亡")
-                            self.kill(above, None, "雷霆叠满3层处决", bypass_shield=False, bypass_revive=True)
-                            self._compact()
-
-            
-            # 32 范一诺：清障圣辉——若本回合名次下降，则获得3回合圣辉；圣辉期间每回合上升1名
-            if cid == 32 and (not st.perma_disabled) and self.roles[32].alive:
-                start_r = self.start_rank_snapshot.get(32)
-                now_r = self.rank_no(32)
-                if start_r is not None and now_r is not None and now_r > start_r:
-                    st32 = self.roles[32].status
-                    st32.shenghui_ttl = 3
-                    self._log(f"  · 清障圣辉：{self.N(32)} 本回合排名下降 → 获得【圣辉】(3回合)")
-
-            # 施沁皓(3) 斩杀冷却递减
-            if cid == 3:
-                cd3 = int(self.roles[3].mem.get("execute_cd", 0))
-                if cd3 > 0:
-                    self.roles[3].mem["execute_cd"] = cd3 - 1
-
-            # 路济阳(17) 护佑之盾冷却递减
-            if cid == 17:
-                cd2 = int(self.roles[17].mem.get("shield_cd", 0))
-                if cd2 > 0:
-                    self.roles[17].mem["shield_cd"] = cd2 - 1
-            # 施禹谦(36) 天罚灭世：若本回合排名下降，则标记下回合发动时升至第一并获得【神威】
-            if cid == 36 and (not st.perma_disabled) and self.roles[36].alive:
-                cur = self.rank_no(36)
-                prev = self.roles[36].mem.get("last_rank")
-                if prev is not None and cur is not None and cur > int(prev):
-                    self.roles[36].mem["tfms_pending"] = True
-                self.roles[36].mem["down_streak"] = 0
-                now_after = self.rank_no(36)
-                if now_after is not None:
-                    self.roles[36].mem["last_rank"] = int(now_after)
-            
-            # 28 黄梓睿：净化能量——每回合给自己与相邻两人施加2回合净化；三人净化相邻则触发净化爆发
-            if False and cid == 29 and (not st.perma_disabled) and self.roles[29].alive:
-                cd = int(self.roles[29].mem.get("purify_cd", 0))
-                if cd > 0:
-                    self.roles[29].mem["purify_cd"] = cd - 1
+            before_brief_u = self.roles[cid].status.fingerprint()
+            self._run_hooks("role_turn_end", cid, cid)
+            self._oulu_bump_on_status_change(cid, before_brief_u, cid)
+        self._run_hooks("turn_end", None)
+    # ---------- 回合末结算（登记在 SKILLS 的 role_turn_end / turn_end 事件上） ----------
+    def _passive_silent_judgement(self, cid: int):
+        """29 严雅：静默审判（若本回合除静默外状态未改变，则获得静默；若已有静默则消耗并上升2名）。"""
+        st = self.roles[28].status
+        if st.perma_disabled:
+            return
+        if st.silent_ttl > 0:
+            self.move_by(28, -2, source=None, note="静默审判上升2名")
+            st.silent_ttl = 0
+        else:
+            start_sig = self.roles[29].mem.start_status_no_silent if self.roles.get(29) else ""
+            now_sig = self._status_sig_no_silent(28)
+            if start_sig == now_sig:
+                st.silent_ttl = 1
+                self._log("  · 静默审判：{0:N} 获得【静默】", 28, kind="status_gain", actor=28, targets=(28,), reason="静默")
+    def _passive_defense_line(self, cid: int):
+        """45 蒋骐键：锁定防线（本回合下降>=2名触发）。"""
+        st = self.roles[45].status
+        if st.perma_disabled:
+            return
+        sr = self.roles[45].mem.start_rank
+        cr = self.rank_no(45)
+        if sr is not None and cr is not None and (cr - sr) >= 2 and st.defense_line_ttl == 0:
+            st.defense_line_ttl = 2
+            st.defense_line_block = False
+            self._log("  · 锁定防线：{0:N} 获得【防线】(2回合)", 45, kind="status_gain", actor=45, targets=(45,), reason="防线")
+            if self.roles.get(29):
+                self.roles[29].mem.silent_grant_turn = self.turn
+    def _status_upkeep(self, cid: int):
+        """每名存活者的回合末状态结算：各类剩余回合递减，以及持续状态带来的位移/雷霆。"""
+        st = self.roles[cid].status
+        if st.shield_ttl > 0:
+            st.shield_ttl -= 1
+            if st.shield_ttl == 0:
+                st.shields = 0
+        if st.sealed > 0:
+            st.sealed -= 1
+        if st.forgotten > 0:
+            st.forgotten -= 1
+        if st.juexi_ttl > 0:
+            st.juexi_ttl -= 1
+
+        if st.dying_ttl > 0:
+            st.dying_ttl -= 1
+        if st.spec_immune_ttl > 0:
+            st.spec_immune_ttl -= 1
+
+        # 迂回：回合结算下降1名
+        if st.detour_ttl > 0:
+            self.move_by(cid, 1, source=None, note="迂回下降1名")
+            st.detour_ttl -= 1
+
+        # 防线：回合结算上升1名
+        if st.frontline_cd > 0:
+            st.frontline_cd -= 1
+
+        if st.defense_line_ttl > 0:
+            self.move_by(cid, -1, source=None, note="防线上升1名")
+            st.defense_line_ttl -= 1
+            if st.defense_line_ttl <= 0:
+                st.defense_line_block = False
+
+        # 迫近战线冷却
+        if st.frontline_cd > 0:
+            st.frontline_cd -= 1
+
+        # 辩护：持续期间每回合上升1名
+        if st.defense_ttl > 0:
+            self.move_by(cid, -1, source=None, note="辩护上升1名")
+            st.defense_ttl -= 1
+
+        # 圣辉：持续期间每回合上升1名
+        if st.shenghui_ttl > 0:
+            self.move_by(cid, -1, source=None, note="圣辉上升1名")
+            st.shenghui_ttl -= 1
+
+        # 感电：叠满3层后，每回合消耗1层并上升3名
+        if st.dian >= 3:
+            self.move_by(cid, -3, source=None, note="感电爆发上升3名")
+            st.dian = max(0, st.dian - 1)
+
+        # 乘胜追击：叠满3层后，每回合上升3名
+        if st.chase >= 3:
+            self.move_by(cid, -3, source=None, note="乘胜追击上升3名")
+
+        # 氧化/还原：每回合位移并衰减
+        if st.oxid_ttl > 0:
+            self.move_by(cid, -1, source=None, note="氧化上升1名")
+            st.oxid_ttl -= 1
+        if st.reduce_ttl > 0:
+            self.move_by(cid, +1, source=None, note="还原下降1名")
+            st.reduce_ttl -= 1
+
+        # 洪伟之赐：持有期间每回合上升2名（直到抵挡一次伤害被消耗）
+        if st.hongwei_gift_shield > 0:
+            self.move_by(cid, -2, source=None, note="洪伟之赐上升2名")
+        # 雷霆手腕：持有期间每回合给上一名雷霆+1（直到抵挡一次伤害被消耗）
+        if st.thunder_wrist_shield > 0:
+            myr = self.rank_no(cid)
+            if myr is not None and myr > 1:
+                above = self.rank[myr - 2]
+                if above in self.roles and self.roles[above].alive:
+                    before_a = self.roles[above].status.fingerprint()
+                    self.roles[above].status.thunder += 1
+                    self._on_status_change(above, before_a, cid)
+                    self._log("  · 雷霆手腕：{0:N} 令 {1:N} 雷霆层数={2}", cid, above, self.roles[above].status.thunder)
+                    if self.roles[above].status.thunder >= self.params.thunder_lethal:
+                        self._log("  · 雷霆满{0}：{1:N} 立刻死亡", self.params.thunder_lethal, above)
+                        self.kill(above, None, self.params.thunder_reason, bypass_shield=False, bypass_revive=True)
+                        self._compact()
+    def _passive_qingzhang(self, cid: int):
+        """32 范一诺：清障圣辉——若本回合名次下降，则获得3回合圣辉；圣辉期间每回合上升1名。"""
+        st = self.roles[32].status
+        if st.perma_disabled or (not self.roles[32].alive):
+            return
+        start_r = self.start_rank_snapshot.get(32)
+        now_r = self.rank_no(32)
+        if start_r is not None and now_r is not None and now_r > start_r:
+            st.shenghui_ttl = 3
+            self._log("  · 清障圣辉：{0:N} 本回合排名下降 → 获得【圣辉】(3回合)", 32,
+                      kind="status_gain", actor=32, targets=(32,), reason="圣辉")
+    def _tick_execute_cd(self, cid: int):
+        """施沁皓(3) 斩杀冷却递减。"""
+        cd3 = self.roles[3].mem.execute_cd
+        if cd3 > 0:
+            self.roles[3].mem.execute_cd = cd3 - 1
+    def _tick_shield_cd(self, cid: int):
+        """路济阳(17) 护佑之盾冷却递减。"""
+        cd2 = self.roles[17].mem.shield_cd
+        if cd2 > 0:
+            self.roles[17].mem.shield_cd = cd2 - 1
+    def _passive_tianfa(self, cid: int):
+        """施禹谦(36) 天罚灭世：若本回合排名下降，则标记下回合发动时升至第一并获得【神威】。"""
+        if self.roles[36].status.perma_disabled or (not self.roles[36].alive):
+            return
+        cur = self.rank_no(36)
+        prev = self.roles[36].mem.last_rank
+        if prev is not None and cur is not None and cur > int(prev):
+            self.roles[36].mem.tfms_pending = True
+        self.roles[36].mem.down_streak = 0
+        now_after = self.rank_no(36)
+        if now_after is not None:
+            self.roles[36].mem.last_rank = int(now_after)
+    def _passive_vyzy(self, cid: int):
+        """季任杰(34) 越挫越勇：回合末结算（被动）。"""
+        st = self.roles[34].status
+        if st.perma_disabled or (not self.roles[34].alive):
+            return
+        alive_now = self.alive_ids()
+        cur_rank = self.rank_no(34)
+        if cur_rank is not None:
+            # 倒数第一且不在前三：立刻升至第一并移除效果
+            if cur_rank == len(alive_now) and cur_rank > 3:
+                if st.vyzy:
+                    st.vyzy = False
+                self._log("  · 越挫越勇：倒数第一触发 → 立刻升至第一并移除【越挫越勇】")
+                self.insert_rank(34, 1, source=None, note="越挫越勇触底反弹")
+            else:
+                # 不在前三：获得/保持越挫越勇，并每回合下降2名
+                if cur_rank > 3:
+                    if not st.vyzy:
+                        before34 = st.fingerprint()
+                        st.vyzy = True
+                        self._log("  · 越挫越勇：不在前三 → 获得【越挫越勇】", kind="status_gain", actor=34, targets=(34,), reason="越挫越勇")
+                        self._oulu_bump_on_status_change(34, before34, 34)
+                    self.move_by(34, +2, source=None, note="越挫越勇下降2名")
+                # 进入前三：移除越挫越勇
                 else:
-                    self.roles[29].mem["purify_cd"] = 0
-                p29 = self.pos(29)
-                if cd > 0:
-                    # 冷却中，跳过本回合净化施加与判定
-                    return
-                targets = []
-                if p29 is not None:
-                    for q in (p29-1, p29, p29+1):
-                        if 0 <= q < len(self.rank):
-                            t = self.rank[q]
-                            if self.roles[t].alive:
-                                targets.append(t)
-                if targets:
-                    for t in targets:
-                        before_t = self.roles[t].status.brief()
-                        self.roles[t].status.purify_ttl = max(getattr(self.roles[t].status, "purify_ttl", 0), 2)
-                        self._on_status_change(t, before_t)
-                    self._log("  · 净化能量：" + "、".join(self.N(x) for x in targets) + " 获得【净化】(2回合)")
-
-                # 检查连续三人均有净化
-                alive_rank = [c for c in self.rank if self.roles[c].alive]
-                for i in range(len(alive_rank)-2):
-                    a,b,c = alive_rank[i], alive_rank[i+1], alive_rank[i+2]
-                    if getattr(self.roles[a].status, "purify_ttl", 0)>0 and getattr(self.roles[b].status, "purify_ttl", 0)>0 and getattr(self.roles[c].status, "purify_ttl", 0)>0:
-                        # 清除三人的所有状态效果（保留永久禁用等硬规则字段）
-                        for x in (a,b,c):
-                            stx=self.roles[x].status
-                            perm = stx.perma_disabled
-                            fake = stx.__dict__.get("fake_99999", False)
-                            self.roles[x].status = Status(perma_disabled=perm)
-                            self.roles[x].status.__dict__["fake_99999"]=fake
-                        self.roles[29].mem["purify_cd"] = 2
-                        self._log(f"  · 净化爆发：{self.N(a)}、{self.N(b)}、{self.N(c)} 相邻且均有净化 → 清除全部状态；{self.N(b)} 直升第一")
-                        self.insert_rank(b, 1, source=None, note="净化爆发直升第一")
-                        break
-
-            # 季任杰(34) 越挫越勇：回合末结算（被动）
-            if cid == 34 and (not st.perma_disabled) and self.roles[34].alive:
-                alive_now = self.alive_ids()
-                cur_rank = self.rank_no(34)
-                if cur_rank is not None:
-                    # 倒数第一且不在前三：立刻升至第一并移除效果
-                    if cur_rank == len(alive_now) and cur_rank > 3:
-                        if st.vyzy:
-                            st.vyzy = False
-                        self._log("  · 越挫越勇：倒数第一触发 → 立刻升至第一并移除【越挫越勇】")
-                        self.insert_rank(34, 1, source=None, note="越挫越勇触底反弹")
-                    else:
-                        # 不在前三：获得/保持越挫越勇，并每回合下降2名
-                        if cur_rank > 3:
-                            if not st.vyzy:
-                                before34 = st.brief()
-                                st.vyzy = True
-                                self._log("  · 越挫越勇：不在前三 → 获得【越挫越勇】")
-                                self._oulu_bump_on_status_change(34, before34)
-                            self.move_by(34, +2, source=None, note="越挫越勇下降2名")
-                        # 进入前三：移除越挫越勇
-                        else:
-                            if st.vyzy:
-                                before34 = st.brief()
-                                st.vyzy = False
-                                self._log("  · 越挫越勇：进入前三 → 移除【越挫越勇】")
-                                self._oulu_bump_on_status_change(34, before34)
-
-            if cid == 46 and st.lone_wolf and (not st.perma_disabled):
-                self.move_by(46, -1, source=None, note="孤军奋战")
-
-
-            self._oulu_bump_on_status_change(cid, before_brief_u)
-        # 钟无艳巾帼护盾
-        self.endcheck_zhongwuyan()
-        # 豆进天被动
-        self.check_doujintian_passive()
-        # 牵寒被动
-        self.check_qianhan_passive()
-        self.check_qiyinlu_lone_wolf()
+                    if st.vyzy:
+                        before34 = st.fingerprint()
+                        st.vyzy = False
+                        self._log("  · 越挫越勇：进入前三 → 移除【越挫越勇】")
+                        self._oulu_bump_on_status_change(34, before34, 34)
+    def _passive_lone_wolf_move(self, cid: int):
+        """戚银潞(46) 孤军奋战：每回合上升1名。"""
+        st = self.roles[46].status
+        if st.lone_wolf and (not st.perma_disabled):
+            self.move_by(46, -1, source=None, note="孤军奋战")
     def check_doujintian_passive(self):
-        if not self.roles[11].alive or self.roles[11].status.perma_disabled:
+        if 11 not in self.roles or not self.roles[11].alive or self.roles[11].status.perma_disabled:
             return
         alive = self.alive_ids()
         r = self.rank_no(11)
@@ -1838,9 +2826,9 @@ class Engine:
         if r > int(len(alive) * 0.7):
             self._log("  · 豆进天(11) 天命所归触发：升至第一并获得护盾1层(2回合)")
             self.insert_rank(11, 1, source=None, note="天命所归升至第一")
-            self.give_shield(11, 1, ttl=2, perm=False, note="天命所归护盾")
+            self.give_shield(11, 1, ttl=2, perm=False, note="天命所归护盾", source=11)
     def check_qianhan_passive(self):
-        if not self.roles[6].alive or self.roles[6].status.perma_disabled:
+        if 6 not in self.roles or not self.roles[6].alive or self.roles[6].status.perma_disabled:
             return
 
     def check_qiyinlu_lone_wolf(self):
@@ -1849,30 +2837,27 @@ class Engine:
         r = self.roles[46]
         if r.status.lone_wolf:
             return
-        mates = r.mem.get("mates", [])
+        mates = r.mem.mates
         if len(mates) != 2:
             return
         if all((m in self.roles) and (not self.roles[m].alive) for m in mates):
-            before = r.status.brief()
-            self.give_shield(46, 1, ttl=1, perm=False, note="孤军奋战触发护盾")
+            before = r.status.fingerprint()
+            self.give_shield(46, 1, ttl=1, perm=False, note="孤军奋战触发护盾", source=46)
             r.status.lone_wolf = True
             self._log("  · 孤军奋战：两名队友均被淘汰 → 获得永久【孤军奋战】（每回合上升1名）")
-            self._on_status_change(46, before)
-        alive = self.alive_ids()
-        r = self.rank_no(6)
-        if r is None:
+            self._on_status_change(46, before, 46)
+        if self.rank_no(6) is None:
             return
-        if r > int(len(alive) * 0.6):
-            if not self.roles[6].mem.get("qian_immune_next", False):
-                self.roles[6].mem["qian_immune_next"] = True
+        if not self.in_top_fraction(6, 0.6):
+            if not self.roles[6].mem.qian_immune_next:
+                self.roles[6].mem.qian_immune_next = True
                 self._log("  · 牵寒(6) 逆流而上触发：免疫下次技能影响并排名+1")
                 self.move_by(6, -1, source=None, note="逆流而上+1")
-                higher = [x for x in self.alive_ids()
-                          if self.rank_no(x) is not None and self.rank_no(x) < self.rank_no(6)]
+                higher = self.above(6)
                 if higher:
                     t = self.rng.choice(higher)
                     if not self.is_mls_unselectable_by_active_kill(t):
-                        self._log(f"  · 寒锋逆雪：斩杀高位随机目标 {self.N(t)}")
+                        self._log("  · 寒锋逆雪：斩杀高位随机目标 {0:N}", t)
                         self.kill(t, 6, "寒锋逆雪条件斩杀")
                     else:
                         self._log("  · 寒锋逆雪：随机到mls(10)不可选 → 失败")
@@ -1881,7 +2866,7 @@ class Engine:
         # 回合结束：只要本回合排名上升（≥1位），就触发判定：
         # - 50%概率获得1层护盾（最多触发3次，且需要当前没有护盾才可抽取）
         # - 若本次未获得护盾，则直接冲到第一名。
-        if not self.roles[21].alive or self.roles[21].status.perma_disabled:
+        if 21 not in self.roles or not self.roles[21].alive or self.roles[21].status.perma_disabled:
             return
         st = self.roles[21].status
         start = self.start_rank_snapshot.get(21)
@@ -1898,7 +2883,7 @@ class Engine:
         if st.zhong_triggers < 3 and st.total_shields() == 0:
             if self.rng.random() < 0.5:
                 st.zhong_triggers += 1
-                self.give_shield(21, 1, ttl=1, perm=False, note="巾帼护盾判定")
+                self.give_shield(21, 1, ttl=1, perm=False, note="巾帼护盾判定", source=21)
                 gained = True
 
         # 未获得护盾：直接冲到第一
@@ -1916,7 +2901,7 @@ class Engine:
                 self.roles[cid].status.hewenx_curse = None
                 continue
             if cur < threshold:
-                self._log(f"【怨念爆发】{self.N(cid)} 行动前判定：排名高于阈值 → 直接斩杀（护盾无效）")
+                self._log("【怨念爆发】{0:N} 行动前判定：排名高于阈值 → 直接斩杀（护盾无效）", cid)
                 self.kill(cid, 7, "怨念爆发斩杀(护盾无效)", bypass_shield=True, bypass_revive=True)
             self.roles[cid].status.hewenx_curse = None
         self._compact()
@@ -1925,8 +2910,8 @@ class Engine:
     # =========================
     def act_1(self):
         r = self.roles[1]
-        r.mem["counter"] = r.mem.get("counter", 0) + 1
-        if r.mem["counter"] % 3 != 0:
+        r.mem.counter = r.mem.counter + 1
+        if r.mem.counter % 3 != 0:
             self._log("  · 逆袭之光：计数未到（每3回合必发）")
             return
         alive = self.alive_ids()
@@ -1946,18 +2931,17 @@ class Engine:
         if old_rank <= len(self.rank):
             v = self.rank[old_rank - 1]
             if v != 1:
-                self._log(f"  · 光影裁决：斩杀原第{old_rank}名位置的 {self.N(v)}")
+                self._log("  · 光影裁决：斩杀原第{0}名位置的 {1:N}", old_rank, v)
                 self.kill(v, 1, "光影裁决联动斩杀")
     def act_3(self):
         myr = self.rank_no(3)
         if myr is None:
             return
-        cd = int(self.roles[3].mem.get("execute_cd", 0))
+        cd = self.roles[3].mem.execute_cd
         if cd > 0:
-            self._log(f"  · 凌空决：斩杀冷却中（剩余{cd}回合）")
+            self._log("  · 凌空决：斩杀冷却中（剩余{0}回合）", cd)
             return
-        higher = [x for x in self.alive_ids()
-                  if self.rank_no(x) is not None and self.rank_no(x) < myr]
+        higher = self.above(3)
         if not higher:
             self._log("  · 凌空决：无更高排名目标")
             return
@@ -1968,15 +2952,15 @@ class Engine:
             self._log("  · 凌空决：目标为mls(10)绝对防御不可选 → 失败，自身下降2位")
             self.move_by(3, +2, source=3, note="凌空决失败惩罚")
             return
-        if target == 6 and self.roles[6].mem.get("qian_immune_next"):
-            self.roles[6].mem["qian_immune_next"] = False
+        if target == 6 and self.roles[6].mem.qian_immune_next:
+            self.roles[6].mem.qian_immune_next = False
             self._log("  · 凌空决：牵寒免疫下次技能影响 → 斩杀无效；自身下降2位")
             self.move_by(3, +2, source=3, note="凌空决失败惩罚")
             return
-        self._log(f"  · 凌空决：斩杀更高位目标 {self.N(target)}")
+        self._log("  · 凌空决：斩杀更高位目标 {0:N}", target)
         died = self.kill(target, 3, "凌空决主动斩杀")
         if died:
-            self.roles[3].mem["execute_cd"] = 2
+            self.roles[3].mem.execute_cd = 2
         if not died:
             self._log("  · 凌空决：斩杀被抵挡（护盾），自身下降2位")
             self.move_by(3, +2, source=3, note="凌空决失败惩罚")
@@ -2011,7 +2995,7 @@ class Engine:
                     path.append(cid)
         # 理论上恰好3人；保险起见截断
         path = path[:3]
-        self._log(f"  · 绝息斩：斩杀第{target_rank}名 {self.N(target)} 并替换其位置")
+        self._log("  · 绝息斩：斩杀第{0}名 {1:N} 并替换其位置", target_rank, target)
         # 先斩杀目标（护盾可挡；若挡住则不替换、不施加绝息）
         died = self.kill(target, 4, "绝息斩斩杀")
         if not died:
@@ -2023,7 +3007,7 @@ class Engine:
         self.insert_rank(4, target_rank, source=None, note="绝息斩替换位置")
         # 施加绝息（1回合）
         if path:
-            self._log("  · 绝息效果：沿途获得一回合绝息：" + "、".join(self.N(x) for x in path))
+            self._log(lambda: "  · 绝息效果：沿途获得一回合绝息：" + "、".join(self.N(x) for x in path))
             for x in path:
                 new_ttl = max(self.roles[x].status.juexi_ttl, 1)
                 # 绝息为技能效果，走统一入口（可触发隐身/绝地反击/特异性免疫等）
@@ -2039,7 +3023,7 @@ class Engine:
         target = self.pick_random(7, alive, "下位集火目标")
         if target is None:
             return
-        self.set_unique_focus(target, note=f"  · 下位集火：{self.N(target)} 获得【集火】（自我反噬版，顶掉场上其它集火）")
+        self.set_unique_focus(target, note=lambda: f"  · 下位集火：{self.N(target)} 获得【集火】（自我反噬版，顶掉场上其它集火）")
     def act_8(self):
         # 曾靖舒(8)
         # 每回合上升名次（奇数回合+1，偶数回合+2）。
@@ -2050,7 +3034,7 @@ class Engine:
         if old is None:
             return
 
-        last_kill_turn = self.roles[8].mem.get("zjs_last_kill_turn")
+        last_kill_turn = self.roles[8].mem.zjs_last_kill_turn
         can_kill = (last_kill_turn is None) or ((self.turn - last_kill_turn) >= 3)
 
         alive_now = self.alive_ids()
@@ -2058,9 +3042,9 @@ class Engine:
             target = alive_now[old + 1]
             if self.roles[target].status.total_shields() == 0:
                 if can_kill:
-                    self._log(f"  · 乘胜追击：斩杀 {self.N(target)}（目标无护盾）")
+                    self._log("  · 乘胜追击：斩杀 {0:N}（目标无护盾）", target)
                     self.kill(target, 8, "乘胜追击联动斩杀")
-                    self.roles[8].mem["zjs_last_kill_turn"] = self.turn
+                    self.roles[8].mem.zjs_last_kill_turn = self.turn
                 else:
                     self._log("  · 乘胜追击：斩杀冷却中（每3回合最多触发一次）")
             else:
@@ -2070,29 +3054,29 @@ class Engine:
     # 8) 书法家：笔戮千秋后上升两名
     def act_9(self):
         r = self.roles[9]
-        if not r.mem.get("seal_used", False):
+        if not r.mem.seal_used:
             alive = [x for x in self.alive_ids() if x != 9]
             if len(alive) >= 2:
                 a, b = self.rng.sample(alive, 2)
-                before_a = self.roles[a].status.brief()
-                before_b = self.roles[b].status.brief()
+                before_a = self.roles[a].status.fingerprint()
+                before_b = self.roles[b].status.fingerprint()
                 self.roles[a].status.sealed = max(self.roles[a].status.sealed, 1)
                 self.roles[b].status.sealed = max(self.roles[b].status.sealed, 1)
-                self._oulu_bump_on_status_change(a, before_a)
-                self._oulu_bump_on_status_change(b, before_b)
-                r.mem["seal_used"] = True
-                self._log(f"  · 笔定乾坤：封印 {self.N(a)}、{self.N(b)} 下一回合主动")
+                self._oulu_bump_on_status_change(a, before_a, 9)
+                self._oulu_bump_on_status_change(b, before_b, 9)
+                r.mem.seal_used = True
+                self._log("  · 笔定乾坤：封印 {0:N}、{1:N} 下一回合主动", a, b)
                 self.twin_share_nonkill(a, "seal")
                 self.twin_share_nonkill(b, "seal")
-        cd = r.mem.get("kill_cd", 0)
+        cd = r.mem.kill_cd
         if cd > 0:
-            r.mem["kill_cd"] = cd - 1
+            r.mem.kill_cd = cd - 1
             self._log("  · 笔戮千秋：冷却中")
             return
         myr = self.rank_no(9)
         if myr is None:
             return
-        lower = [x for x in self.alive_ids() if self.rank_no(x) is not None and self.rank_no(x) > myr]
+        lower = self.below(9)
         if not lower:
             self._log("  · 笔戮千秋：无低位目标")
             return
@@ -2102,9 +3086,9 @@ class Engine:
         if self.is_mls_unselectable_by_active_kill(target):
             self._log("  · 笔戮千秋：随机到mls(10)不可选 → 失败")
         else:
-            self._log(f"  · 笔戮千秋：斩杀 {self.N(target)}")
+            self._log("  · 笔戮千秋：斩杀 {0:N}", target)
             self.kill(target, 9, "笔戮千秋主动斩杀")
-        r.mem["kill_cd"] = 1
+        r.mem.kill_cd = 1
         # 新增：释放后可上升两名
         self.move_by(9, -2, source=9, note="笔戮千秋后上升2名")
     def act_10(self):
@@ -2119,9 +3103,9 @@ class Engine:
         # - 每次释放后，“选中第一名”的概率 +1%（上限100%），跨回合累计。
         r = self.roles[12]
         times = max(1, self.turn)
-        p_first = float(r.mem.get("wx_first_p", 0.01))
+        p_first = r.mem.wx_first_p
         p_first = max(0.0, min(1.0, p_first))
-        self._log(f"  · 万象挪移：本回合连续释放 {times} 次（本回合起始选中第一名概率={p_first*100:.0f}%）")
+        self._log("  · 万象挪移：本回合连续释放 {0} 次（本回合起始选中第一名概率={1:.0f}%）", times, p_first*100)
         for k in range(times):
             alive_all = self.alive_ids()
             pool = [x for x in alive_all if x != 12]
@@ -2138,7 +3122,7 @@ class Engine:
                 target = self.rng.choice(others) if others else (first if first in pool else None)
             # 每次释放后，选中第一名概率 +1%
             p_first = min(1.0, p_first + 0.01)
-            r.mem["wx_first_p"] = p_first
+            r.mem.wx_first_p = p_first
             if target is None:
                 return
             # mls 免疫处理
@@ -2149,21 +3133,21 @@ class Engine:
                     self._log("  · 万象挪移：仅剩mls且其免疫触发 → 本次无效")
                     continue
                 target = self.rng.choice(pool2)
-            self._log(f"  · 万象挪移（第{k+1}次）：与 {self.N(target)} 交换（释放后第一名概率已升至{p_first*100:.0f}%）")
+            self._log("  · 万象挪移（第{0}次）：与 {1:N} 交换（释放后第一名概率已升至{2:.0f}%）", k+1, target, p_first*100)
             self.swap(12, target, source=12, note=f"万象挪移第{k+1}次交换")
     def act_13(self):
         # 藕禄：完全重做（移除全部双生相关内容）
         # 【影入空濛】每回合若自己没有隐身，则获得隐身；若已有隐身，则移除隐身。
         # 隐身状态：不会被任何技能选中（不包括世界规则）
-        before = self.roles[13].status.brief()
+        before = self.roles[13].status.fingerprint()
         st = self.roles[13].status
         if not st.invisible:
             st.invisible = True
-            self._log("  · 影入空濛：获得【隐身】")
+            self._log("  · 影入空濛：获得【隐身】", kind="status_gain", actor=13, targets=(13,), reason="隐身")
         else:
             st.invisible = False
             self._log("  · 影入空濛：移除【隐身】")
-        self._oulu_bump_on_status_change(13, before)
+        self._oulu_bump_on_status_change(13, before, 13)
 
 
     def act_14(self):
@@ -2173,7 +3157,7 @@ class Engine:
         if myr is None or myr == 1:
             self._log("  · 高位清算：无高位目标")
             return
-        higher = [x for x in self.alive_ids() if self.rank_no(x) is not None and self.rank_no(x) < myr]
+        higher = self.above(15)
         if not higher:
             self._log("  · 高位清算：无高位目标")
             return
@@ -2183,59 +3167,53 @@ class Engine:
         if self.is_mls_unselectable_by_active_kill(t1):
             self._log("  · 高位清算：随机到mls(10)不可选 → 失败")
             return
-        self._log(f"  · 高位清算：斩杀 {self.N(t1)}")
+        self._log("  · 高位清算：斩杀 {0:N}", t1)
         died = self.kill(t1, 15, "高位清算第1杀")
         if died:
-            myr2 = self.rank_no(15)
-            if myr2 is None:
+            if self.rank_no(15) is None:
                 return
-            higher2 = []
-            for x in self.alive_ids():
-                rx = self.rank_no(x)
-                if rx is not None and rx < myr2:
-                    higher2.append(x)
+            higher2 = self.above(15)
             if higher2:
                 t2 = self.pick_random(15, higher2, "高位清算第2杀目标")
                 if t2 is not None and (not self.is_mls_unselectable_by_active_kill(t2)):
-                    self._log(f"  · 追加清算：斩杀 {self.N(t2)}")
+                    self._log("  · 追加清算：斩杀 {0:N}", t2)
                     self.kill(t2, 15, "高位清算第2杀")
     # 5) 合议庭：删除“第一名本回合技能无效”
     def act_16(self):
         alive = self.alive_ids()
-        myr = self.rank_no(16)
-        if myr is None:
+        if self.rank_no(16) is None:
             return
-        if myr <= int(len(alive) * 0.4):
+        if self.in_top_fraction(16, 0.4):
             self._log("  · 众意审判：不在后60%，条件不满足")
             return
         first = alive[0]
-        tail = alive[int(len(alive) * 0.4):]
+        tail = self.bottom_fraction(0.6)
         target = self.pick_random(16, [x for x in tail if x != first], "众意审判交换目标")
         if target is None:
             return
-        self._log(f"  · 众意审判：强制 {self.N(first)} 与 {self.N(target)} 交换")
+        self._log("  · 众意审判：强制 {0:N} 与 {1:N} 交换", first, target)
         self.swap(first, target, source=16, note="众意审判交换")
     # 7) 路济阳：移除“插到第一或最后→自杀”
     def act_17(self):
         r = self.roles[17]
-        cd = r.mem.get("cd", 0)
+        cd = r.mem.cd
         if cd > 0:
-            r.mem["cd"] = cd - 1
+            r.mem.cd = cd - 1
             self._log("  · 时空跃迁：冷却中")
             return
         alive = self.alive_ids()
         oldr = self.rank_no(17)
         n = len(alive)
         new_rank = self.rng.randint(1, n)
-        self._log(f"  · 时空跃迁：插入第{new_rank}名位置")
+        self._log("  · 时空跃迁：插入第{0}名位置", new_rank)
         self.insert_rank(17, new_rank, source=17, note="时空跃迁")
 
         # 护佑之盾：为随机两人生成可持续护盾（冷却5回合，且本局最多触发2次）
-        shield_cd = int(r.mem.get("shield_cd", 0))
+        shield_cd = r.mem.shield_cd
         if shield_cd > 0:
-            self._log(f"  · 护佑之盾：冷却中（剩余{shield_cd}回合）")
+            self._log("  · 护佑之盾：冷却中（剩余{0}回合）", shield_cd)
         else:
-            uses = int(r.mem.get("shield_uses", 0))
+            uses = r.mem.shield_uses
             if uses >= 2:
                 self._log("  · 护佑之盾：本局已使用2次 → 无法再触发")
             else:
@@ -2243,44 +3221,46 @@ class Engine:
                 cand = [x for x in whitelist if x in self.roles and self.roles[x].alive]
                 if len(cand) >= 2:
                     a, b = self.rng.sample(cand, 2)
-                    self.give_shield(a, 1, perm=True, note="增益：护佑之盾(可持续)")
-                    self.give_shield(b, 1, perm=True, note="增益：护佑之盾(可持续)")
-                    r.mem["shield_cd"] = 5
-                    r.mem["shield_uses"] = uses + 1
+                    self.give_shield(a, 1, perm=True, note="增益：护佑之盾(可持续)", source=17)
+                    self.give_shield(b, 1, perm=True, note="增益：护佑之盾(可持续)", source=17)
+                    r.mem.shield_cd = 5
+                    r.mem.shield_uses = uses + 1
 
         nowr = self.rank_no(17)
         if oldr is not None and nowr is not None and nowr > oldr:
-            higher_before = [x for x in alive if self.rank_no(x) is not None and self.rank_no(x) < oldr and x != 17]
+            # 跃迁前的存活名单里，现在仍排在原名次之前的人（保持旧名单的顺序）
+            cut = set(self.rank[:oldr - 1])
+            higher_before = [x for x in alive if x in cut and x != 17]
             if higher_before:
                 t = self.pick_random(17, higher_before, "时空斩击目标")
                 if t is not None:
                     if not self.is_mls_unselectable_by_active_kill(t):
-                        self._log(f"  · 时空斩击：跃迁后下降，斩杀跃迁前高位 {self.N(t)}")
+                        self._log("  · 时空斩击：跃迁后下降，斩杀跃迁前高位 {0:N}", t)
                         self.kill(t, 17, "时空斩击联动斩杀")
                     else:
                         self._log("  · 时空斩击：随机到mls(10)不可选 → 失败")
-        r.mem["cd"] = 2
+        r.mem.cd = 2
     def act_18(self):
         r = self.roles[18]
-        cd = r.mem.get("cd", 0)
+        cd = r.mem.cd
         if cd > 0:
-            r.mem["cd"] = cd - 1
+            r.mem.cd = cd - 1
             self._log("  · 秩序颠覆：冷却中")
             return
         alive = self.alive_ids()
         first = alive[0]
-        back = alive[len(alive) // 2:]
+        back = self.bottom_fraction(0.5)
         target = self.pick_random(18, [x for x in back if x != first], "秩序颠覆交换目标")
         if target is None:
             return
-        self._log(f"  · 秩序颠覆：交换 {self.N(first)} 与 {self.N(target)}")
+        self._log("  · 秩序颠覆：交换 {0:N} 与 {1:N}", first, target)
         self.swap(first, target, source=18, note="秩序颠覆")
         myr = self.rank_no(18)
         if myr is not None and myr > 10 and self.roles[18].status.total_shields() > 0:
-            self.consume_shield_once(18)
-            self._log(f"  · 末位放逐：消耗1层护盾，斩杀原第一 {self.N(first)}")
+            self.consume_shield_once(18, 18)
+            self._log("  · 末位放逐：消耗1层护盾，斩杀原第一 {0:N}", first)
             self.kill(first, 18, "末位放逐联动斩杀")
-        r.mem["cd"] = 2
+        r.mem.cd = 2
     def act_19(self):
         # 释延能(19)
         # 改动：每回合必定释放（概率100%），随机复制一名存活角色的主动逻辑并执行。
@@ -2289,10 +3269,10 @@ class Engine:
         if pick is None:
             self._log("  · 万象随机：无可复制目标")
             return
-        self._log(f"  · 万象随机：复制 {self.N(pick)} 的主动逻辑（以释延能触发）")
+        self._log("  · 万象随机：复制 {0:N} 的主动逻辑（以释延能触发）", pick)
         self.dispatch_active(pick)
     def act_20(self):
-        if not self.roles[11].alive:
+        if 11 not in self.roles or not self.roles[11].alive:
             self._log("  · 父子同心：豆进天已死，本回合无主动（转被动）")
             return
         myr = self.rank_no(20)
@@ -2302,7 +3282,7 @@ class Engine:
         if myr >= son:
             self._log("  · 父子同心：自身排名不高于豆进天，条件不满足")
             return
-        lower = [x for x in self.alive_ids() if self.rank_no(x) is not None and self.rank_no(x) > myr and x != 20]
+        lower = self.below(20)
         if not lower:
             self._log("  · 父子同心：无低位目标")
             return
@@ -2315,17 +3295,17 @@ class Engine:
         p = 0.50 + (son - myr) * 0.05
         p = max(0.0, min(0.80, p))
         if self.rng.random() <= p:
-            self._log(f"  · 父子同心：成功率{int(p*100)}%判定成功，斩杀 {self.N(t)} 并与豆进天交换")
+            self._log(lambda: f"  · 父子同心：成功率{int(p*100)}%判定成功，斩杀 {self.N(t)} 并与豆进天交换")
             self.kill(t, 20, "父子同心斩杀")
             if self.roles[11].alive:
                 self.swap(20, 11, source=20, note="父子同心成功后交换")
         else:
-            self._log(f"  · 父子同心：成功率{int(p*100)}%判定失败")
+            self._log(lambda: f"  · 父子同心：成功率{int(p*100)}%判定失败")
     # 4) 钟无艳：删除孤傲/禁盾；仅保留“每3回合遗忘1回合”
     def act_21(self):
         r = self.roles[21]
-        r.mem["counter"] = r.mem.get("counter", 0) + 1
-        if r.mem["counter"] % 3 != 0:
+        r.mem.counter = r.mem.counter + 1
+        if r.mem.counter % 3 != 0:
             self._log("  · 往事皆尘：计数未到（每3回合）")
             return
         alive = [x for x in self.alive_ids() if x != 21]
@@ -2335,27 +3315,27 @@ class Engine:
         if self.roles[target].status.sealed > 0 or self.roles[target].status.forgotten > 0:
             self._log("  · 往事皆尘：目标已封印/遗忘，无效")
             return
-        before_t = self.roles[target].status.brief()
+        before_t = self.roles[target].status.fingerprint()
         self.roles[target].status.forgotten = max(self.roles[target].status.forgotten, 1)
-        self._oulu_bump_on_status_change(target, before_t)
-        self._log(f"  · 往事皆尘：{self.N(target)} 遗忘主动技能1回合")
+        self._oulu_bump_on_status_change(target, before_t, 21)
+        self._log("  · 往事皆尘：{0:N} 遗忘主动技能1回合", target)
     def act_23(self):
         r = self.roles[23]
-        cd = r.mem.get("cd", 0)
+        cd = r.mem.cd
         if cd > 0:
-            r.mem["cd"] = cd - 1
+            r.mem.cd = cd - 1
             self._log("  · 久旱逢甘霖：冷却中")
             return
         cand = []
         for cid in self.alive_ids():
             if cid == 23:
                 continue
-            t = self.roles[cid].mem.get("alive_turns", 0)
+            t = self.roles[cid].mem.alive_turns
             if t >= 2:
                 cand.append(cid)
         if not cand:
             self._log("  · 久旱逢甘霖：无连续存活≥2目标")
-            r.mem["cd"] = 2
+            r.mem.cd = 2
             return
         target = self.pick_random(23, cand, "久旱逢甘霖目标")
         if target is None:
@@ -2363,14 +3343,14 @@ class Engine:
         if self.is_mls_unselectable_by_active_kill(target):
             self._log("  · 久旱逢甘霖：随机到mls(10)不可选 → 失败")
         else:
-            self._log(f"  · 久旱逢甘霖：斩杀 {self.N(target)}")
+            self._log("  · 久旱逢甘霖：斩杀 {0:N}", target)
             self.kill(target, 23, "久旱逢甘霖随机斩杀")
-        r.mem["cd"] = 2
+        r.mem.cd = 2
     def act_24(self):
         r = self.roles[24]
-        cd = r.mem.get("cd", 0)
+        cd = r.mem.cd
         if cd > 0:
-            r.mem["cd"] = cd - 1
+            r.mem.cd = cd - 1
             self._log("  · 混乱更换：冷却中")
             return
         cand = [x for x in self.alive_ids() if x != 24]
@@ -2378,9 +3358,9 @@ class Engine:
             self._log("  · 混乱更换：目标不足")
             return
         a, b = self.rng.sample(cand, 2)
-        self._log(f"  · 混乱更换：{self.N(a)} 与 {self.N(b)} 互换")
+        self._log("  · 混乱更换：{0:N} 与 {1:N} 互换", a, b)
         self.swap(a, b, source=24, note="混乱更换")
-        r.mem["cd"] = 2
+        r.mem.cd = 2
     def act_25(self):
         # Default: no active skill (blessings are handled in passives).
         if not self.joke_mode:
@@ -2389,7 +3369,7 @@ class Engine:
         # Joke mode: invincible + 10 times per turn: eliminate a random role, then move up 1.
         self._log("  · 找自称(25) 无敌：获得护盾99999疫一切）")
         try:
-            self.roles[25].status.__dict__["fake_99999"] = True
+            self.roles[25].status.fake_99999 = True
         except Exception:
             pass
         npc_ids = {getattr(self, "HW_CID", 1001), getattr(self, "LDL_CID", 1002)}
@@ -2398,7 +3378,7 @@ class Engine:
             if not targets:
                 break
             v = self.rng.choice(targets)
-            self._log(f"    - 第{i+1}次：随机淘汰 {self.N(v)}")
+            self._log("    - 第{0}次：随机淘汰 {1:N}", i+1, v)
             # Direct elimination (bypass shields & revival) to match the joke-mode description.
             self.kill(v, 25, "玩笑模式随机淘汰", bypass_shield=True, bypass_revive=True)
             # After each trigger, rise 1 position.
@@ -2420,8 +3400,8 @@ class Engine:
             return
         threshold = self.start_rank_snapshot.get(7, 999)
         self.roles[killer].status.hewenx_curse = {"killer": killer, "threshold_rank": threshold}
-        self._log(f"  · hewenx怨念爆发：标记凶手 {self.N(killer)}，下回合行动前若排名高于阈值则斩杀（护盾无效）")
-    def on_death_9(self):
+        self._log("  · hewenx怨念爆发：标记凶手 {0:N}，下回合行动前若排名高于阈值则斩杀（护盾无效）", killer)
+    def on_death_9(self, killer: Optional[int] = None):
         # 书法家(9) 的死亡触发已改为“立刻复活并获得永久遗策直插第一（本局一次）”，
         # 因此此处不再执行旧版“遗策/留痕”随机效果。
         return
@@ -2433,20 +3413,20 @@ class Engine:
         st = r.status
         if st.perma_disabled:
             return
-        if r.mem.get("revive_used"):
+        if r.mem.revive_used:
             self._log("  · 血债血偿：已用过，本次不触发")
             return
 
         # 触发一次性复活
-        r.mem["revive_used"] = True
+        r.mem.revive_used = True
         r.alive = True
-        self._log(f"  · 【血债血偿】{self.N(14)} 首次被淘汰时复活")
+        self._log("  · 【血债血偿】{0:N} 首次被淘汰时复活", 14)
 
         # 反杀凶手
         if killer is None or killer not in self.roles or (not self.roles[killer].alive):
             self._log("    ↳ 无有效存活凶手，不触发反杀")
         else:
-            self._log(f"    ↳ 反杀 {self.N(killer)}")
+            self._log("    ↳ 反杀 {0:N}", killer)
             self.kill(14, killer, "血债血偿反杀")
 
         # 复活后移到队尾并整理
@@ -2475,14 +3455,14 @@ class Engine:
         tr = self.rank_no(target)
         if tr is None:
             return
-        self._log(f"  · 穷追猛打：随机淘汰 {self.N(target)}（我={myr}名，目标={tr}名）")
+        self._log("  · 穷追猛打：随机淘汰 {0:N}（我={1}名，目标={2}名）", target, myr, tr)
         died = self.kill(target, 27, "穷追猛打淘汰")
         if not died:
             self._log("  · 穷追猛打：淘汰被抵挡（护盾）→ 不进行位移")
             return
         diff = abs(tr - myr)
         if diff > 0:
-            self._log(f"  · 穷追猛打：上升排名差值 {diff} 名")
+            self._log("  · 穷追猛打：上升排名差值 {0} 名", diff)
             self.move_by(27, -diff, source=27, note="穷追猛打位移")
 
 
@@ -2493,10 +3473,10 @@ class Engine:
         if (not self.roles[29].alive) or self.roles[29].status.perma_disabled:
             return
 
-        cd = int(self.roles[29].mem.get("purify_cd", 0))
+        cd = self.roles[29].mem.purify_cd
         if cd > 0:
-            self.roles[29].mem["purify_cd"] = cd - 1
-            self._log(f"  · 净化能量：冷却中({cd-1})")
+            self.roles[29].mem.purify_cd = cd - 1
+            self._log("  · 净化能量：冷却中({0})", cd-1)
             return
 
         p = self.pos(29)
@@ -2510,10 +3490,11 @@ class Engine:
 
         if targets:
             for t in targets:
-                before_t = self.roles[t].status.brief()
-                self.roles[t].status.purify_ttl = max(getattr(self.roles[t].status, "purify_ttl", 0), 2)
-                self._on_status_change(t, before_t)
-            self._log("  · 净化能量：" + "、".join(self.N(x) for x in targets) + " 获得【净化】(2回合)")
+                before_t = self.roles[t].status.fingerprint()
+                self.roles[t].status.purify_ttl = max(self.roles[t].status.purify_ttl, 2)
+                self._on_status_change(t, before_t, 29)
+            self._log(lambda: "  · 净化能量：" + "、".join(self.N(x) for x in targets) + " 获得【净化】(2回合)",
+                      kind="status_gain", actor=29, targets=tuple(targets), reason="净化")
 
     def act_34(self):
         # 季任杰(34)
@@ -2530,16 +3511,16 @@ class Engine:
         # 【翩若惊鸿】每回合有5%概率立刻升至第一名。
         # 若判定失败，则下一回合概率上升5%（可叠加），最高80%。
         r = self.roles[38]
-        p = float(r.mem.get("pyjh_p", 0.05))
+        p = r.mem.pyjh_p
         p = max(0.05, min(0.80, p))
         if self.rng.random() < p:
-            self._log(f"  · 翩若惊鸿：{int(p*100)}% 判定成功 → 立刻升至第一名")
+            self._log(lambda: f"  · 翩若惊鸿：{int(p*100)}% 判定成功 → 立刻升至第一名")
             self.insert_rank(38, 1, source=38, note="翩若惊鸿")
-            r.mem["pyjh_p"] = 0.05
+            r.mem.pyjh_p = 0.05
         else:
             p2 = min(0.80, p + 0.05)
-            r.mem["pyjh_p"] = p2
-            self._log(f"  · 翩若惊鸿：{int(p*100)}% 判定失败 → 下回合概率提升至{int(p2*100)}%")
+            r.mem.pyjh_p = p2
+            self._log(lambda: f"  · 翩若惊鸿：{int(p*100)}% 判定失败 → 下回合概率提升至{int(p2*100)}%")
 
     def act_40(self):
         # 姚舒馨(40)
@@ -2558,10 +3539,10 @@ class Engine:
             if target is None:
                 self._log("  · 烈焰炸弹：未选中目标（可能全体隐身/不可选）")
                 return
-            before = self.roles[target].status.brief()
+            before = self.roles[target].status.fingerprint()
             self.roles[target].status.bomb = True
-            self._log(f"  · 烈焰炸弹：{self.N(target)} 获得【炸弹】")
-            self._on_status_change(target, before)
+            self._log("  · 烈焰炸弹：{0:N} 获得【炸弹】", target, kind="status_gain", actor=40, targets=(target,), reason="炸弹")
+            self._on_status_change(target, before, 40)
             return
 
         holder = holders[0]
@@ -2570,12 +3551,12 @@ class Engine:
         if holder_rank is None or my_rank is None:
             return
 
-        self._log(f"  · 烈焰炸弹：引爆 {self.N(holder)} 的炸弹")
+        self._log("  · 烈焰炸弹：引爆 {0:N} 的炸弹", holder)
         died = self.kill(holder, 40, "烈焰炸弹引爆淘汰")
         # 无论是否淘汰成功（护盾/免疫等），炸弹都会消失
-        before_b = self.roles[holder].status.brief()
+        before_b = self.roles[holder].status.fingerprint()
         self.roles[holder].status.bomb = False
-        self._on_status_change(holder, before_b)
+        self._on_status_change(holder, before_b, 40)
         if not died:
             # 护盾抵挡也应消耗炸弹（修复：炸弹不应继续留场）
             self._log("  · 烈焰炸弹：淘汰被抵挡（护盾）→ 炸弹消失")
@@ -2583,7 +3564,7 @@ class Engine:
 
         if holder_rank < my_rank and self.roles[40].alive:
             self._compact()
-            self._log(f"  · 烈焰炸弹：目标原排名更高 → {self.N(40)} 代替其位置（第{holder_rank}名）")
+            self._log("  · 烈焰炸弹：目标原排名更高 → {0:N} 代替其位置（第{1}名）", 40, holder_rank)
             self.insert_rank(40, holder_rank, source=None, note="烈焰炸弹代替位置")
 
     def act_41(self):
@@ -2591,7 +3572,7 @@ class Engine:
         if not self.roles[41].alive or self.roles[41].status.perma_disabled:
             return
         st = self.roles[41].status
-        if getattr(st, "frontline_cd", 0) > 0:
+        if st.frontline_cd > 0:
             return
         r41 = self.rank_no(41)
         if r41 is None:
@@ -2608,8 +3589,8 @@ class Engine:
         t = self.rng.choice(cand)
         if 41 not in self._active_logged:
             self._active_logged.add(41)
-            self._log(f"【{self.N(41)}】发动主动技能…")
-        self._log(f"  · 迫近战线：选择 {self.N(t)}，双方互相逼近1名")
+            self._log("【{0:N}】发动主动技能…", 41)
+        self._log("  · 迫近战线：选择 {0:N}，双方互相逼近1名", t)
         # 自己上升1，目标下降1
         self.move_by(41, -1, source=41, note="迫近战线")
         self.move_by(t, 1, source=41, note="迫近战线")
@@ -2640,15 +3621,15 @@ class Engine:
         if target is None:
             self._log("  · 导电性：未选中目标（可能全体隐身/不可选）")
             return
-        before_t = self.roles[target].status.brief()
+        before_t = self.roles[target].status.fingerprint()
         trans = st.thunder
         st.thunder = 0
         self.roles[target].status.thunder += trans
-        self._on_status_change(target, before_t)
-        self._log(f"  · 导电性：转移雷霆{trans}层 → {self.N(target)}")
+        self._on_status_change(target, before_t, 39)
+        self._log("  · 导电性：转移雷霆{0}层 → {1:N}", trans, target)
         # 获得感电
-        st.dian = min(3, getattr(st, "dian", 0) + 1)
-        self._log(f"  · 导电性：{self.N(39)} 获得1层【感电】(当前{st.dian}/3)")
+        st.dian = min(3, st.dian + 1)
+        self._log("  · 导电性：{0:N} 获得1层【感电】(当前{1}/3)", 39, st.dian)
 
     def act_42(self):
         # 俞守衡
@@ -2669,7 +3650,7 @@ class Engine:
                     self._log("  · 鱼龙潜跃：未选中目标（可能全体隐身/不可选）")
                 else:
                     self.set_status(target, "fish", True, 42, note="鱼龙潜跃")
-                    self._log(f"  · 鱼龙潜跃：{self.N(target)} 获得【鱼】")
+                    self._log("  · 鱼龙潜跃：{0:N} 获得【鱼】", target, kind="status_gain", actor=42, targets=(target,), reason="鱼")
 
         # 游鱼归渊：取场上第一条鱼的附身者（规则：场上至多1条鱼）
         alive_now = self.alive_ids()
@@ -2696,7 +3677,7 @@ class Engine:
             self._log("  · 游鱼归渊：无受影响目标")
             return
 
-        self._log("  · 游鱼归渊：鱼 牵引  " + "、".join(self.N(x) for x in affected) + " 下移1位")
+        self._log(lambda: "  · 游鱼归渊：鱼 牵引  " + "、".join(self.N(x) for x in affected) + " 下移1位")
         # 同步位移：从后往前移动，避免先移动导致相互抵消
         affected_sorted = sorted(affected, key=lambda x: self.rank_no(x) or 0, reverse=True)
         for c in affected_sorted:
@@ -2705,13 +3686,13 @@ class Engine:
     def act_46(self):
         # 戚银潞：第一回合标记两名队友（仅日志记录）
         r = self.roles[46]
-        if self.turn == 1 and (not r.mem.get("mates_picked", False)):
+        if self.turn == 1 and (not r.mem.mates_picked):
             pool = [cid for cid in self.alive_ids() if cid != 46]
             if len(pool) >= 2:
                 a, b = self.rng.sample(pool, 2)
-                r.mem["mates_picked"] = True
-                r.mem["mates"] = [a, b]
-                self._log(f"  · 孤军奋战：队友标记为 {self.N(a)}、{self.N(b)}（仅记录）")
+                r.mem.mates_picked = True
+                r.mem.mates = [a, b]
+                self._log("  · 孤军奋战：队友标记为 {0:N}、{1:N}（仅记录）", a, b)
         # 主动无额外效果
         return
 
@@ -2721,7 +3702,7 @@ class Engine:
                 target = self.pick_random(42, pool, "鱼龙潜跃施加目标")
                 if target is not None:
                     self.set_status(target, 'fish', True, 42, note='鱼龙潜跃')
-                    self._log(f"  · 鱼龙潜跃：{self.N(target)} 获得【鱼】")
+                    self._log("  · 鱼龙潜跃：{0:N} 获得【鱼】", target, kind="status_gain", actor=42, targets=(target,), reason="鱼")
 
         # 【游鱼归渊】鱼每回合牵引附身者及相邻者下拖一位；俞守衡自己不受影响
         alive_now = self.alive_ids()
@@ -2740,13 +3721,13 @@ class Engine:
                 seen=set()
                 affected=[x for x in affected if not (x in seen or seen.add(x))]
                 if affected:
-                    self._log("  · 游鱼归渊：鱼 牵引  " + "、".join(self.N(x) for x in affected) + " 下移1位")
+                    self._log(lambda: "  · 游鱼归渊：鱼 牵引  " + "、".join(self.N(x) for x in affected) + " 下移1位")
                     for c in affected:
                         self.move_by(c, +1, source=42, note="游鱼归渊")
 
-        self.roles[14].mem["revive_used"] = True
+        self.roles[14].mem.revive_used = True
         self.roles[14].alive = True
-        self._log(f"  · 血债血偿：{self.N(14)} 复活并杀死凶手 {self.N(killer)}")
+        self._log("  · 血债血偿：{0:N} 复活并杀死凶手 {1:N}", 14, killer)
 
         self.kill(killer, 14, "血债血偿反杀凶手", bypass_shield=False, bypass_revive=True)
 
@@ -2759,17 +3740,17 @@ class Engine:
         self._compact()
 
 
-    def on_death_23(self):
+    def on_death_23(self, killer: Optional[int] = None):
         cand = []
         for cid, r in self.roles.items():
             if cid == 23:
                 continue
-            if (not r.alive) and ("dead_turn" in r.mem) and (self.turn - r.mem["dead_turn"] > 3):
+            if (not r.alive) and (r.mem.dead_turn is not None) and (self.turn - r.mem.dead_turn > 3):
                 cand.append(cid)
         if cand:
             t = self.rng.choice(cand)
             self.roles[t].alive = True
-            self._log(f"  · 梅雨神死亡被动：复活 {self.N(t)}（死亡超过3回合）")
+            self._log("  · 梅雨神死亡被动：复活 {0:N}（死亡超过3回合）", t)
             self._compact()
             mid = max(1, len(self.rank) // 2 + 1)
             self.rank.insert(mid - 1, t)
@@ -2780,10 +3761,10 @@ class Engine:
     def tick_alive_turns(self):
         for cid, r in self.roles.items():
             if r.alive:
-                r.mem["alive_turns"] = r.mem.get("alive_turns", 0) + 1
+                r.mem.alive_turns = r.mem.alive_turns + 1
             else:
-                if "dead_turn" not in r.mem:
-                    r.mem["dead_turn"] = self.turn
+                if r.mem.dead_turn is None:
+                    r.mem.dead_turn = self.turn
     # ---------- 批量模拟 ----------
     def play_to_end(self, max_turns: int = 5000) -> Optional[int]:
         for _ in range(max_turns):
@@ -2799,6 +3780,57 @@ class Engine:
                 return None
         return None
 # =========================
+# 内置技能登记
+# =========================
+def _register_builtin_skills(registry: SkillRegistry):
+    """Engine 上的 act_<cid> / on_death_<cid> 按名字登记；状态被动按触发顺序登记。"""
+    for name, fn in list(vars(Engine).items()):
+        m = re.fullmatch(r"(act|on_death)_(\d+)", name)
+        if m is None:
+            continue
+        cid = int(m.group(2))
+        if m.group(1) == "act":
+            registry.active(cid)(fn)
+        else:
+            registry.death(cid)(fn)
+    registry.passive("status_change", 44, "无懈可击", scope="own")(Engine._passive_wuxie)
+    registry.passive("status_change", 13, "风过无痕", scope="own")(Engine._passive_fengguo)
+    registry.passive("status_change", 33, "特异性免疫", scope="own")(Engine._passive_scj_immune)
+
+    # 淘汰：death 在记入淘汰顺序之前，kill 在之后
+    registry.passive("death", 30, "回声追索")(Engine._passive_huisheng)
+    registry.passive("death", 37, "真相解码", scope="own")(Engine._passive_zhenxiang)
+    registry.passive("death", 37, "破绽洞察")(Engine._passive_pozhan)
+    registry.passive("death", 43, "救赎祷言")(Engine._passive_jiushu)
+    registry.passive("kill", HW_CID, "洪伟陨落", scope="own")(Engine._passive_hongwei_fall)
+    registry.passive("kill", LDL_CID, "李东雷陨落", scope="own")(Engine._passive_lidonglei_fall)
+    registry.passive("kill", 46, "孤军奋战")(Engine._passive_lone_wolf_on_kill)
+    registry.passive("kill", 31, "残灯复明（世界规则）", scope="own")(Engine._passive_candle_world)
+    registry.passive("kill", 31, "残灯复明", scope="own")(Engine._passive_candle)
+    registry.passive("kill", None, "附生", scope="any")(Engine._passive_candle_attached)
+    registry.passive("kill", 25, "祝福")(Engine._passive_bless)
+    registry.passive("kill", 26, "天命", scope="own")(Engine._passive_tianming)
+
+    # 回合末：先逐人结算（静默审判、锁定防线要赶在状态递减之前），再整体结算
+    registry.passive("role_turn_end", 28, "静默审判", scope="own")(Engine._passive_silent_judgement)
+    registry.passive("role_turn_end", 45, "锁定防线", scope="own")(Engine._passive_defense_line)
+    registry.passive("role_turn_end", None, "状态结算", scope="any")(Engine._status_upkeep)
+    registry.passive("role_turn_end", 32, "清障圣辉", scope="own")(Engine._passive_qingzhang)
+    registry.passive("role_turn_end", 3, "斩杀冷却", scope="own")(Engine._tick_execute_cd)
+    registry.passive("role_turn_end", 17, "护佑之盾冷却", scope="own")(Engine._tick_shield_cd)
+    registry.passive("role_turn_end", 36, "天罚灭世", scope="own")(Engine._passive_tianfa)
+    registry.passive("role_turn_end", 34, "越挫越勇", scope="own")(Engine._passive_vyzy)
+    registry.passive("role_turn_end", 46, "孤军奋战", scope="own")(Engine._passive_lone_wolf_move)
+    registry.passive("turn_end", 21, "巾帼护盾")(Engine.endcheck_zhongwuyan)
+    registry.passive("turn_end", 11, "天命所归")(Engine.check_doujintian_passive)
+    registry.passive("turn_end", 6, "牵寒")(Engine.check_qianhan_passive)
+    registry.passive("turn_end", 46, "孤军奋战")(Engine.check_qiyinlu_lone_wolf)
+
+    registry.passive("rank_change", 36, "神威")(Engine._check_shenwei_loss)
+
+
+_register_builtin_skills(SKILLS)
+# =========================
 # UI
 # =========================
 class UI:
@@ -2817,20 +3849,24 @@ class UI:
         self.show_realname = tk.BooleanVar(value=False)
         self.show_initials = tk.BooleanVar(value=False)
         self.auto_skip_turn = tk.BooleanVar(value=True)
+        # 实时胜率窗口（后台进程池推演，见 win_odds.py）
+        self.show_odds = tk.BooleanVar(value=False)
+        self._odds = None
+        self._odds_win: Optional[Dict[str, Any]] = None
+        self._odds_job: Optional[str] = None
         self.export_error_log = False
         self._auto_skip_job: Optional[str] = None
         # Joke mode: "找自称无敌模式" (default off)
         self.joke_mode = tk.BooleanVar(value=False)
         self.revealed_lines: List[str] = []
         self.revealed_hls: List[List[int]] = []
-        self.revealed_victims: List[Optional[int]] = []
+        self.revealed_victims: List[Tuple[int, ...]] = []
         self.current_snap = None
         self.current_highlights: set[int] = set()
         self.font_size = 16
         self.font_rank = tkfont.Font(family="Microsoft YaHei UI", size=self.font_size, weight="normal")
         self.font_log = tkfont.Font(family="Microsoft YaHei UI", size=self.font_size, weight="normal")
         self.font_log_bold = tkfont.Font(family="Microsoft YaHei UI", size=self.font_size, weight="bold")
-        self._cid_pat = re.compile(r"\((\d{1,3})\)")
         # 颜色
         self.color_thunder = "#0B3D91"
         self.color_pos = "#D4AF37"
@@ -2924,6 +3960,7 @@ class UI:
         menu.add_checkbutton(label="保留历史记录", variable=self.preserve_history)
         menu.add_checkbutton(label="显示实名", variable=self.show_realname, command=self._on_toggle_show_realname)
         menu.add_checkbutton(label="显示首字母", variable=self.show_initials, command=self._on_toggle_show_initials)
+        menu.add_checkbutton(label="实时胜率（后台推演）", variable=self.show_odds, command=self._on_toggle_odds)
         menu.add_separator()
         menu.add_command(label="字体放大", command=lambda: self.adjust_font(2))
         menu.add_command(label="字体缩小", command=lambda: self.adjust_font(-2))
@@ -2962,7 +3999,7 @@ class UI:
             self.engine.joke_mode = bool(self.joke_mode.get())
             if 25 in self.engine.roles:
                 st = self.engine.roles[25].status
-                st.__dict__["fake_99999"] = bool(self.joke_mode.get())
+                st.fake_99999 = bool(self.joke_mode.get())
         except Exception:
             pass
 
@@ -3007,15 +4044,19 @@ class UI:
         self.bottom = ttk.Frame(self.main)
         self.bottom.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(8, 0))
         ttk.Button(self.bottom, text="新开局", command=self.on_new).grid(row=0, column=0, padx=8)
+        self.btn_back_turn = ttk.Button(self.bottom, text="上一回合", command=self.on_back_turn)
+        self.btn_back_turn.grid(row=0, column=1, padx=8)
         self.btn_turn = ttk.Button(self.bottom, text="下一回合", command=self.on_build_turn)
-        self.btn_turn.grid(row=0, column=1, padx=8)
+        self.btn_turn.grid(row=0, column=2, padx=8)
+        self.btn_back_step = ttk.Button(self.bottom, text="上一行", command=self.on_step_back_line)
+        self.btn_back_step.grid(row=0, column=3, padx=8)
         self.btn_step = ttk.Button(self.bottom, text="下一行", command=self.on_step_line)
-        self.btn_step.grid(row=0, column=2, padx=8)
+        self.btn_step.grid(row=0, column=4, padx=8)
         self.btn_auto = ttk.Button(self.bottom, text="自动播放", command=self.on_auto_play)
-        self.btn_auto.grid(row=0, column=3, padx=8)
+        self.btn_auto.grid(row=0, column=5, padx=8)
         self.btn_pause = ttk.Button(self.bottom, text="暂停", command=self.on_pause)
-        self.btn_pause.grid(row=0, column=4, padx=8)
-        ttk.Label(self.bottom, text="播放速度").grid(row=0, column=5, padx=(20, 6))
+        self.btn_pause.grid(row=0, column=6, padx=8)
+        ttk.Label(self.bottom, text="播放速度").grid(row=0, column=7, padx=(20, 6))
         self.speed_scale = ttk.Scale(
             self.bottom,
             from_=0.1,
@@ -3024,10 +4065,10 @@ class UI:
             variable=self.speed_var,
             command=lambda _v: self._update_speed_label()
         )
-        self.speed_scale.grid(row=0, column=6, padx=6, sticky="ew")
+        self.speed_scale.grid(row=0, column=8, padx=6, sticky="ew")
         self.speed_label = ttk.Label(self.bottom, text="")
-        self.speed_label.grid(row=0, column=7, padx=(6, 0))
-        self.bottom.columnconfigure(6, weight=1)
+        self.speed_label.grid(row=0, column=9, padx=(6, 0))
+        self.bottom.columnconfigure(8, weight=1)
         self._update_speed_label()
     def _update_speed_label(self):
         try:
@@ -3118,7 +4159,7 @@ made by dian_mi
 但是其实都是GPT大人神力
 欢迎大家游玩
 菜单说明：
-- 快速跑5000局：完整规则蒙特卡洛统计（界面可能短暂无响应）
+- 快速跑5000局：完整规则蒙特卡洛统计（后台运行，可查看进度或中途取消）
 - 自动跳过回合：每次回合日志播完后，等待5秒自动推进下一回合
 - 保留历史记录：推进新回合时，右侧日志不清空、会继续累积（便于复盘）
 """
@@ -3141,6 +4182,9 @@ made by dian_mi
         self.current_snap = None
         self.current_highlights = set()
         self._set_buttons_enabled(True)
+        if self._odds is not None:
+            self._odds.clear()
+        self._refresh_odds()
         self.refresh()
     def _set_buttons_enabled(self, enabled: bool):
         state = "normal" if enabled else "disabled"
@@ -3152,259 +4196,292 @@ made by dian_mi
     # ---------- 快速模拟 ----------
     
     def _run_quick_sim(self, GAMES: int):
+        # 快速跑放到后台线程：界面不再卡住，进度窗口里实时显示进度/速度/剩余时间和部分统计，可随时取消
+        if getattr(self, "_sim_job", None) is not None:
+            try:
+                messagebox.showinfo("快速跑", "已有快速跑正在进行，请先等待完成或取消。")
+            except Exception:
+                pass
+            return
+        import queue
+        import threading
+        import time
+        import traceback
+        import batch_sim
         try:
             self.log_text.configure(state="normal")
-            self.log_text.insert(tk.END, f"\n【测试】开始快速模拟{GAMES}局…（期间界面可能短暂无响应）\n")
+            self.log_text.insert(tk.END, f"\n【测试】开始快速模拟{GAMES}局…（后台运行，可在进度窗口取消）\n")
             self.log_text.configure(state="disabled")
             self.log_text.see(tk.END)
-            self.root.update_idletasks()
         except Exception:
             pass
-        first_cnt = {cid: 0 for cid in self.engine.roles.keys()}
-        top3_cnt = {cid: 0 for cid in self.engine.roles.keys()}
-        top10_cnt = {cid: 0 for cid in self.engine.roles.keys()}
-        place_sum = {cid: 0 for cid in self.engine.roles.keys()}
-        place_cnt = {cid: 0 for cid in self.engine.roles.keys()}
-        survive_sum = {cid: 0 for cid in self.engine.roles.keys()}
-        survive_cnt = {cid: 0 for cid in self.engine.roles.keys()}
-        errors = 0
-        first_err = None
-
-        timeouts = 0
-        skill_errors = 0
-        valid_games = 0
-        seed_rng = random.Random()
-        for gi in range(GAMES):
+        roster = [cid for cid in self.engine.roles.keys() if cid not in (HW_CID, LDL_CID)]
+        export_error_log = bool(self.engine.export_error_log)
+        job = {
+            "games": GAMES,
+            "queue": queue.Queue(),
+            "cancel": threading.Event(),
+            "t0": time.perf_counter(),
+            "last_draw": 0.0,
+        }
+        self._sim_job = job
+        self._open_sim_window(job)
+
+        def on_progress(st):
+            # 交给界面线程的是快照，后台继续累加不会影响正在绘制的表格
+            job["queue"].put(("progress", batch_sim.SimStats.from_state(st.state())))
+
+        def worker():
             try:
-                e = Engine(seed=seed_rng.randint(1, 10**9), fast_mode=True)
-                seed = e.base_seed
-
-                # [v19 debug] 继承UI开关到快速跑引擎，并写入每局标记
-                e.export_error_log = bool(self.engine.export_error_log)
-                if e.export_error_log:
-                    try:
-                        with open(self.engine._error_log_path(), "a", encoding="utf-8") as f:
-                            f.write("\n[v19] quick_sim start seed=%s\n" % (e.base_seed,))
-                            f.flush()
-                    except Exception as _e:
-                        try:
-                            self.log_text.configure(state="normal")
-                            self.log_text.insert(tk.END, f"\n【警告】写入error_log失败：{_e}\n")
-                            self.log_text.configure(state="disabled")
-                        except Exception:
-                            pass
-                # Run until game over (or until safety cap). If cap is hit, treat as timeout and exclude.
-                MAX_TURNS = 50000
-                for __ in range(MAX_TURNS):
-                    if e.game_over:
-                        break
-                    e.tick_alive_turns()
-                    e.next_turn()
-                if (not e.game_over) and len(e.alive_ids()) > 1:
-                    timeouts += 1
-                    continue
-                # If any skill exception happened, treat the game as invalid (rules not executed correctly).
-                if e.skill_exception_count > 0:
-                    skill_errors += 1
-
-                if e.skill_exception_count > 0 and getattr(e, "export_error_log", False):
-                    try:
-                        with open(e._error_log_path(), "a", encoding="utf-8") as f:
-                            f.write("\n=== Game %d skill_exceptions=%d seed=%s ===\n" % (gi+1, e.skill_exception_count, seed))
-                            for ex in getattr(e, "skill_exception_examples", [])[:20]:
-                                if len(ex) == 3:
-                                    cid_, msg_, tb_ = ex
-                                else:
-                                    cid_, msg_ = ex[0], ex[1]
-                                    tb_ = ""
-                                f.write("- %s: %s\n" % (e.N(cid_), msg_))
-                                if tb_:
-                                    f.write(tb_ + "\n")
-                    except Exception:
-                        pass
-                    continue
-                alive = e.alive_ids()
-
-                if getattr(e, "export_error_log", False):
-                    try:
-                        with open(e._error_log_path(), "a", encoding="utf-8") as f:
-                            f.write("\n=== Game %d seed=%s skill_exception_count=%d ===\n" % (gi+1, seed, e.skill_exception_count))
-                            if e.skill_exception_count > 0:
-                                for ex in getattr(e, "skill_exception_examples", [])[:20]:
-                                    if len(ex) == 3:
-                                        cid_, msg_, tb_ = ex
-                                    else:
-                                        cid_, msg_ = ex[0], ex[1]
-                                        tb_ = ""
-                                    f.write("- %s: %s\n" % (e.N(cid_), msg_))
-                                    if tb_:
-                                        f.write(tb_ + "\n")
-                            f.flush()
-                    except Exception:
-                        pass
-                npc_ids = {HW_CID, LDL_CID}
-                alive_players = [cid for cid in alive if cid not in npc_ids]
-                # 统计每名角色的存活回合数：死亡回合=被淘汰回合；存活到最后=本局总回合数
-                for cid_ in self.engine.roles.keys():
-                    if cid_ in npc_ids:
-                        continue
-                    if cid_ in alive_players:
-                        sturn = int(e.turn)
-                    else:
-                        sturn = int(e.elimination_turn.get(cid_, e.turn))
-                    survive_sum[cid_] += sturn
-                    survive_cnt[cid_] += 1
+                stats = batch_sim.simulate(GAMES, roster=roster,
+                                           export_error_log=export_error_log,
+                                           on_progress=on_progress,
+                                           should_stop=job["cancel"].is_set,
+                                           chunk_size=self.SIM_PROGRESS_CHUNK)
+                job["queue"].put(("done", stats))
+            except Exception:
+                job["queue"].put(("error", traceback.format_exc()))
 
-                elim_players = [cid for cid in e.elimination_order if cid not in npc_ids]
+        threading.Thread(target=worker, name="quick-sim", daemon=True).start()
+        self.root.after(100, self._poll_sim)
 
-                if len(alive) == 1 and alive_players:
-                    # 最终存活者为角色
-                    first = alive_players[0]
-                    second = elim_players[-1] if len(elim_players) >= 1 else None
-                    third = elim_players[-2] if len(elim_players) >= 2 else None
-                else:
-                    # 最终存活者为NPC或无人存活：前三名取“最后死亡的三名角色”
-                    first = elim_players[-1] if len(elim_players) >= 1 else None
-                    second = elim_players[-2] if len(elim_players) >= 2 else None
-                    third = elim_players[-3] if len(elim_players) >= 3 else None
-
-                # 计算本局最终名次（1为冠军，其次为最后淘汰者…）
-                place_map = {}
-                if len(alive) == 1 and alive_players:
-                    # 冠军为最终存活者
-                    place_map[alive_players[0]] = 1
-                    for i, cid_ in enumerate(reversed(elim_players), start=2):
-                        place_map[cid_] = i
-                else:
-                    # 无角色存活或冠军为NPC：名次按最后淘汰顺序倒序
-                    for i, cid_ in enumerate(reversed(elim_players), start=1):
-                        place_map[cid_] = i
-                for cid_, pl in place_map.items():
-                    place_sum[cid_] += int(pl)
-                    place_cnt[cid_] += 1
-                    if int(pl) <= 10:
-                        top10_cnt[cid_] += 1
-
-                if first is not None:
-                    first_cnt[first] += 1
-                    top3_cnt[first] += 1
-                if second is not None:
-                    top3_cnt[second] += 1
-                if third is not None:
-                    top3_cnt[third] += 1
-                valid_games += 1
-            except Exception as ex:
-                errors += 1
-                if first_err is None:
-                    first_err = ex
-                    try:
-                        import traceback as _tb
-                        tb_txt = _tb.format_exc()
-                        self.log_text.configure(state='normal')
-                        self.log_text.insert(tk.END, '\n【快速跑异常示例】\n' + tb_txt + '\n')
-                        self.log_text.configure(state='disabled')
-                    except Exception:
-                        pass
-        
-        # Build two separate tables: Champion win rate and Top-3 win rate (exclude NPCs).
-        npc_ids = {HW_CID, LDL_CID}
-        role_ids = [cid for cid in first_cnt.keys() if cid not in npc_ids]
-        champ_rows = []
-        top3_rows = []
-        for cid in role_ids:
-            champ_rate = (first_cnt[cid] / valid_games * 100.0) if valid_games > 0 else 0.0
-            top3_rate = (top3_cnt[cid] / valid_games * 100.0) if valid_games > 0 else 0.0
-            champ_rows.append((cid, champ_rate))
-            top3_rows.append((cid, top3_rate))
-        champ_rows.sort(key=lambda x: (-x[1], x[0]))
-        top3_rows.sort(key=lambda x: (-x[1], x[0]))
+    # 后台快速跑每多少局汇报一次进度（也是取消的响应粒度）
+    SIM_PROGRESS_CHUNK = 50
 
+    def _open_sim_window(self, job):
         win = tk.Toplevel(self.root)
-        win.title(f"{GAMES}局统计（冠军/前三名胜率）")
-        win.geometry("560x780")
+        win.title(f"{job['games']}局统计（冠军/前三名胜率）")
+        win.geometry("560x820")
+        top = tk.Frame(win)
+        top.pack(fill="x", padx=10, pady=(10, 0))
+        status = tk.Label(top, text="准备中…", anchor="w")
+        status.pack(fill="x")
+        bar = ttk.Progressbar(top, orient="horizontal", mode="determinate", maximum=job["games"])
+        bar.pack(fill="x", pady=4)
+        btn = tk.Button(top, text="取消", command=lambda: self._cancel_sim(job))
+        btn.pack(anchor="e")
         textw = tk.Text(win, wrap="none", font=("Consolas", 12))
         textw.tag_configure('hdr', font=('Microsoft YaHei', 11, 'bold'))
         textw.tag_configure('title', font=('Microsoft YaHei', 13, 'bold'))
         textw.tag_configure('alt', background='#f2f2f2')
         textw.tag_configure('hl', background='#ffe8a3')
+        textw.pack(fill="both", expand=True, padx=10, pady=10)
+        textw.configure(state="disabled")
+        win.protocol("WM_DELETE_WINDOW", lambda: (self._cancel_sim(job), win.destroy()))
+        job.update(win=win, status=status, bar=bar, btn=btn, text=textw)
+
+    def _cancel_sim(self, job):
+        job["cancel"].set()
+        try:
+            job["btn"].config(text="正在取消…", state="disabled")
+        except Exception:
+            pass
+
+    def _poll_sim(self):
+        import queue
+        import time
+        job = getattr(self, "_sim_job", None)
+        if job is None:
+            return
+        latest = None
+        final = None
+        while True:
+            try:
+                kind, payload = job["queue"].get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                latest = payload
+            else:
+                final = (kind, payload)
+        if final is not None:
+            self._sim_job = None
+            self._finish_sim(job, *final)
+            return
+        if latest is not None:
+            done = latest.games
+            dt = max(1e-9, time.perf_counter() - job["t0"])
+            rate = done / dt
+            eta = (job["games"] - done) / rate if rate > 0 else 0.0
+            try:
+                job["bar"].config(value=done)
+                job["status"].config(text=f"已完成 {done}/{job['games']} 局　{rate:.1f} 局/秒　剩余约 {eta:.0f} 秒")
+                # 表格重绘较慢，最多每秒一次
+                now = time.perf_counter()
+                if now - job["last_draw"] >= 1.0:
+                    job["last_draw"] = now
+                    self._render_sim_stats(job["text"], latest)
+            except Exception:
+                pass  # 进度窗口已被关闭
+        self.root.after(100, self._poll_sim)
+
+    def _finish_sim(self, job, kind, payload):
+        import time
+        if kind == "error":
+            try:
+                self.log_text.configure(state='normal')
+                self.log_text.insert(tk.END, '\n【快速跑异常示例】\n' + payload + '\n')
+                self.log_text.configure(state='disabled')
+            except Exception:
+                pass
+            try:
+                job["win"].destroy()
+            except Exception:
+                pass
+            return
+        stats = payload
+        if stats.first_error:
+            try:
+                self.log_text.configure(state='normal')
+                self.log_text.insert(tk.END, '\n【快速跑异常示例】\n' + stats.first_error + '\n')
+                self.log_text.configure(state='disabled')
+            except Exception:
+                pass
+        dt = max(1e-9, time.perf_counter() - job["t0"])
+        try:
+            if not job["win"].winfo_exists():
+                return
+            head = "已取消" if stats.cancelled else "完成"
+            job["bar"].config(value=stats.games)
+            job["status"].config(text=f"{head}：{stats.games}/{job['games']} 局，用时 {dt:.1f} 秒（{stats.games / dt:.1f} 局/秒）")
+            job["btn"].config(text="关闭", state="normal", command=job["win"].destroy)
+            job["win"].protocol("WM_DELETE_WINDOW", job["win"].destroy)
+            self._render_sim_stats(job["text"], stats)
+        except Exception:
+            pass
+
+    def _render_sim_stats(self, textw, stats):
         NAME_W = 22
         VAL_W = 12
         SEP_W = 40
-        textw.pack(fill="both", expand=True, padx=10, pady=10)
+        yview = textw.yview()[0]
+        textw.configure(state="normal")
+        textw.delete("1.0", tk.END)
 
         # Summary
-        issues = (errors > 0) or (skill_errors > 0) or (timeouts > 0)
-        textw.insert(tk.END, f"总局数：{GAMES}\n")
-        textw.insert(tk.END, f"正常局数：{valid_games}\n")
-        textw.insert(tk.END, f"错误局数：{errors}\n")
-        textw.insert(tk.END, f"技能异常局数：{skill_errors}\n")
-        textw.insert(tk.END, f"超时未结束局数：{timeouts}\n")
-        textw.insert(tk.END, f"是否出现问题：{'是' if issues else '否'}\n\n")
+        textw.insert(tk.END, f"总局数：{stats.games}\n")
+        textw.insert(tk.END, f"正常局数：{stats.valid_games}\n")
+        textw.insert(tk.END, f"错误局数：{stats.errors}\n")
+        textw.insert(tk.END, f"技能异常局数：{stats.skill_errors}\n")
+        textw.insert(tk.END, f"超时未结束局数：{stats.timeouts}\n")
+        textw.insert(tk.END, f"是否出现问题：{'是' if stats.issues else '否'}\n\n")
+
+        def row_tag(i):
+            if i < 3:
+                return 'hl'
+            return 'alt' if i % 2 == 1 else None
 
         textw.insert(tk.END, "冠军统计胜率（按胜率从高到低）\n", 'title')
         textw.insert(tk.END, f"{'角色':<{NAME_W}} {'胜率':>8} {'胜场':>6}\n", 'hdr')
         textw.insert(tk.END, "-" * SEP_W + "\n")
-        for i, (cid, rate) in enumerate(champ_rows):
-            tag = None
-            if i < 3:
-                tag = 'hl'
-            elif i % 2 == 1:
-                tag = 'alt'
-            textw.insert(tk.END, f"{self.engine.N(cid):<{NAME_W}} {rate:7.3f}% {first_cnt[cid]:6d}\n", tag)
+        for i, row in enumerate(stats.champion_table()):
+            textw.insert(tk.END, f"{self.engine.N(row['cid']):<{NAME_W}} {row['rate']:7.3f}% {row['count']:6d}\n", row_tag(i))
 
         textw.insert(tk.END, "\n前三名统计胜率（按胜率从高到低）\n")
         textw.insert(tk.END, f"{'角色':<{NAME_W}} {'胜率':>8} {'胜场':>6}\n", 'hdr')
         textw.insert(tk.END, "-" * SEP_W + "\n")
-        for i, (cid, rate) in enumerate(top3_rows):
-            tag = None
-            if i < 3:
-                tag = 'hl'
-            elif i % 2 == 1:
-                tag = 'alt'
-            textw.insert(tk.END, f"{self.engine.N(cid):<{NAME_W}} {rate:7.3f}% {top3_cnt[cid]:6d}\n", tag)
-
+        for i, row in enumerate(stats.top3_table()):
+            textw.insert(tk.END, f"{self.engine.N(row['cid']):<{NAME_W}} {row['rate']:7.3f}% {row['count']:6d}\n", row_tag(i))
 
         # ---- 平均排名（独立统计）----
-        avg_rows = []
-        for cid in self.engine.roles.keys():
-            if place_cnt.get(cid, 0) > 0:
-                avg_place = place_sum[cid] / place_cnt[cid]
-                avg_rows.append((cid, avg_place))
-        avg_rows.sort(key=lambda x: (x[1], x[0]))
-
         textw.insert(tk.END, "\n平均排名统计（按平均排名从低到高）\n", 'hdr')
         textw.insert(tk.END, f"{'角色':<{NAME_W}} {'平均排名':>{VAL_W}}\n", 'hdr')
         textw.insert(tk.END, "-" * SEP_W + "\n")
-        for i, (cid, avg_place) in enumerate(avg_rows):
-            tag = None
-            if i < 3:
-                tag = 'hl'
-            elif i % 2 == 1:
-                tag = 'alt'
-            textw.insert(tk.END, f"{self.engine.N(cid):<{NAME_W}} {avg_place:{VAL_W}.3f}\n", tag)
+        for i, row in enumerate(stats.avg_place_table()):
+            textw.insert(tk.END, f"{self.engine.N(row['cid']):<{NAME_W}} {row['avg']:{VAL_W}.3f}\n", row_tag(i))
         textw.insert(tk.END, "-" * SEP_W + "\n")
         textw.insert(tk.END, "\n")
 
         # ---- 平均存活回合数（独立统计）----
-        surv_rows = []
-        for cid in self.engine.roles.keys():
-            if survive_cnt.get(cid, 0) > 0:
-                avg_surv = survive_sum[cid] / survive_cnt[cid]
-                surv_rows.append((cid, avg_surv))
-        surv_rows.sort(key=lambda x: (-x[1], x[0]))  # 存活越久越靠前
-
         textw.insert(tk.END, "\n平均存活回合数统计（按平均存活回合从高到低）\n", 'hdr')
         textw.insert(tk.END, f"{'角色':<{NAME_W}} {'平均存活回合':>{VAL_W}}\n", 'hdr')
         textw.insert(tk.END, "-" * SEP_W + "\n")
-        for i, (cid, avg_surv) in enumerate(surv_rows):
-            tag = None
-            if i < 3:
-                tag = 'hl'
-            elif i % 2 == 1:
-                tag = 'alt'
-            textw.insert(tk.END, f"{self.engine.N(cid):<{NAME_W}} {avg_surv:{VAL_W}.3f}\n", tag)
+        for i, row in enumerate(stats.survive_table()):
+            textw.insert(tk.END, f"{self.engine.N(row['cid']):<{NAME_W}} {row['avg']:{VAL_W}.3f}\n", row_tag(i))
         textw.insert(tk.END, "-" * SEP_W + "\n")
         textw.configure(state="disabled")
+        textw.yview_moveto(yview)
+    # ---------- 实时胜率 ----------
+    def _on_toggle_odds(self):
+        if self.show_odds.get():
+            self._open_odds_window()
+            self._refresh_odds()
+        else:
+            self._close_odds_window()
+
+    def _open_odds_window(self):
+        import win_odds
+        if self._odds_win is not None:
+            return
+        if self._odds is None:
+            self._odds = win_odds.OddsRunner()
+        win = tk.Toplevel(self.root)
+        win.title("实时胜率（从当前局面推演）")
+        win.geometry("380x760")
+        status = tk.Label(win, text="", anchor="w")
+        status.pack(fill="x", padx=10, pady=(10, 0))
+        textw = tk.Text(win, wrap="none", font=("Consolas", 12))
+        textw.pack(fill="both", expand=True, padx=10, pady=10)
+        textw.configure(state="disabled")
+        win.protocol("WM_DELETE_WINDOW", lambda: (self.show_odds.set(False), self._close_odds_window()))
+        self._odds_win = {"win": win, "status": status, "text": textw}
+
+    def _close_odds_window(self):
+        if self._odds_job is not None:
+            try:
+                self.root.after_cancel(self._odds_job)
+            except Exception:
+                pass
+            self._odds_job = None
+        if self._odds_win is not None:
+            try:
+                self._odds_win["win"].destroy()
+            except Exception:
+                pass
+            self._odds_win = None
+        if self._odds is not None:
+            self._odds.close()
+            self._odds = None
+
+    def _refresh_odds(self):
+        """显示胜率。本回合日志还没播完时显示本回合开始时的胜率，播完再换成本回合结束时的，
+        不提前露出本回合的结局。后台还没算完就每0.3秒收一次结果，不占用回放。"""
+        if self._odds_job is not None:
+            try:
+                self.root.after_cancel(self._odds_job)
+            except Exception:
+                pass
+            self._odds_job = None
+        if self._odds_win is None or self._odds is None:
+            return
+        odds = self._odds.view(self.engine, self.play_cursor >= len(self.engine.replay_frames))
+        try:
+            self._render_odds(odds)
+        except Exception:
+            return  # 窗口已被关闭
+        if self._odds.busy:
+            self._odds_job = self.root.after(300, self._refresh_odds)
+
+    def _render_odds(self, odds):
+        w = self._odds_win
+        textw = w["text"]
+        textw.configure(state="normal")
+        textw.delete("1.0", tk.END)
+        if odds is None:
+            w["status"].config(text="本回合回放中…（播完后显示）")
+            textw.configure(state="disabled")
+            return
+        head = f"第{odds.turn}回合结束后：已推演 {odds.rollouts}/{odds.target} 局"
+        if odds.failed:
+            head += f"，出错 {odds.failed} 局"
+        if not odds.done:
+            head += "（计算中…）"
+        w["status"].config(text=head)
+        for cid, p, hw in odds.table(odds.alive):
+            ci = f"±{hw * 100:4.1f}" if odds.rollouts else ""
+            textw.insert(tk.END, f"{self._display_name(cid):<16} {p * 100:6.1f}% {ci}\n")
+        textw.configure(state="disabled")
+
     def on_sim_5000(self):
         self._run_quick_sim(5000)
 
@@ -3439,6 +4516,7 @@ made by dian_mi
         self.engine.tick_alive_turns()
         self.engine.next_turn()
         self.play_cursor = 0
+        self._refresh_odds()
         self.playing = False
         self.current_snap = None
         self.current_highlights = set()
@@ -3475,24 +4553,68 @@ made by dian_mi
         self.play_cursor += 1
         self.revealed_lines.append(frame["text"])
         self.revealed_hls.append(frame.get("highlights", []))
-        self.revealed_victims.append(self._parse_victim_cid(frame["text"]))
+        ev = frame.get("event")
+        self.revealed_victims.append(ev.victims if ev is not None else ())
         self.current_snap = frame["snap"]
         self.current_highlights = set(frame.get("highlights", []))
         self.refresh_replay_view()
+        if self.play_cursor == len(frames):
+            self._refresh_odds()  # 本回合播完：换成本回合结束时的胜率
         if self.playing:
             delay_ms = int(max(0.1, min(2.0, float(self.speed_var.get()))) * 1000)
             # If a random event is triggered, auto-pause 3 seconds for readability.
-            try:
-                if "触发随机事件：" in frame.get("text", ""):
-                    delay_ms = max(delay_ms, 3000)
-            except Exception:
-                pass
+            if ev is not None and ev.kind == "event_trigger":
+                delay_ms = max(delay_ms, 3000)
             try:
                 if self._play_job is not None:
                     self.root.after_cancel(self._play_job)
             except Exception:
                 pass
             self._play_job = self.root.after(delay_ms, self.on_step_line)
+    def on_step_back_line(self):
+        """回退一行：本回合的回放帧可随机访问，直接显示上一帧。"""
+        self.on_pause()
+        if self.play_cursor <= 1:
+            return
+        self.play_cursor -= 1
+        self.revealed_lines.pop()
+        self.revealed_hls.pop()
+        self.revealed_victims.pop()
+        frame = self.engine.frame(self.play_cursor - 1)
+        self.current_snap = frame["snap"]
+        self.current_highlights = set(frame.get("highlights", []))
+        self._set_buttons_enabled(True)
+        self._refresh_odds()
+        self.refresh_replay_view()
+    def on_back_turn(self):
+        """退回上一回合结束时的局面（再点“下一回合”会原样重演这一回合）。"""
+        self.on_pause()
+        try:
+            if self._auto_skip_job is not None:
+                self.root.after_cancel(self._auto_skip_job)
+        except Exception:
+            pass
+        self._auto_skip_job = None
+        if not self.engine.undo_turn():
+            return
+        # 退回后停在该回合最后一行：日志从 log/log_events 的尾部重建
+        frames = self.engine.replay_frames
+        self.play_cursor = len(frames)
+        start = 0 if self.preserve_history.get() else len(self.engine.log) - len(frames)
+        events = self.engine.log_events[start:]
+        self.revealed_lines = self.engine.log[start:]
+        self.revealed_hls = [list(ev.cids) for ev in events]
+        self.revealed_victims = [ev.victims for ev in events]
+        if frames:
+            frame = self.engine.frame(len(frames) - 1)
+            self.current_snap = frame["snap"]
+            self.current_highlights = set(frame.get("highlights", []))
+        else:
+            self.current_snap = None
+            self.current_highlights = set()
+        self._set_buttons_enabled(True)
+        self._refresh_odds()
+        self.refresh_replay_view()
     def on_auto_play(self):
         if not self.engine.replay_frames:
             return
@@ -3515,59 +4637,6 @@ made by dian_mi
         except Exception:
             pass
         self._play_job = None
-    def _parse_victim_cid(self, line: str) -> Optional[int]:
-        # Structured markers
-        if "【死亡】" in line:
-            m = self._cid_pat.search(line)
-            return int(m.group(1)) if m else None
-        if "【击杀】" in line:
-            ids = [int(m.group(1)) for m in self._cid_pat.finditer(line)]
-            if len(ids) >= 2:
-                return ids[1]
-
-        # Keywords that imply an elimination in this line (various modes/wordings)
-        keywords = ("淘汰", "斩杀", "zhansha", "处决")
-        if any(k in line for k in keywords):
-            # Prefer cid-based resolution if present
-            ids = [int(m.group(1)) for m in self._cid_pat.finditer(line)]
-            if len(ids) == 1:
-                return ids[0]
-            if len(ids) >= 2:
-                return ids[-1]
-
-            # Fallback: name-based resolution when the log line contains no (cid)
-            # Try to extract the target name that follows the keyword.
-            # e.g. "zhansha 书法家" / "斩杀 戚银潞" / "处决第4名：施沁皓"
-            seg = line
-            for k in keywords:
-                if k in seg:
-                    seg = seg.split(k, 1)[1]
-                    break
-            seg = seg.replace("：", " ").replace(":", " ")
-            seg = seg.strip()
-            if not seg:
-                return None
-            parts = seg.split()
-            if not parts:
-                return None
-            # Take the first token-like chunk as candidate name
-            cand = parts[0].strip("，。,.!！?？;；】")
-            if not cand:
-                return None
-
-            # Build a map of possible names (display name + real name if present) -> cid
-            for cid, role in self.engine.roles.items():
-                dn = self._display_name(cid)
-                if dn == cand:
-                    return cid
-                rn = getattr(role, "real_name", "") or ""
-                if rn and rn == cand:
-                    return cid
-                # also allow matching by role.name if display differs
-                nm = getattr(role, "name", "") or ""
-                if nm and nm == cand:
-                    return cid
-        return None
     def _clean_log_text(self, line: str) -> str:
         # Remove numeric prefix and cid in headers, e.g. 【23. Name(23)】 -> 【Name】
         # Insert a space after ")" to avoid concatenated names after removing "(cid)"
@@ -3710,8 +4779,10 @@ made by dian_mi
                     self.log_text.tag_add("event_name_bold", f"{start_idx}+{lbr}c", f"{start_idx}+{rbr}c")
                 except Exception:
                     pass
-            victim_cid = self.revealed_victims[i] if i < len(self.revealed_victims) else None
-            if victim_cid is not None and victim_cid in self.engine.roles:
+            victims = self.revealed_victims[i] if i < len(self.revealed_victims) else ()
+            for victim_cid in victims:
+                if victim_cid not in self.engine.roles:
+                    continue
                 token_v = f"{self._display_name(victim_cid)}"
                 search_from = start_idx
                 while True:
@@ -3802,14 +4873,12 @@ made by dian_mi
                 self.log_text.tag_add("name_bold", pos2, pos2_end)
                 search_from2 = pos2_end
 
-        # Victim highlighting: parse each raw log line to find eliminated cid, then tag its (cleaned) display name red.
-        raw_lines = list(self.engine.log)
-        disp_lines = [self._clean_log_text(x) for x in raw_lines]
-        # Build start indices of each displayed line in the Text widget
+        # Victim highlighting: each log line's LogEvent lists who was eliminated on it; tag their display names red.
         line_start_idx = "1.0"
-        for raw_line, disp_line in zip(raw_lines, disp_lines):
-            victim_cid = self._parse_victim_cid(raw_line)
-            if victim_cid is not None and victim_cid in self.engine.roles:
+        for ev in self.engine.log_events:
+            for victim_cid in ev.victims:
+                if victim_cid not in self.engine.roles:
+                    continue
                 token_v = self._display_name(victim_cid)
                 if token_v:
                     # restrict search within this line only
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+神秘游戏 逐局结果存储（列式、定长、内存映射读取）
+
+快速跑默认只留汇总计数；把每局结果写进这里，之后可以任意切片重新统计，不必重跑。
+
+目录结构（每列一个文件，第 i 局在每个文件里都位于 i*宽度 处）：
+
+    out_dir/
+      meta.json          列定义、局数、字节序
+      seed.col           u64
+      turns.col          u32
+      winner.col         i16   唯一存活者 cid；无人/多人存活为 -1
+      ...
+      death_reason.col   u16×槽位  死因在 meta.json "reasons" 表里的下标
+
+    python batch_sim.py -n 50000 --seed 1 --store runs/s1
+    python outcome_store.py runs/s1 --start 0 --stop 8000
+"""
+import argparse
+import array
+import json
+import mmap
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from batch_sim import GameOutcome, SimStats, roster_info
+
+STORE_VERSION = 2
+# 定长槽位：淘汰顺序（复活后可能再次出局，会比人数多）、淘汰回合表、死亡记录
+ORDER_SLOTS = 96
+TURN_SLOTS = 48
+DEATH_SLOTS = 96
+PAD_CID = 0xFFFF
+NO_KILLER = 0xFFFE   # 死亡记录里 killer=None（世界规则/未知）
+
+# 列名 -> (array 类型码, 每局元素个数)
+COLUMNS: Dict[str, Tuple[str, int]] = {
+    "seed": ("Q", 1),
+    "turns": ("I", 1),
+    "winner": ("h", 1),
+    "skill_exceptions": ("I", 1),
+    "flags": ("B", 1),            # bit0 超时 bit1 出错 bit2 槽位不够被截断 bit3 技能异常不计入统计
+    "n_elim": ("H", 1),
+    "elim_order": ("H", ORDER_SLOTS),
+    "n_elim_turn": ("H", 1),
+    "elim_turn_cid": ("H", TURN_SLOTS),
+    "elim_turn": ("I", TURN_SLOTS),
+    "n_death": ("H", 1),
+    "death_victim": ("H", DEATH_SLOTS),
+    "death_killer": ("H", DEATH_SLOTS),
+    "death_reason": ("H", DEATH_SLOTS),
+}
+FLAG_TIMED_OUT = 1
+FLAG_ERROR = 2
+FLAG_TRUNCATED = 4
+FLAG_EXCLUDED = 8
+STORED_ERROR = "(error; traceback not stored)"
+
+
+def _meta_path(path: str) -> str:
+    return os.path.join(path, "meta.json")
+
+
+def _col_path(path: str, name: str) -> str:
+    return os.path.join(path, name + ".col")
+
+
+def _write_meta(path: str, meta: Dict):
+    tmp = _meta_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, _meta_path(path))
+
+
+# =========================
+# 写入
+# =========================
+class OutcomeWriter:
+    """按批追加 GameOutcome。每批先攒成各列的 array，再整块写到列文件末尾。"""
+
+    def __init__(self, path: str, roster: Optional[Sequence[int]] = None, overwrite: bool = False):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(_meta_path(path)) and not overwrite:
+            with open(_meta_path(path), "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            _check_meta(self.meta)
+            if roster is not None and self.meta.get("roster") is not None \
+                    and list(roster) != self.meta["roster"]:
+                raise ValueError(f"{path}: roster differs from the existing store")
+            # 上次写到一半中断：把各列截回 meta 记录的局数
+            for name, (code, width) in COLUMNS.items():
+                size = self.meta["count"] * width * array.array(code).itemsize
+                with open(_col_path(path, name), "ab") as f:
+                    f.truncate(size)
+        else:
+            self.meta = {
+                "version": STORE_VERSION,
+                "byteorder": sys.byteorder,
+                "count": 0,
+                "roster": list(roster) if roster is not None else None,
+                "columns": {name: [code, width] for name, (code, width) in COLUMNS.items()},
+                "reasons": [],
+            }
+            for name in COLUMNS:
+                open(_col_path(path, name), "wb").close()
+            _write_meta(path, self.meta)
+        self._reason_idx = {r: i for i, r in enumerate(self.meta["reasons"])}
+
+    @property
+    def count(self) -> int:
+        return int(self.meta["count"])
+
+    def _reason(self, reason: str) -> int:
+        i = self._reason_idx.get(reason)
+        if i is None:
+            i = self._reason_idx[reason] = len(self.meta["reasons"])
+            self.meta["reasons"].append(reason)
+        return i
+
+    def truncate(self, count: int):
+        """丢掉第 count 局之后的记录（断点续跑时与断点对齐）。"""
+        if count > self.count:
+            raise ValueError(f"{self.path}: store has {self.count} games, cannot resume at {count}")
+        for name, (code, width) in COLUMNS.items():
+            with open(_col_path(self.path, name), "ab") as f:
+                f.truncate(count * width * array.array(code).itemsize)
+        self.meta["count"] = int(count)
+        _write_meta(self.path, self.meta)
+
+    def append(self, outcomes: Iterable[GameOutcome]) -> int:
+        """追加一批，返回本批局数。各列写完后才更新 meta 里的局数。"""
+        cols = {name: array.array(code) for name, (code, _w) in COLUMNS.items()}
+        n = 0
+        for o in outcomes:
+            flags = 0
+            if o.timed_out:
+                flags |= FLAG_TIMED_OUT
+            if o.error is not None:
+                flags |= FLAG_ERROR
+            if o.excluded:
+                flags |= FLAG_EXCLUDED
+            order = list(o.elimination_order)
+            turns = list(o.elimination_turn.items())
+            deaths = list(o.deaths)
+            if len(order) > ORDER_SLOTS or len(turns) > TURN_SLOTS or len(deaths) > DEATH_SLOTS:
+                flags |= FLAG_TRUNCATED
+                order = order[-ORDER_SLOTS:]  # 名次看的是最后出局的那几位
+                turns = turns[:TURN_SLOTS]
+                deaths = deaths[:DEATH_SLOTS]
+            cols["seed"].append(int(o.seed))
+            cols["turns"].append(int(o.turns))
+            cols["winner"].append(o.alive[0] if len(o.alive) == 1 else -1)
+            cols["skill_exceptions"].append(int(o.skill_exceptions))
+            cols["flags"].append(flags)
+            cols["n_elim"].append(len(order))
+            cols["elim_order"].extend(order)
+            cols["elim_order"].extend([PAD_CID] * (ORDER_SLOTS - len(order)))
+            cols["n_elim_turn"].append(len(turns))
+            cols["elim_turn_cid"].extend([cid for cid, _t in turns])
+            cols["elim_turn_cid"].extend([PAD_CID] * (TURN_SLOTS - len(turns)))
+            cols["elim_turn"].extend([int(t) for _cid, t in turns])
+            cols["elim_turn"].extend([0] * (TURN_SLOTS - len(turns)))
+            pad = DEATH_SLOTS - len(deaths)
+            cols["n_death"].append(len(deaths))
+            cols["death_victim"].extend([victim for victim, _k, _r in deaths])
+            cols["death_victim"].extend([PAD_CID] * pad)
+            cols["death_killer"].extend([NO_KILLER if killer is None else killer for _v, killer, _r in deaths])
+            cols["death_killer"].extend([PAD_CID] * pad)
+            cols["death_reason"].extend([self._reason(reason) for _v, _k, reason in deaths])
+            cols["death_reason"].extend([0] * pad)
+            n += 1
+        if n == 0:
+            return 0
+        for name, arr in cols.items():
+            with open(_col_path(self.path, name), "ab") as f:
+                arr.tofile(f)
+        self.meta["count"] = self.count + n
+        _write_meta(self.path, self.meta)
+        return n
+
+
+def _check_meta(meta: Dict):
+    if meta.get("version") != STORE_VERSION:
+        raise ValueError(f"unsupported outcome store version: {meta.get('version')}")
+    if meta.get("byteorder") != sys.byteorder:
+        raise ValueError("outcome store was written on a machine with different byte order")
+    for name, (code, width) in COLUMNS.items():
+        if meta["columns"].get(name) != [code, width]:
+            raise ValueError(f"column layout mismatch: {name}")
+
+
+# =========================
+# 读取
+# =========================
+class OutcomeStore:
+    """只读打开一个结果目录。各列通过 mmap 映射，column() 直接返回类型化的 memoryview。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(_meta_path(path), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        _check_meta(self.meta)
+        self.count = int(self.meta["count"])
+        self.roster: Optional[List[int]] = self.meta.get("roster")
+        self.reasons: List[str] = list(self.meta.get("reasons", []))
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._views: Dict[str, memoryview] = {}
+        for name, (code, width) in COLUMNS.items():
+            size = self.count * width * array.array(code).itemsize
+            if size == 0:
+                self._views[name] = memoryview(array.array(code))
+                continue
+            with open(_col_path(path, name), "rb") as f:
+                mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self._maps[name] = mm
+            self._views[name] = memoryview(mm).cast(code)
+
+    def close(self):
+        for v in self._views.values():
+            v.release()
+        self._views.clear()
+        for mm in self._maps.values():
+            mm.close()
+        self._maps.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def column(self, name: str) -> memoryview:
+        """整列（多槽位的列按行展平：第 i 局占 [i*宽度, (i+1)*宽度)）。"""
+        return self._views[name]
+
+    def outcome(self, i: int) -> GameOutcome:
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        v = self._views
+        flags = v["flags"][i]
+        winner = v["winner"][i]
+        n_elim = v["n_elim"][i]
+        n_turn = v["n_elim_turn"][i]
+        order = v["elim_order"][i * ORDER_SLOTS:i * ORDER_SLOTS + n_elim].tolist()
+        tcids = v["elim_turn_cid"][i * TURN_SLOTS:i * TURN_SLOTS + n_turn].tolist()
+        tvals = v["elim_turn"][i * TURN_SLOTS:i * TURN_SLOTS + n_turn].tolist()
+        n_death = v["n_death"][i]
+        d = slice(i * DEATH_SLOTS, i * DEATH_SLOTS + n_death)
+        deaths = [(victim, None if killer == NO_KILLER else killer, self.reasons[r])
+                  for victim, killer, r in zip(v["death_victim"][d].tolist(), v["death_killer"][d].tolist(),
+                                               v["death_reason"][d].tolist())]
+        return GameOutcome(
+            seed=v["seed"][i],
+            turns=v["turns"][i],
+            timed_out=bool(flags & FLAG_TIMED_OUT),
+            skill_exceptions=v["skill_exceptions"][i],
+            alive=[winner] if winner >= 0 else [],
+            elimination_order=order,
+            elimination_turn=dict(zip(tcids, tvals)),
+            error=STORED_ERROR if flags & FLAG_ERROR else None,
+            deaths=deaths,
+            excluded=bool(flags & FLAG_EXCLUDED),
+        )
+
+    def iter_outcomes(self, start: int = 0, stop: Optional[int] = None) -> Iterator[GameOutcome]:
+        stop = self.count if stop is None else min(stop, self.count)
+        for i in range(max(0, start), stop):
+            yield self.outcome(i)
+
+    def aggregate(self, start: int = 0, stop: Optional[int] = None,
+                  rows: Optional[Iterable[int]] = None) -> SimStats:
+        """把 [start, stop) 或指定行号重新统计成 SimStats（与当初跑模拟时的汇总一致）。
+
+        超时局不存存活名单，本来也不计入统计；出错局只记个数，不保留 traceback。
+        击杀矩阵/死因统计由逐局死亡记录重算；只有带截断标记（flags bit2）的局会少算超出槽位的部分。
+        """
+        role_ids, names = roster_info(self.roster)
+        stats = SimStats(role_ids=role_ids, names=names)
+        it = (self.outcome(i) for i in rows) if rows is not None else self.iter_outcomes(start, stop)
+        for o in it:
+            stats.add(o)
+        return stats
+
+
+# =========================
+# 命令行
+# =========================
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="从逐局结果目录重新统计（不重跑模拟）")
+    ap.add_argument("path", help="batch_sim.py --store 写出的目录")
+    ap.add_argument("--start", type=int, default=0, help="起始局（含）")
+    ap.add_argument("--stop", type=int, default=None, help="结束局（不含）")
+    ap.add_argument("--json", action="store_true", help="以 JSON 输出")
+    args = ap.parse_args(argv)
+    with OutcomeStore(args.path) as store:
+        stats = store.aggregate(args.start, args.stop)
+    if args.json:
+        json.dump(stats.to_dict(), sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+    else:
+        sys.stdout.write(stats.format_text())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -31,6 +31,12 @@ def load_engine():
 
 engine = load_engine()
 
+@st.cache_resource
+def load_odds_runner():
+    # 实时胜率：后台进程池推演，按回合缓存（见 win_odds.py）
+    import win_odds
+    return win_odds.OddsRunner()
+
 # ----------------------------
 # State (a1.1.10 playback: 下一回合 triggers playback for that turn)
 # ----------------------------
@@ -65,6 +71,8 @@ if "turn_start_log_len" not in st.session_state:
     st.session_state.next_turn_at = 0.0
 if "selected_cid" not in st.session_state:
     st.session_state.selected_cid = None
+if "show_odds" not in st.session_state:
+    st.session_state.show_odds = False
 
 # ----------------------------
 # Status colors (match a1.1.10 Tkinter exactly)
@@ -257,13 +265,23 @@ def get_focus_from_frame(fr, roles_map):
                 out.append(cid)
     return out
 
-def format_log_line(s):
+def format_log_line(s, ev=None):
+    """ev: engine_core.LogEvent for this line (None for logs without structured records)."""
+    if ev is not None:
+        # Structured record: the engine already knows who was eliminated on this line.
+        # Wrap the exact "name(cid)" token (engine.N) for each victim before the cid suffixes are
+        # stripped, so a name that is a prefix of another role's name is never matched.
+        for cid in ev.victims:
+            r = engine.roles.get(cid)
+            nm = r.name.strip() if r is not None else ""
+            if nm:
+                s = s.replace(f"{nm}({cid})", f"<span class='log-kill'>{nm}</span>")
     # Remove trailing (cid) after names, but keep other parentheses like (2回合)
     s = re.sub(r'([\u4e00-\u9fffA-Za-z_]+)\(\d+\)', r'\1', s)
     line = s
 
     # Random event line highlight (gold, match a1.1.10)
-    if "触发随机事件" in line or "随机事件：" in line:
+    if (ev.kind == "event_trigger") if ev is not None else ("触发随机事件" in line or "随机事件：" in line):
         line = f"<span class='log-event'>{line}</span>"
 
     # Section / header styling
@@ -283,10 +301,11 @@ def format_log_line(s):
         name = m.group(2)
         return f"{kw} <span class='log-kill'>{name}</span>"
 
-    line = re.sub(r'(淘汰|击杀|斩杀)\s*[:：]\s*([\u4e00-\u9fffA-Za-z_]+)', _mark_victim, line)
-    line = re.sub(r'(淘汰|击杀|斩杀)\s+([\u4e00-\u9fffA-Za-z_]+)', _mark_victim, line)
-    line = re.sub(r'(目标(?:被)?(?:淘汰|击杀|斩杀))\s*[:：]?\s*([\u4e00-\u9fffA-Za-z_]+)',
-                  lambda m: f"{m.group(1)} <span class='log-kill'>{m.group(2)}</span>", line)
+    if ev is None:
+        line = re.sub(r'(淘汰|击杀|斩杀)\s*[:：]\s*([\u4e00-\u9fffA-Za-z_]+)', _mark_victim, line)
+        line = re.sub(r'(淘汰|击杀|斩杀)\s+([\u4e00-\u9fffA-Za-z_]+)', _mark_victim, line)
+        line = re.sub(r'(目标(?:被)?(?:淘汰|击杀|斩杀))\s*[:：]?\s*([\u4e00-\u9fffA-Za-z_]+)',
+                      lambda m: f"{m.group(1)} <span class='log-kill'>{m.group(2)}</span>", line)
 
     # Bold all role names wherever they appear in the (already formatted) line.
     # We avoid bolding inside HTML tags by only replacing plain-text occurrences.
@@ -443,6 +462,24 @@ def _step_one_line():
         return
     st.session_state.frame_i += 1
 
+def _step_back_line():
+    # 本回合的回放帧可随机访问：回退一行就是显示上一帧
+    st.session_state.playing = False
+    if st.session_state.frame_i > 0:
+        st.session_state.frame_i -= 1
+
+def _undo_turn():
+    # 退回上一回合结束时的局面，停在该回合最后一行（再点“下一回合”会原样重演）
+    _pause()
+    undo = getattr(engine, "undo_turn", None)
+    if not callable(undo) or not undo():
+        return
+    frames = getattr(engine, "replay_frames", None) or []
+    st.session_state.turn_frames = frames
+    st.session_state.turn_start_log_len = len(engine.log) - len(frames)
+    st.session_state.frame_i = max(0, len(frames) - 1)
+    st.session_state.playback_active = bool(frames)
+
 def _auto_play():
     frames = st.session_state.turn_frames or []
     if not frames:
@@ -475,11 +512,15 @@ def _recommended_interval_ms():
     return max(80, base)
 
 # Buttons row (top, but same semantics as Tk bottom bar)
-c1, c2, c3, c4, c5, c6 = st.columns([1.05, 1.05, 1.05, 1.05, 1.05, 1.75], gap="small")
+c1, c7, c2, c8, c3, c4, c5, c6 = st.columns([1.05, 1.05, 1.05, 1.05, 1.05, 1.05, 1.05, 1.75], gap="small")
 with c1:
     new_clicked = st.button("新开局", use_container_width=True)
+with c7:
+    back_turn_clicked = st.button("上一回合", use_container_width=True)
 with c2:
     next_turn_clicked = st.button("下一回合", use_container_width=True)
+with c8:
+    back_line_clicked = st.button("上一行", use_container_width=True)
 with c3:
     next_line_clicked = st.button("下一行", use_container_width=True)
 with c4:
@@ -489,9 +530,11 @@ with c5:
 with c6:
     st.session_state.speed = st.slider("播放速度（秒/行）", 0.10, 2.00, float(st.session_state.speed), 0.05)
     st.session_state.auto_skip = st.checkbox("5秒自动下回合", value=bool(st.session_state.auto_skip))
+    st.session_state.show_odds = st.checkbox("实时胜率", value=bool(st.session_state.show_odds))
 
 if new_clicked:
     engine.new_game()
+    load_odds_runner().clear()
     st.session_state.selected_cid = None
     st.session_state.playing = False
     st.session_state.turn_frames = []
@@ -503,6 +546,14 @@ if next_turn_clicked:
     _build_turn_like_a1110()
     st.rerun()
 
+if back_turn_clicked:
+    _undo_turn()
+    st.rerun()
+
+if back_line_clicked:
+    _step_back_line()
+    st.rerun()
+
 if next_line_clicked:
     _step_one_line()
     st.rerun()
@@ -614,12 +665,17 @@ left_rows = render_role_rows(left_part)
 mid_rows  = render_role_rows(mid_part)
 
 full_log = getattr(engine, "log", [])
+full_events = getattr(engine, "log_events", None)
+if not full_events or len(full_events) != len(full_log):
+    full_events = [None] * len(full_log)
 if st.session_state.playback_active and st.session_state.turn_frames:
     shown = st.session_state.turn_start_log_len + st.session_state.frame_i + 1
     log_lines = full_log[:shown][-400:]
+    log_events = full_events[:shown][-400:]
 else:
     log_lines = full_log[-400:]
-log_html = "".join(format_log_line(s) for s in log_lines)
+    log_events = full_events[-400:]
+log_html = "".join(format_log_line(s, ev) for s, ev in zip(log_lines, log_events))
 
 PANEL_CSS = """<style>
   :root{--bg:#efefef;--panel:#f7f7f7;--line:#d7d7d7;--text:#111;--muted:#666;--select:#fff3b0;--kill:#d0021b;}
@@ -655,11 +711,41 @@ def log_panel_html(title, lines):
 <script>const sc=document.getElementById('log-scroll'); if(sc) sc.scrollTop=sc.scrollHeight;</script>
 </body></html>"""
 
+def odds_rows_html():
+    # 本回合日志播完后显示本回合结束时的胜率，没播完时显示本回合开始时的（不提前露出结局）；
+    # 后台没算完时显示部分结果，并定时刷新
+    runner = load_odds_runner()
+    frames = st.session_state.turn_frames or []
+    playback_done = (not st.session_state.playback_active) or st.session_state.frame_i >= len(frames) - 1
+    odds = runner.view(engine, playback_done)
+    if runner.busy:
+        st_autorefresh(interval=700, key="odds_tick")
+    if odds is None:
+        return "<div class='log-line log-empty'>本回合回放中…（播完后显示）</div>"
+    names = {cid: r.name for cid, r in engine.roles.items()}
+    head = f"<div class='log-line log-empty'>第{odds.turn}回合结束后：已推演 {odds.rollouts}/{odds.target} 局" \
+           f"{f'，出错 {odds.failed} 局' if odds.failed else ''}{'' if odds.done else '（计算中…）'}</div>"
+    rows = []
+    for cid, p, hw in odds.table(odds.alive):
+        ci = f"±{hw * 100:.1f}" if odds.rollouts else ""
+        rows.append(f"""
+<div class='role-row'>
+  <div class='role-left'><div class='role-name'>{names.get(cid, str(cid))}</div></div>
+  <div class='role-right'><b>{p * 100:.1f}%</b><span class='log-empty'>{ci}</span></div>
+</div>""")
+    return head + "".join(rows)
+
 IFRAME_H = 860
-colA, colB, colC = st.columns([1.0, 1.0, 1.15], gap="small")
+if st.session_state.show_odds:
+    colA, colB, colC, colD = st.columns([1.0, 1.0, 1.15, 0.8], gap="small")
+else:
+    colA, colB, colC = st.columns([1.0, 1.0, 1.15], gap="small")
 with colA:
     components.html(role_panel_html("角色", left_rows), height=IFRAME_H, scrolling=False)
 with colB:
     components.html(role_panel_html("角色", mid_rows), height=IFRAME_H, scrolling=False)
 with colC:
     components.html(log_panel_html("日志", log_html), height=IFRAME_H, scrolling=False)
+if st.session_state.show_odds:
+    with colD:
+        components.html(role_panel_html("实时胜率", odds_rows_html()), height=IFRAME_H, scrolling=False)
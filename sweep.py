@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+神秘游戏 规则参数扫描（无界面）
+
+把 engine_core.RuleParams 里的常量按网格或随机抽样展开成多组参数，
+每组参数用同一批种子跑 N 局，每组输出一行汇总（CSV 或 JSONL）：
+
+    python sweep.py -n 2000 --seed 1 -j 0 \\
+        --grid event_chance=0.1,0.25,0.4 --grid world_rule_execute_rank=3,4,5 --out sweep.csv
+    python sweep.py -n 2000 --sample 50 --range event_chance=0.05:0.5 \\
+        --range thunder_lethal=2:4 --out sweep.jsonl
+
+event_weights 用点号指定单个事件：--grid event_weights.骰子=0,1,3
+"""
+import argparse
+import csv
+import itertools
+import json
+import math
+import random
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import batch_sim
+from batch_sim import SimStats
+from engine_core import RuleParams
+
+
+# =========================
+# 参数点
+# =========================
+def make_params(point: Dict[str, Any]) -> RuleParams:
+    """{"event_chance": 0.3, "event_weights.骰子": 2} -> RuleParams。未给出的字段取默认值。"""
+    kw: Dict[str, Any] = {}
+    weights: Dict[str, float] = {}
+    for key, value in point.items():
+        if key.startswith("event_weights."):
+            weights[key.split(".", 1)[1]] = float(value)
+        else:
+            kw[key] = value
+    if weights:
+        kw["event_weights"] = weights
+    return RuleParams(**kw)
+
+
+def grid(axes: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """各轴取值的笛卡尔积（按轴给出的顺序展开）。"""
+    names = list(axes)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(axes[n] for n in names))]
+
+
+def random_sample(ranges: Dict[str, Tuple[Any, Any]], n: int,
+                  seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """在各轴的 [lo, hi] 内均匀随机抽 n 个点；RuleParams 的整数字段取 [lo, hi] 内的整数，其余取实数。"""
+    rng = random.Random(seed)
+    int_bounds = {}
+    for name, (lo, hi) in ranges.items():
+        if name in RuleParams.INT_FIELDS:
+            a, b = math.ceil(lo), math.floor(hi)
+            if a > b:
+                raise ValueError(f"{name}: no integer in range {lo}:{hi}")
+            int_bounds[name] = (a, b)
+    points = []
+    for _ in range(n):
+        p = {}
+        for name, (lo, hi) in ranges.items():
+            if name in int_bounds:
+                p[name] = rng.randint(*int_bounds[name])
+            else:
+                p[name] = rng.uniform(float(lo), float(hi))
+        points.append(p)
+    return points
+
+
+# =========================
+# 执行
+# =========================
+def _run_task(task: Tuple[int, List[int], Optional[List[int]], Dict[str, Any]]) -> Tuple[int, SimStats]:
+    idx, seeds, roster, point = task
+    return idx, batch_sim.run_shard(seeds, roster, params=make_params(point))
+
+
+def run_sweep(points: Sequence[Dict[str, Any]], games: int = 2000, base_seed: Optional[int] = None,
+              roster: Optional[Sequence[int]] = None, workers: int = 1,
+              chunk_size: int = batch_sim.CHECK_CHUNK) -> Iterable[Tuple[Dict[str, Any], SimStats]]:
+    """逐组产出 (参数点, 汇总)，顺序与 points 一致。
+
+    所有参数点共用同一批种子（共同随机数），组间差异只来自参数本身。
+    任务粒度是“参数点 × 种子分片”，点少核多时也能铺满进程池。
+    """
+    seeds = batch_sim.make_seeds(games, base_seed)
+    roster = list(roster) if roster is not None else None
+    for p in points:
+        make_params(p)  # 先在主进程里校验，参数写错了立刻报错
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)] or [[]]
+    tasks = [(i, c, roster, dict(p)) for i, p in enumerate(points) for c in chunks]
+    role_ids, names = batch_sim.roster_info(roster)
+    if workers <= 0:
+        workers = batch_sim.default_workers()
+
+    def fresh() -> SimStats:
+        return SimStats(role_ids=role_ids, names=names)
+
+    if workers == 1:
+        results = map(_run_task, tasks)
+        ex = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        ex = ProcessPoolExecutor(max_workers=workers)
+        results = ex.map(_run_task, tasks)
+    try:
+        cur_idx, cur = 0, fresh()
+        left = len(chunks)
+        for idx, part in results:
+            cur.merge(part)
+            left -= 1
+            if left == 0:
+                yield points[cur_idx], cur
+                cur_idx, cur, left = cur_idx + 1, fresh(), len(chunks)
+    finally:
+        if ex is not None:
+            ex.shutdown(wait=True, cancel_futures=True)
+
+
+def summary_row(point: Dict[str, Any], stats: SimStats) -> Dict[str, Any]:
+    """一组参数的一行汇总：参数列 + 局数 + 每个角色的冠军率/前三率/平均排名/平均存活回合。"""
+    row: Dict[str, Any] = dict(point)
+    row.update(games=stats.games, valid_games=stats.valid_games, errors=stats.errors,
+               skill_errors=stats.skill_errors, timeouts=stats.timeouts)
+    n = stats.valid_games
+    for cid in stats.role_ids:
+        row[f"win_{cid}"] = stats.first_cnt[cid] / n if n else 0.0
+        row[f"top3_{cid}"] = stats.top3_cnt[cid] / n if n else 0.0
+        row[f"place_{cid}"] = stats.mean_ci(cid, "place")[0]
+        row[f"survive_{cid}"] = stats.mean_ci(cid, "survive")[0]
+    wins = [stats.first_cnt[cid] / n for cid in stats.role_ids] if n else []
+    # 平衡度：冠军率的极差与标准差（越小越均衡）
+    row["win_spread"] = (max(wins) - min(wins)) if wins else 0.0
+    row["win_std"] = (sum((w - sum(wins) / len(wins)) ** 2 for w in wins) / len(wins)) ** 0.5 if wins else 0.0
+    return row
+
+
+# =========================
+# 命令行
+# =========================
+def _parse_value(text: str) -> Any:
+    text = text.strip()
+    for conv in (int, float):
+        try:
+            return conv(text)
+        except ValueError:
+            pass
+    if text.startswith("(") or text.startswith("["):
+        return tuple(int(x) for x in text.strip("()[]").split("/") if x.strip())
+    raise ValueError(f"bad parameter value: {text}")
+
+
+def _parse_axis(spec: str) -> Tuple[str, str]:
+    if "=" not in spec:
+        raise ValueError(f"expected name=values, got: {spec}")
+    name, values = spec.split("=", 1)
+    return name.strip(), values
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="神秘游戏 规则参数扫描")
+    ap.add_argument("-n", "--games", type=int, default=2000, help="每组参数的局数")
+    ap.add_argument("--seed", type=int, default=None, help="种子（各组共用同一批种子）")
+    ap.add_argument("--roster", default=None, help="参赛角色 cid，逗号分隔（默认全部）")
+    ap.add_argument("-j", "--workers", type=int, default=0, help="并行进程数（0=CPU核数）")
+    ap.add_argument("--grid", action="append", default=[],
+                    help="网格轴 name=v1,v2,...；thunder_ranks 写成 (5/6/7)")
+    ap.add_argument("--range", action="append", default=[], help="抽样轴 name=lo:hi")
+    ap.add_argument("--sample", type=int, default=None, help="随机抽样的点数（配合 --range）")
+    ap.add_argument("--sample-seed", type=int, default=None, help="抽样用的种子")
+    ap.add_argument("--out", default="-", help="输出文件，.csv 或 .jsonl（- 为标准输出的 JSONL）")
+    args = ap.parse_args(argv)
+
+    try:
+        if args.sample is not None:
+            ranges = {}
+            for spec in args.range:
+                name, values = _parse_axis(spec)
+                lo, hi = values.split(":", 1)
+                ranges[name] = (_parse_value(lo), _parse_value(hi))
+            points = random_sample(ranges, args.sample, args.sample_seed)
+        else:
+            axes = {}
+            for spec in args.grid:
+                name, values = _parse_axis(spec)
+                axes[name] = [_parse_value(v) for v in values.split(",") if v.strip()]
+            points = grid(axes)
+        for p in points:
+            make_params(p)
+    except (TypeError, ValueError) as ex:
+        ap.error(str(ex))
+    roster = batch_sim._parse_roster(args.roster)
+
+    t0 = time.perf_counter()
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8", newline="")
+    writer = None
+    try:
+        for i, (point, stats) in enumerate(run_sweep(points, args.games, args.seed, roster, args.workers), 1):
+            row = summary_row(point, stats)
+            if args.out.endswith(".csv"):
+                if writer is None:
+                    writer = csv.DictWriter(out, fieldnames=list(row))
+                    writer.writeheader()
+                writer.writerow({k: (json.dumps(v) if isinstance(v, tuple) else v) for k, v in row.items()})
+            else:
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()
+            sys.stderr.write(f"[{i}/{len(points)}] {point}  用时 {time.perf_counter() - t0:.1f}s\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+神秘游戏 实时胜率（蒙特卡洛推演）
+
+从当前局面分出 fast_mode 分支（Engine.fork），每个分支换一个新种子推演到底，数各角色夺冠的次数。
+界面里用 OddsRunner 在后台进程池里算，按回合缓存：
+
+    runner = OddsRunner()
+    odds = runner.request(engine)   # 立刻返回本回合的 WinOdds（后台还在算时是部分结果）
+    runner.poll()                   # 界面定时调用，收集后台算完的分片；runner.busy 为 False 即全部算完
+    runner.view(engine, done)       # 界面用：本回合日志没播完（done=False）时给上一回合的结果
+    runner.clear()                  # 新开局时清缓存
+
+也可以对一个存档（Engine.save）直接算：
+
+    python win_odds.py game.sav -n 1000
+"""
+import argparse
+import math
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import batch_sim
+from batch_sim import Z95
+from engine_core import Engine
+
+# 每回合推演局数 / 每个后台任务的局数（越小结果刷新得越勤）
+ROLLOUTS = 200
+CHUNK = 25
+# 推演超过这么多回合仍未分出胜负，记为无人胜出
+MAX_TURNS = 2000
+
+
+@dataclass
+class WinOdds:
+    """某回合结束时局面的推演结果。rollouts 是已经算完的局数，target 是计划的局数。"""
+    turn: int
+    target: int
+    rollouts: int = 0
+    wins: Dict[int, int] = field(default_factory=dict)
+    no_winner: int = 0   # 同归于尽 / 超时
+    failed: int = 0      # 推演出错（技能抛异常、后台进程异常等），不计入 rollouts
+    alive: Tuple[int, ...] = ()  # 该局面的存活者（界面按它列表，不用引擎此刻的存活者）
+
+    @property
+    def done(self) -> bool:
+        return self.rollouts + self.failed >= self.target
+
+    def merge(self, wins: Dict[int, int], no_winner: int, failed: int = 0):
+        for cid, n in wins.items():
+            self.wins[cid] = self.wins.get(cid, 0) + n
+        self.no_winner += no_winner
+        self.failed += failed
+        self.rollouts += sum(wins.values()) + no_winner
+
+    def rate(self, cid: int) -> float:
+        return self.wins.get(cid, 0) / self.rollouts if self.rollouts else 0.0
+
+    def half_width(self, cid: int, z: float = Z95) -> float:
+        """夺冠率的置信区间半宽（正态近似）；还没有结果时为 inf。"""
+        if self.rollouts <= 0:
+            return math.inf
+        p = self.rate(cid)
+        return z * math.sqrt(p * (1 - p) / self.rollouts)
+
+    def table(self, cids: Sequence[int]) -> List[Tuple[int, float, float]]:
+        """[(cid, 夺冠率, 半宽)]，按夺冠率从高到低（同率保持 cids 的顺序）。"""
+        rows = [(cid, self.rate(cid), self.half_width(cid)) for cid in cids]
+        rows.sort(key=lambda r: -r[1])
+        return rows
+
+
+def run_rollouts(state: bytes, seeds: Sequence[int],
+                 max_turns: int = MAX_TURNS) -> Tuple[Dict[int, int], int, int]:
+    """（子进程）从存档 state 出发，每个种子推演一局：返回 ({cid: 夺冠次数}, 无人胜出局数, 出错局数)。"""
+    base = Engine.loads(state)
+    wins: Dict[int, int] = {}
+    no_winner = 0
+    failed = 0
+    for seed in seeds:
+        winner = None
+        try:
+            e = base.fork(history=False, fast_mode=True)
+            e.rng.seed(seed)
+            for _ in range(max_turns):
+                if e.game_over:
+                    break
+                e.tick_alive_turns()
+                e.next_turn()
+            alive = e.alive_ids()
+            if e.game_over and len(alive) == 1:
+                winner = alive[0]
+        except Exception:
+            failed += 1
+            continue
+        if winner is None:
+            no_winner += 1
+        else:
+            wins[winner] = wins.get(winner, 0) + 1
+    return wins, no_winner, failed
+
+
+def win_odds(engine: Engine, rollouts: int = ROLLOUTS, workers: int = 1,
+             chunk: int = CHUNK, max_turns: int = MAX_TURNS) -> WinOdds:
+    """同步算一次（命令行/脚本用）。种子由回合数决定，同一局面重复算结果相同。"""
+    runner = OddsRunner(rollouts, workers, chunk, max_turns)
+    try:
+        odds = runner.request(engine)
+        runner.wait()
+        return odds
+    finally:
+        runner.close()
+
+
+class OddsRunner:
+    """后台推演胜率。界面线程只做提交和收结果（都不阻塞），推演全在进程池里跑。
+
+    结果只按回合数缓存：回看、悔棋后再前进都直接复用，不会重算。这依赖“同一局里同一回合的局面是确定的”——
+    悔棋会连随机数状态一起还原，再前进就原样重演。凡是让同一回合数对应到另一个局面的操作
+    （换了一局、悔棋后改了局面/参数再走别的路）都要先调 clear()，否则会拿到旧局面的结果。
+    只算眼前的回合：请求新回合时，别的回合还没开跑的任务会撤掉，那一回合不留缓存，回看时重算。
+    workers=1 时也用一个子进程，保证不拖慢回放。
+    """
+
+    def __init__(self, rollouts: int = ROLLOUTS, workers: int = 0,
+                 chunk: int = CHUNK, max_turns: int = MAX_TURNS):
+        self.rollouts = max(1, int(rollouts))
+        self.workers = workers if workers > 0 else batch_sim.default_workers()
+        self.chunk = max(1, int(chunk))
+        self.max_turns = int(max_turns)
+        self._cache: Dict[int, WinOdds] = {}
+        self._pending: Dict[int, List[Tuple[Any, int]]] = {}  # turn -> [(future, 局数)]
+        self._ex = None
+
+    def _executor(self):
+        if self._ex is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self._ex = ProcessPoolExecutor(max_workers=self.workers)
+        return self._ex
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._pending)
+
+    def get(self, turn: int) -> Optional[WinOdds]:
+        return self._cache.get(turn)
+
+    def request(self, engine: Engine) -> WinOdds:
+        """engine 当前局面（第 engine.turn 回合结束时）的胜率；没算过就提交后台。"""
+        turn = engine.turn
+        odds = self._cache.get(turn)
+        if odds is not None:
+            self.poll()
+            return odds
+        odds = WinOdds(turn=turn, target=self.rollouts, alive=tuple(engine.alive_ids()))
+        self._cache[turn] = odds
+        if engine.game_over:
+            # 已分出胜负：不必推演
+            alive = engine.alive_ids()
+            if len(alive) == 1:
+                odds.merge({alive[0]: self.rollouts}, 0)
+            else:
+                odds.merge({}, self.rollouts)
+            return odds
+        for t, jobs in list(self._pending.items()):
+            if any([fut.cancel() for fut, _n in jobs]):
+                del self._pending[t]
+                del self._cache[t]
+        state = engine.dumps(history=False)
+        seeds = batch_sim.make_seeds(self.rollouts, turn)
+        ex = self._executor()
+        self._pending[turn] = [
+            (ex.submit(run_rollouts, state, seeds[i:i + self.chunk], self.max_turns), len(seeds[i:i + self.chunk]))
+            for i in range(0, len(seeds), self.chunk)
+        ]
+        return odds
+
+    def view(self, engine: Engine, playback_done: bool) -> Optional[WinOdds]:
+        """界面显示用。next_turn() 之后本回合的日志还在回放，这时 engine 已经是回合结束的局面，
+        直接 request() 会提前露出谁被淘汰、谁夺冠；所以回放没结束时只给上一回合结束时（即本回合开始时）
+        的结果（没有缓存就返回 None），回放结束后才提交本回合。"""
+        if playback_done or engine.turn <= 0:
+            return self.request(engine)
+        self.poll()
+        return self._cache.get(engine.turn - 1)
+
+    def poll(self) -> bool:
+        """把已经算完的分片并进结果；有新结果返回 True。"""
+        changed = False
+        for turn, jobs in list(self._pending.items()):
+            odds = self._cache[turn]
+            left = []
+            for fut, n in jobs:
+                if not fut.done():
+                    left.append((fut, n))
+                    continue
+                changed = True
+                try:
+                    odds.merge(*fut.result())
+                except Exception:
+                    odds.failed += n
+            if left:
+                self._pending[turn] = left
+            else:
+                del self._pending[turn]
+        return changed
+
+    def wait(self):
+        """等后台全部算完（阻塞）。"""
+        from concurrent.futures import wait
+        while self._pending:
+            wait([fut for jobs in self._pending.values() for fut, _n in jobs])
+            self.poll()
+
+    def clear(self):
+        """丢掉缓存和还没算完的任务（新开局时调用）。"""
+        for jobs in self._pending.values():
+            for fut, _n in jobs:
+                fut.cancel()
+        self._pending.clear()
+        self._cache.clear()
+
+    def close(self):
+        self.clear()
+        if self._ex is not None:
+            self._ex.shutdown(wait=False, cancel_futures=True)
+            self._ex = None
+
+
+# =========================
+# 命令行
+# =========================
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="从存档局面推演各角色的夺冠概率")
+    ap.add_argument("save", help="Engine.save() 写出的存档")
+    ap.add_argument("-n", "--rollouts", type=int, default=ROLLOUTS, help="推演局数")
+    ap.add_argument("-j", "--workers", type=int, default=0, help="并行进程数（0=CPU核数）")
+    args = ap.parse_args(argv)
+    e = Engine.load(args.save)
+    odds = win_odds(e, args.rollouts, args.workers if args.workers > 0 else batch_sim.default_workers())
+    sys.stdout.write(f"第{odds.turn}回合结束后，推演 {odds.rollouts} 局（无人胜出 {odds.no_winner}，出错 {odds.failed}）\n")
+    for cid, p, hw in odds.table(e.alive_ids()):
+        sys.stdout.write(f"{e.N(cid):<20} {p * 100:6.2f}% ±{hw * 100:5.2f}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())